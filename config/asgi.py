@@ -11,6 +11,11 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'EventHub.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_asgi_application()
+
+# Background closing of past events, when EVENT_SWEEPER['ENABLED'] is set
+from events import sweeper  # noqa: E402
+
+sweeper.start()
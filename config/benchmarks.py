@@ -0,0 +1,313 @@
+"""
+Endpoint benchmark harness.
+
+``seed()`` bulk-inserts users, events, participants and logs. ``run()`` then
+requests every route in ``config/urls.py`` through the Django test client,
+recording p50/p99 latency and the exact number of SQL statements per request.
+Each endpoint carries a query budget. The budget is independent of the seeded
+volume, so an N+1 shows up as a budget overrun. It is used by the
+``benchmark_endpoints`` management command and by the query budget tests,
+which also check with ``routes()`` that no route is left without a budget.
+
+The event stream only runs under ASGI and never ends: it is requested through
+the async test client and measured up to its first message.
+"""
+import itertools
+import statistics
+import time
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.test import AsyncClient
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLResolver, get_resolver, resolve
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from events.models import Event, Participant
+from logs.models import EventLog
+from users.models import User
+from users.serializers import CustomTokenObtainPairSerializer
+
+PASSWORD = 'benchmark-password'
+
+
+@dataclass
+class Endpoint:
+    name: str
+    method: str
+    path: str
+    actor: str  # 'anonymous', 'admin', 'creator', 'user' or 'staff' (admin site session)
+    budget: int
+    data: object = None
+    asgi: bool = False  # requested anonymously through the async test client
+
+
+def seed(users=200, events=100, participants=20, logs=1000, spare_events=200):
+    # Bulk insert a dataset; every event gets `participants` distinct participants.
+    # Spare events feed the join/leave and destroy endpoints, one per request.
+    now = timezone.now()
+    admin = User.objects.create_superuser(
+        email='bench-admin@example.com', username='bench-admin', password=PASSWORD,
+        role=User.Role.ADMIN, first_name='Bench', last_name='Admin',
+    )
+    creator = User.objects.create_user(
+        email='bench-creator@example.com', username='bench-creator', password=PASSWORD,
+        role=User.Role.EVENT_CREATOR, first_name='Bench', last_name='Creator',
+    )
+    user = User.objects.create_user(
+        email='bench-user@example.com', username='bench-user', password=PASSWORD,
+        first_name='Bench', last_name='User',
+    )
+    crowd = User.objects.bulk_create(
+        User(email=f'bench{i}@example.com', username=f'bench{i}', first_name='User', last_name=str(i))
+        for i in range(users)
+    )
+
+    seeded_events = Event.objects.bulk_create(
+        (
+            Event(
+                name=f'Benchmark event {i}', description='Seeded for benchmarking ' * 5,
+                capacity=participants * 2, remaining_capacity=participants * 2,
+                date=now + timezone.timedelta(hours=i), location=f'Hall {i % 10}',
+                creator=creator if i % 2 else admin,
+            )
+            for i in range(events)
+        ),
+        batch_size=1000,
+    )
+    Participant.objects.bulk_create(
+        (
+            Participant(event=event, user=member)
+            for event in seeded_events
+            for member in crowd[:participants]
+        ),
+        batch_size=2000,
+    )
+    Participant.objects.bulk_create(Participant(event=event, user=user) for event in seeded_events[1::2])
+    Event.objects.recount_participants()
+
+    event_cycle = itertools.cycle(seeded_events)
+    user_cycle = itertools.cycle(crowd + [user])
+    EventLog.objects.bulk_create(
+        (
+            EventLog(event=next(event_cycle), user=next(user_cycle), action=EventLog.Action.JOIN, description='')
+            for _ in range(logs)
+        ),
+        batch_size=2000,
+    )
+
+    spare = Event.objects.bulk_create(
+        Event(
+            name=f'Spare event {i}', description='', capacity=10, remaining_capacity=10,
+            date=now + timezone.timedelta(days=1), location='Hall', creator=creator,
+        )
+        for i in range(spare_events)
+    )
+    return {
+        'admin': admin,
+        'creator': creator,
+        'user': user,
+        'event': seeded_events[1],
+        'log': EventLog.objects.order_by('pk').first(),
+        'participant': Participant.objects.filter(event=seeded_events[1]).first(),
+        'join_event': spare[0],
+        'deletable': iter(spare[1:]),
+    }
+
+
+def endpoints(context):
+    event = context['event'].pk
+    join_event = context['join_event'].pk
+    counter = itertools.count()
+    deletable = context['deletable']
+
+    def new_user():
+        n = next(counter)
+        return {
+            'email': f'new{n}@example.com', 'username': f'new{n}', 'password': 'Str0ng-pass-123',
+            'password2': 'Str0ng-pass-123', 'first_name': 'New', 'last_name': 'User',
+        }
+
+    def new_event():
+        return {
+            'name': 'Created', 'description': 'x', 'capacity': 10, 'location': 'Hall',
+            'date': '2030-01-01T00:00:00Z', 'status': Event.Status.CLOSED,
+        }
+
+    return [
+        # users
+        Endpoint('user-list', 'get', '/api/users/', 'admin', 2),
+        Endpoint('user-create', 'post', '/api/users/', 'anonymous', 3, new_user),
+        Endpoint('user-me', 'get', '/api/users/me/', 'user', 1),
+        Endpoint('user-detail', 'get', f"/api/users/{context['user'].pk}/", 'user', 1),
+        Endpoint('token-obtain', 'post', '/api/users/token/', 'anonymous', 1,
+                 lambda: {'email': context['user'].email, 'password': PASSWORD}),
+        Endpoint('token-refresh', 'post', '/api/users/token/refresh/', 'anonymous', 1,
+                 lambda: {'refresh': str(RefreshToken.for_user(context['user']))}),
+        # events
+        Endpoint('event-list-anonymous', 'get', '/api/events/', 'anonymous', 2),
+        Endpoint('event-list', 'get', '/api/events/', 'user', 2),
+        Endpoint('event-list-filtered', 'get', '/api/events/?has_capacity=true&upcoming=true', 'user', 2),
+        Endpoint('event-list-joined', 'get', '/api/events/?joined=true', 'user', 2),
+        Endpoint('event-list-search', 'get', '/api/events/?search=benchmark', 'user', 1),
+        Endpoint('event-list-cursor', 'get', '/api/events/?pagination=cursor', 'user', 1),
+        Endpoint('event-calendar', 'get', '/api/events/calendar/?bucket=day', 'user', 1),
+        Endpoint('event-detail', 'get', f'/api/events/{event}/', 'user', 2),
+        Endpoint('event-create', 'post', '/api/events/', 'creator', 2, new_event),
+        Endpoint('event-bulk-create', 'post', '/api/events/bulk/', 'creator', 5,
+                 lambda: [new_event() for _ in range(10)]),
+        Endpoint('event-update', 'patch', f'/api/events/{event}/', 'admin', 5, {'location': 'Hall 1'}),
+        Endpoint('event-destroy', 'delete', None, 'creator', 6),
+        Endpoint('event-participants', 'get', f'/api/events/{event}/participants/', 'admin', 2),
+        Endpoint('event-participants-export', 'get', f'/api/events/{event}/participants/?export=csv', 'admin', 2),
+        Endpoint('event-enroll', 'post', f'/api/events/{event}/enroll/', 'creator', 5,
+                 {'users': [context['user'].pk, context['admin'].pk]}),
+        Endpoint('event-join', 'post', f'/api/events/{join_event}/join/', 'user', 8),
+        Endpoint('event-leave', 'post', f'/api/events/{join_event}/leave/', 'user', 7),
+        Endpoint('event-stream', 'get', f'/api/events/stream/?events={event},{join_event}', 'anonymous', 2,
+                 asgi=True),
+        Endpoint('event-cache-stats', 'get', '/api/events/cache-stats/', 'admin', 0),
+        Endpoint('participant-list', 'get', '/api/events/participants/', 'user', 2),
+        Endpoint('participant-list-creator', 'get', '/api/events/participants/', 'creator', 2),
+        Endpoint('participant-detail', 'get', f"/api/events/participants/{context['participant'].pk}/", 'admin', 1),
+        # async events
+        Endpoint('async-event-list', 'get', '/api/async/events/', 'user', 2),
+        Endpoint('async-event-detail', 'get', f'/api/async/events/{event}/', 'user', 2),
+        Endpoint('async-event-join', 'post', f'/api/async/events/{join_event}/join/', 'user', 8),
+        Endpoint('async-event-leave', 'post', f'/api/async/events/{join_event}/leave/', 'user', 7),
+        # logs
+        Endpoint('eventlog-list', 'get', '/api/logs/', 'admin', 2),
+        Endpoint('eventlog-list-creator', 'get', '/api/logs/', 'creator', 2),
+        Endpoint('eventlog-list-user', 'get', '/api/logs/', 'user', 2),
+        Endpoint('eventlog-archive', 'get', '/api/logs/archive/?since=2000-01-01T00:00:00Z&until=2000-01-31T00:00:00Z',
+                 'user', 2),
+        Endpoint('event-activity', 'get', f'/api/logs/analytics/events/{event}/?granularity=day', 'admin', 3),
+        Endpoint('creator-activity', 'get', f"/api/logs/analytics/creators/{context['creator'].pk}/", 'creator', 1),
+        Endpoint('eventlog-detail', 'get', f"/api/logs/{context['log'].pk}/", 'admin', 1),
+        # monitoring
+        Endpoint('metrics', 'get', '/metrics', 'anonymous', 0),
+        Endpoint('metrics-profile', 'get', '/metrics/profile/?route=event-list', 'staff', 2),
+        # admin site and documentation
+        Endpoint('admin-event-changelist', 'get', '/admin/events/event/', 'staff', 7),
+        Endpoint('admin-participant-changelist', 'get', '/admin/events/participant/', 'staff', 7),
+        Endpoint('admin-eventlog-changelist', 'get', '/admin/logs/eventlog/', 'staff', 7),
+        Endpoint('admin-user-changelist', 'get', '/admin/users/user/', 'staff', 5),
+        Endpoint('schema-swagger', 'get', '/swagger/?format=openapi', 'anonymous', 0),
+        Endpoint('schema-redoc', 'get', '/redoc/', 'anonymous', 0),
+    ], deletable
+
+
+def client_for(actor, context):
+    client = APIClient()
+    if actor == 'staff':
+        client.force_login(context['admin'])
+    elif actor != 'anonymous':
+        # Real bearer tokens as issued at login, so authentication cost is part of the measurement
+        token = CustomTokenObtainPairSerializer.get_token(context[actor]).access_token
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    return client
+
+
+@async_to_sync
+async def asgi_get(path):
+    # Anonymous, through the ASGI handler; a stream is read up to its first message and closed
+    response = await AsyncClient().get(path)
+    if response.streaming:
+        messages = aiter(response.streaming_content)
+        await anext(messages)
+        await messages.aclose()
+        response.close()
+    return response
+
+
+def measure(endpoint, context, deletable, iterations=20):
+    client = client_for(endpoint.actor, context)
+    timings = []
+    queries = 0
+    status_code = None
+
+    # The first request warms up (the caller's cached auth state, the response
+    # cache generation) and is neither timed nor counted
+    for iteration in range(iterations + 1):
+        path = endpoint.path or f'/api/events/{next(deletable).pk}/'
+        data = endpoint.data() if callable(endpoint.data) else endpoint.data
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            if endpoint.asgi:
+                response = asgi_get(path)
+            else:
+                response = getattr(client, endpoint.method)(path, data, format='json')
+            if response.streaming and not endpoint.asgi:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+        timings.append(elapsed * 1000)
+        if iteration:
+            queries = max(queries, len(captured.captured_queries))
+        status_code = response.status_code
+
+        # Join and leave alternate, so each one always has something to do
+        if endpoint.name.endswith('event-join'):
+            client.post(f"/api/events/{context['join_event'].pk}/leave/")
+        elif endpoint.name.endswith('event-leave'):
+            client.post(f"/api/events/{context['join_event'].pk}/join/")
+
+    timings = sorted(timings[1:])
+    return {
+        'name': endpoint.name,
+        'method': endpoint.method.upper(),
+        'path': endpoint.path,
+        'actor': endpoint.actor,
+        'status': status_code,
+        'queries': queries,
+        'budget': endpoint.budget,
+        'p50_ms': round(statistics.median(timings), 3),
+        'p99_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.99))], 3),
+    }
+
+
+def run(context, iterations=20, only=None):
+    # The anonymous response cache would hide the database work being measured, and
+    # the throttles would reject the repeated joins; 'testserver' is the test
+    # client's host when running outside the test runner
+    results = []
+    with override_settings(
+        EVENT_RESPONSE_CACHE={'ENABLED': False}, THROTTLES={'ENABLED': False}, ALLOWED_HOSTS=['testserver'],
+    ):
+        endpoint_list, deletable = endpoints(context)
+        for endpoint in endpoint_list:
+            if only and endpoint.name not in only:
+                continue
+            if endpoint.name.endswith('event-leave'):
+                client_for('user', context).post(f"/api/events/{context['join_event'].pk}/join/")
+            results.append(measure(endpoint, context, deletable, iterations))
+            if endpoint.name.endswith('event-leave'):
+                client_for('user', context).post(f"/api/events/{context['join_event'].pk}/leave/")
+    return results
+
+
+def routes(patterns=None, prefix=''):
+    # Every route in config/urls.py, spelled as ResolverMatch.route spells it. The
+    # admin site's own routes, DRF's format suffix variants and the routers' API
+    # roots (shadowed by the list routes at the same path) are left out.
+    found = set()
+    for pattern in get_resolver().url_patterns if patterns is None else patterns:
+        route = str(pattern.pattern)
+        route = prefix + route.removeprefix('^') if prefix else route
+        if isinstance(pattern, URLResolver):
+            if pattern.namespace != 'admin':
+                found |= routes(pattern.url_patterns, route)
+        elif 'format' not in pattern.pattern.regex.groupindex and pattern.name != 'api-root':
+            found.add(route)
+    return found
+
+
+def budgeted_routes(context):
+    endpoint_list, deletable = endpoints(context)
+    return {
+        resolve(urlsplit(endpoint.path or f"/api/events/{context['event'].pk}/").path).route
+        for endpoint in endpoint_list
+    }
@@ -0,0 +1,497 @@
+"""
+Request metrics in the Prometheus text format.
+
+``MetricsMiddleware`` records, per resolved route (the URL name, for example
+``event-join`` or ``eventlog-list``) and method: the request latency, the
+number of SQL statements and the time spent in them, the time spent building
+the payload (``Serializer.data`` and the list projections) and rendering it
+(``Response.rendered_content``, whichever the renderer), and the body size.
+``/metrics`` serves them in the Prometheus text exposition format.
+
+SQL statements are counted by a wrapper installed with the database
+connections' ``execute_wrapper`` hook. It attributes a statement to the request
+through a context variable, so statements run by the async views in
+``sync_to_async`` threads count as well.
+
+Every process keeps its own counters in memory. With ``METRICS['DIR']`` set,
+each process also writes them to ``DIR/metrics-<pid>-<start>.json`` every
+``FLUSH_INTERVAL`` seconds and at exit, and ``/metrics`` adds up the files of
+all processes, those that have exited included, as Prometheus expects of
+counters. Empty the directory when the application is (re)deployed.
+
+Routes listed in ``PROFILE_ROUTES`` are also run under a sampling profiler:
+the stack of the thread serving the request is sampled every
+``PROFILE_INTERVAL`` seconds. ``/metrics/profile/?route=<name>`` returns the
+samples as folded stacks, the input format of flame graph tools, to logged-in
+admins and to clients in ``PROFILE_NETWORKS``. Under ASGI the sampled thread is
+the event loop's, which also runs other requests.
+"""
+import atexit
+import glob
+import ipaddress
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+from django.urls import Resolver404, resolve
+from django.utils.crypto import constant_time_compare
+from rest_framework.response import Response
+from rest_framework.serializers import BaseSerializer
+
+DEFAULTS = {
+    'ENABLED': True,
+    'DIR': None,
+    'FLUSH_INTERVAL': 5,
+    # Required as "Authorization: Bearer <token>" by /metrics when set
+    'TOKEN': None,
+    'LATENCY_BUCKETS': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    'QUERY_BUCKETS': (0, 1, 2, 3, 5, 10, 25, 50, 100),
+    'SIZE_BUCKETS': (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+    'PROFILE_ROUTES': (),
+    'PROFILE_INTERVAL': 0.005,
+    # Client networks allowed to read /metrics/profile/ besides logged-in admins
+    'PROFILE_NETWORKS': (),
+}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# name: (type, help, buckets setting)
+METRICS = {
+    'eventhub_requests_total': ('counter', 'Requests served, by route, method and status code.', None),
+    'eventhub_request_duration_seconds': ('histogram', 'Time to produce the response.', 'LATENCY_BUCKETS'),
+    'eventhub_db_queries': ('histogram', 'SQL statements run by one request.', 'QUERY_BUCKETS'),
+    'eventhub_db_duration_seconds_total': ('counter', 'Time spent in SQL statements.', None),
+    'eventhub_serialization_duration_seconds_total': ('counter', 'Time spent building response payloads.', None),
+    'eventhub_render_duration_seconds_total': ('counter', 'Time spent rendering response bodies.', None),
+    'eventhub_response_size_bytes': ('histogram', 'Size of non-streaming response bodies.', 'SIZE_BUCKETS'),
+}
+
+UNMATCHED = '<unmatched>'
+
+
+def metrics_settings():
+    return {**DEFAULTS, **getattr(settings, 'METRICS', {})}
+
+
+class RequestMetrics:
+    __slots__ = ('queries', 'db_time', 'serialization_time', 'render_time', 'timing')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialization_time = 0.0
+        self.render_time = 0.0
+        self.timing = False
+
+
+# Collector of the request being served, if any
+current = ContextVar('request_metrics', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - started
+
+
+def install(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver(connection_created)
+def install_on_new_connection(sender, connection, **kwargs):
+    install(connection)
+
+
+@contextmanager
+def timing(counter):
+    # Adds the time of the block to a counter of the request being served. Blocks
+    # inside a timed one are not counted again: a serializer read while rendering
+    # the browsable API counts as rendering.
+    metrics = current.get()
+    if metrics is None or metrics.timing:
+        yield
+        return
+    metrics.timing = True
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        setattr(metrics, counter, getattr(metrics, counter) + time.perf_counter() - started)
+        metrics.timing = False
+
+
+def serializing():
+    # Also usable as a decorator, for payloads built without a serializer
+    return timing('serialization_time')
+
+
+def rendering():
+    # For bodies rendered without a DRF Response
+    return timing('render_time')
+
+
+def instrument(cls, name, counter):
+    prop = cls.__dict__[name]
+    if getattr(prop.fget, 'metrics_counter', None):
+        return
+
+    def fget(instance):
+        with timing(counter):
+            return prop.fget(instance)
+    fget.metrics_counter = counter
+    setattr(cls, name, property(fget, prop.fset, prop.fdel, prop.__doc__))
+
+
+# Serializer.data and ListSerializer.data both read BaseSerializer.data
+instrument(BaseSerializer, 'data', 'serialization_time')
+instrument(Response, 'rendered_content', 'render_time')
+
+
+class Registry:
+    # Counters and histograms of one process, in a JSON-friendly shape:
+    # {name: {labels: value}}, where labels is a tuple of (key, value) pairs and
+    # a histogram value is [count per bucket..., count above the last bucket, sum]
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = defaultdict(dict)
+        self.profiles = defaultdict(Counter)
+
+    def inc(self, name, labels, amount=1):
+        with self.lock:
+            values = self.series[name]
+            values[labels] = values.get(labels, 0) + amount
+
+    def observe(self, name, labels, buckets, value):
+        index = next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))
+        with self.lock:
+            values = self.series[name]
+            histogram = values.get(labels)
+            if histogram is None:
+                histogram = values[labels] = [0] * (len(buckets) + 2)
+            histogram[index] += 1
+            histogram[-1] += value
+
+    def add_samples(self, route, samples):
+        with self.lock:
+            self.profiles[route].update(samples)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'series': {
+                    name: [[list(map(list, labels)), value] for labels, value in values.items()]
+                    for name, values in self.series.items()
+                },
+                'profiles': {route: dict(samples) for route, samples in self.profiles.items()},
+            }
+
+
+def merge(snapshots):
+    series = defaultdict(dict)
+    profiles = defaultdict(Counter)
+    for snapshot in snapshots:
+        for name, items in snapshot['series'].items():
+            values = series[name]
+            for labels, value in items:
+                labels = tuple(map(tuple, labels))
+                if labels not in values:
+                    values[labels] = list(value) if isinstance(value, list) else value
+                elif isinstance(value, list):
+                    values[labels] = [a + b for a, b in zip(values[labels], value)]
+                else:
+                    values[labels] += value
+        for route, samples in snapshot['profiles'].items():
+            profiles[route].update(samples)
+    return series, profiles
+
+
+def format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')) for key, value in labels
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def exposition(series, options):
+    lines = []
+    for name, (kind, help_text, buckets_setting) in METRICS.items():
+        values = series.get(name)
+        if not values:
+            continue
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        for labels, value in sorted(values.items()):
+            if kind != 'histogram':
+                lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip([*options[buckets_setting], '+Inf'], value[:-1]):
+                cumulative += count
+                le = bound if bound == '+Inf' else format_value(float(bound))
+                lines.append(f'{name}_bucket{format_labels((*labels, ("le", le)))} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} {format_value(value[-1])}')
+            lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+class Flusher:
+    # Writes this process's snapshot to the shared directory in the background
+
+    def __init__(self, registry, directory, interval):
+        self.registry = registry
+        self.path = os.path.join(directory, f'metrics-{os.getpid()}-{time.time_ns()}.json')
+        self.interval = interval
+        self._stopped = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name='metrics-flusher', daemon=True)
+        self._thread.start()
+
+    def flush(self):
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as fileobj:
+            json.dump(self.registry.snapshot(), fileobj)
+        os.replace(temporary, self.path)
+
+    def close(self):
+        self._stopped.set()
+        self._thread.join()
+        self.flush()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.flush()
+
+
+registry = Registry()
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def ensure_flusher(options):
+    global _flusher
+    if options['DIR'] and _flusher is None:
+        with _flusher_lock:
+            if _flusher is None:
+                _flusher = Flusher(registry, options['DIR'], options['FLUSH_INTERVAL'])
+    return _flusher
+
+
+@atexit.register
+def shutdown():
+    global _flusher
+    with _flusher_lock:
+        if _flusher is not None:
+            _flusher.close()
+            _flusher = None
+
+
+def reset_after_fork():
+    # Workers forked from a preloaded master start with empty counters and their own file
+    global registry, _flusher, _flusher_lock
+    registry = Registry()
+    _flusher = None
+    _flusher_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=reset_after_fork)
+
+
+@receiver(setting_changed)
+def reset_metrics(setting, **kwargs):
+    if setting == 'METRICS':
+        shutdown()
+        reset_after_fork()
+
+
+def collect(options):
+    # Series and profiles of every process
+    if not options['DIR']:
+        return merge([registry.snapshot()])
+    own = _flusher.path if _flusher is not None else None
+    snapshots = [registry.snapshot()]
+    for path in glob.glob(os.path.join(options['DIR'], 'metrics-*.json')):
+        if path == own:
+            continue
+        try:
+            with open(path, encoding='utf-8') as fileobj:
+                snapshots.append(json.load(fileobj))
+        except (OSError, ValueError):
+            continue  # removed or replaced while reading
+    return merge(snapshots)
+
+
+class Sampler:
+    # Samples the stack of one thread until stopped
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='metrics-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+
+def route_name(match):
+    if match is None:
+        return UNMATCHED
+    return match.view_name or match.route
+
+
+class MetricsMiddleware:
+    # Outermost middleware, so the latency covers the whole stack
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def start(self, request):
+        options = metrics_settings()
+        if not options['ENABLED']:
+            return None
+        ensure_flusher(options)
+        for connection in connections.all(initialized_only=True):
+            install(connection)
+        sampler = None
+        if options['PROFILE_ROUTES']:
+            try:
+                profiled = route_name(resolve(request.path_info)) in options['PROFILE_ROUTES']
+            except Resolver404:
+                profiled = False
+            if profiled:
+                sampler = Sampler(threading.get_ident(), options['PROFILE_INTERVAL'])
+        metrics = RequestMetrics()
+        return options, metrics, sampler, current.set(metrics), time.perf_counter()
+
+    def finish(self, request, response, state):
+        options, metrics, sampler, token, started = state
+        elapsed = time.perf_counter() - started
+        current.reset(token)
+        route = route_name(getattr(request, 'resolver_match', None))
+        labels = (('route', route), ('method', request.method))
+        registry.inc('eventhub_requests_total', (*labels, ('status', str(response.status_code))))
+        registry.observe('eventhub_request_duration_seconds', labels, options['LATENCY_BUCKETS'], elapsed)
+        registry.observe('eventhub_db_queries', labels, options['QUERY_BUCKETS'], metrics.queries)
+        registry.inc('eventhub_db_duration_seconds_total', labels, metrics.db_time)
+        registry.inc('eventhub_serialization_duration_seconds_total', labels, metrics.serialization_time)
+        registry.inc('eventhub_render_duration_seconds_total', labels, metrics.render_time)
+        if not response.streaming:
+            registry.observe('eventhub_response_size_bytes', labels, options['SIZE_BUCKETS'], len(response.content))
+        if sampler is not None:
+            registry.add_samples(route, sampler.stop())
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.start(request)
+        if state is None:
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            current.reset(state[3])
+            if state[2] is not None:
+                state[2].stop()
+            raise
+        self.finish(request, response, state)
+        return response
+
+    async def __acall__(self, request):
+        state = self.start(request)
+        if state is None:
+            return await self.get_response(request)
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            current.reset(state[3])
+            if state[2] is not None:
+                state[2].stop()
+            raise
+        self.finish(request, response, state)
+        return response
+
+
+def authorized(request, options):
+    if not options['TOKEN']:
+        return True
+    return constant_time_compare(request.headers.get('Authorization', ''), f"Bearer {options['TOKEN']}")
+
+
+def metrics_view(request):
+    options = metrics_settings()
+    if not authorized(request, options):
+        return HttpResponseForbidden()
+    series, _ = collect(options)
+    return HttpResponse(exposition(series, options), content_type=CONTENT_TYPE)
+
+
+def profile_allowed(request, options):
+    # Stacks show the code and the data in it: an admin's session, or the token
+    # (when set) from an address in PROFILE_NETWORKS
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated and user.is_admin:
+        return True
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return authorized(request, options) and any(
+        address in ipaddress.ip_network(network) for network in options['PROFILE_NETWORKS']
+    )
+
+
+def profile_view(request):
+    options = metrics_settings()
+    if not profile_allowed(request, options):
+        return HttpResponseForbidden()
+    _, profiles = collect(options)
+    samples = profiles.get(request.GET.get('route', ''), {})
+    body = ''.join(f'{stack} {count}\n' for stack, count in sorted(samples.items()))
+    return HttpResponse(body, content_type='text/plain; charset=utf-8')
@@ -0,0 +1,193 @@
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, PageNumberPagination
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    CursorPagination positions its cursors on the value of the first ordering
+    field alone and skips the rows tied on it with an offset, which drifts when
+    the direction changes: walking back through long runs of equal values skips
+    or repeats rows. The primary key is appended to every ordering, and when the
+    ordering is then ``(field, id)`` the cursor position is that pair: pages are
+    read after it with a row-value comparison and no offset is ever needed.
+    Longer orderings keep CursorPagination's behaviour.
+    """
+    tiebreaker = 'id'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not any(field.lstrip('-') in (self.tiebreaker, 'pk') for field in ordering):
+            ordering += (self.tiebreaker,)
+        return ordering
+
+    def is_keyset(self, ordering):
+        return (
+            len(ordering) == 2
+            and ordering[0].lstrip('-') not in (self.tiebreaker, 'pk')
+            and ordering[1].lstrip('-') in (self.tiebreaker, 'pk')
+        )
+
+    def _get_position_from_instance(self, instance, ordering):
+        position = super()._get_position_from_instance(instance, ordering)
+        if not self.is_keyset(ordering):
+            return position
+        key = instance[self.tiebreaker] if isinstance(instance, dict) else instance.pk
+        return json.dumps([position, key])
+
+    def keyset_filter(self, position, reverse):
+        # Rows after (value, key) in the ordering; before it for previous pages
+        try:
+            value, key = json.loads(position)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        field, tiebreaker = (name.lstrip('-') for name in self.ordering)
+        after, tie_after = ('lt' if name.startswith('-') != reverse else 'gt' for name in self.ordering)
+        return Q(**{f'{field}__{after}e': value}) & (
+            Q(**{f'{field}__{after}': value}) | Q(**{f'{tiebreaker}__{tie_after}': key})
+        )
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if cursor is not None and self.keyset_position is not None:
+            # Applied in paginate_queryset; CursorPagination sees a cursor without a position
+            cursor = cursor._replace(position=None)
+        return cursor
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_position = None
+        self.ordering = self.get_ordering(request, queryset, view)
+        if self.is_keyset(self.ordering):
+            cursor = self.decode_cursor(request)
+            if cursor is not None and cursor.position is not None:
+                queryset = queryset.filter(self.keyset_filter(cursor.position, cursor.reverse))
+                self.keyset_position = cursor.position
+
+        page = super().paginate_queryset(queryset, request, view)
+
+        # The page starts after the position, so there is one on the side it came from
+        if self.keyset_position is not None:
+            if self.cursor.reverse:
+                self.has_next, self.next_position = True, self.keyset_position
+            else:
+                self.has_previous, self.previous_position = True, self.keyset_position
+        return page
+
+
+class OptInCursorPagination(PageNumberPagination):
+    """
+    Page number pagination by default. Clients opt into keyset pagination by
+    sending ``?pagination=cursor``; the ``next``/``previous`` links then carry an
+    opaque ``cursor`` parameter instead of ``page``, which avoids the COUNT(*)
+    and the OFFSET scan.
+    """
+    cursor_ordering = None
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+
+    def use_cursor(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.cursor_query_param in request.query_params
+        )
+
+    def get_cursor_paginator(self):
+        paginator = KeysetCursorPagination()
+        paginator.ordering = self.cursor_ordering
+        paginator.page_size = self.page_size
+        paginator.cursor_query_param = self.cursor_query_param
+        return paginator
+
+    def position_fields(self, request, queryset, view=None):
+        # The fields a cursor page reads its positions from; none for page numbers
+        if not self.use_cursor(request):
+            return ()
+        ordering = self.get_cursor_paginator().get_ordering(request, queryset, view)
+        return tuple(field.lstrip('-') for field in ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = self.get_cursor_paginator() if self.use_cursor(request) else None
+        if self.cursor_paginator:
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # paginate_queryset() for async views: the COUNT and the page are read with
+        # the async ORM. Cursor pages are read in a thread, their query is built and
+        # evaluated inside CursorPagination.
+        self.cursor_paginator = self.get_cursor_paginator() if self.use_cursor(request) else None
+        if self.cursor_paginator:
+            return await sync_to_async(self.cursor_paginator.paginate_queryset)(queryset, request, view)
+
+        self.request = request
+        paginator = self.django_paginator_class(queryset, self.get_page_size(request))
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        self.page.object_list = [item async for item in self.page.object_list]
+        return list(self.page)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class EventPagination(OptInCursorPagination):
+    cursor_ordering = ('-date', 'id')
+
+
+class EventLogPagination(OptInCursorPagination):
+    cursor_ordering = ('-timestamp', 'id')
+
+
+class ParticipantPagination(OptInCursorPagination):
+    cursor_ordering = ('joined_at', 'id')
+
+
+class SegmentCursorPagination(CursorPagination):
+    """
+    Pages over archived records read as ``(segment id, record)`` pairs in
+    archive order. The cursor is the pair of the last record on a page and the
+    next page resumes reading behind it, so a request only decompresses the
+    segments its page spans. Forward only: segments are not read backwards.
+    """
+
+    def get_after(self, request):
+        cursor = self.decode_cursor(request)
+        if cursor is None or cursor.position is None:
+            return None
+        try:
+            segment, key = json.loads(cursor.position)
+            return int(segment), int(key)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_records(self, pairs, request):
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        # One extra record tells whether there is a next page
+        page = list(islice(pairs, self.page_size + 1))
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        if self.has_next:
+            segment, record = page[-1]
+            self.next_position = json.dumps([segment, record['id']])
+        return [record for segment, record in page]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self.next_position))
+
+    def get_previous_link(self):
+        return None
@@ -0,0 +1,39 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # optional: JSONRenderer's json.dumps is used instead
+    orjson = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    ``JSONRenderer`` that encodes with orjson when it is installed.
+
+    The output is the same bytes as ``JSONRenderer``'s compact UTF-8 output.
+    Values orjson does not handle the same way go through the DRF encoder: dates and
+    times (DRF cuts them to milliseconds), Decimals and lazy strings. Indented output
+    (``; indent=``), ASCII-only or non-strict settings, and anything orjson refuses
+    (such as integers above 64 bits) fall back to ``JSONRenderer``. Two differences
+    are left, and no API payload hits either: floats in exponent notation (``1e-07``
+    is written ``1e-7``), and NaN or infinity, which are written as null instead of
+    raising an error.
+    """
+    options = (
+        orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if orjson else 0
+    )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or self.ensure_ascii or not (self.compact and self.strict)
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            rendered = orjson.dumps(data, default=self.encoder_class().default, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # JSONRenderer escapes the two line separators that are invalid in JavaScript strings
+        return rendered.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
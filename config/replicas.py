@@ -0,0 +1,150 @@
+"""
+Read replica routing.
+
+While ``ReplicaMiddleware`` serves a safe-method request (GET, HEAD, OPTIONS)
+under one of the ``PATHS``, ``ReplicaRouter`` sends its reads to a replica. The
+replica is picked at random among ``DATABASE_REPLICAS['ALIASES']``, once per
+request. Everything else goes to the primary (``default``): writes, reads
+inside a transaction, other requests, and management commands.
+
+Replicas lag behind the primary. A user whose request changed data (any other
+method that succeeded) is pinned to the primary for ``STICKY_SECONDS``, so
+their next reads see their own writes, for example the event they just joined.
+The pin is kept in the cache under the user id from the JWT. Use a cache shared
+by all workers when several processes serve the API.
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from users.authentication import ClaimsJWTAuthentication
+
+DEFAULTS = {
+    'ALIASES': [],
+    'PATHS': ['/api/events/', '/api/async/events/', '/api/logs/'],
+    'STICKY_SECONDS': 5,
+    'CACHE_ALIAS': 'default',
+}
+
+# Replica serving the reads of the current request, if any
+current_replica = ContextVar('current_replica', default=None)
+
+authentication = ClaimsJWTAuthentication()
+
+
+def replica_settings():
+    return {**DEFAULTS, **getattr(settings, 'DATABASE_REPLICAS', {})}
+
+
+def pin_key(user_id):
+    return f'db:primary:{user_id}'
+
+
+def pin_to_primary(user_id):
+    options = replica_settings()
+    caches[options['CACHE_ALIAS']].set(pin_key(user_id), True, options['STICKY_SECONDS'])
+
+
+def is_pinned(user_id):
+    return caches[replica_settings()['CACHE_ALIAS']].get(pin_key(user_id)) is not None
+
+
+def may_lag(since):
+    # Whether the current request reads from a replica that may not have caught up
+    # with a write committed at `since` (a time.time() timestamp) yet
+    return current_replica.get() is not None and time.time() - since < replica_settings()['STICKY_SECONDS']
+
+
+def token_user_id(request):
+    # Verifying the signature needs no query; DRF authenticates the request again later
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        return None
+    try:
+        return authentication.get_validated_token(raw_token).get(api_settings.USER_ID_CLAIM)
+    except (InvalidToken, TokenError):
+        return None
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        replica = current_replica.get()
+        if replica is None:
+            return None
+        # A transaction on the primary must see its own writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        # Also for instances read from a replica, which would otherwise be saved there
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # every alias holds the same data
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema from the primary
+        if db in replica_settings()['ALIASES']:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def route(self, request):
+        # The replica for this request (None for the primary), and the caller's user id
+        options = replica_settings()
+        if not options['ALIASES']:
+            return None, None
+        user_id = token_user_id(request)
+        if (
+            request.method in SAFE_METHODS
+            and request.path.startswith(tuple(options['PATHS']))
+            and (user_id is None or not is_pinned(user_id))
+        ):
+            return random.choice(options['ALIASES']), user_id
+        return None, user_id
+
+    def finish(self, request, response, user_id):
+        if request.method not in SAFE_METHODS and user_id is not None and response.status_code < 400:
+            pin_to_primary(user_id)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        replica, user_id = self.route(request)
+        token = current_replica.set(replica)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_replica.reset(token)
+        self.finish(request, response, user_id)
+        return response
+
+    async def __acall__(self, request):
+        replica, user_id = self.route(request)
+        token = current_replica.set(replica)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_replica.reset(token)
+        self.finish(request, response, user_id)
+        return response
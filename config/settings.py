@@ -60,6 +60,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'config.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -67,6 +68,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'config.replicas.ReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -109,9 +111,38 @@ DATABASES = {
 #         'PASSWORD': os.environ.get('DB_PASSWORD'),
 #         'HOST': os.environ.get('DB_HOST', 'db'),
 #         'PORT': os.environ.get('DB_PORT', '5432'),
-#     }
+#     },
+#     # Streaming replicas of the primary; list them in DATABASE_REPLICAS['ALIASES']
+#     'replica1': {
+#         'ENGINE': 'django.db.backends.postgresql',
+#         'NAME': os.environ.get('DB_NAME', 'event_management'),
+#         'USER': os.environ.get('DB_USER', 'mohammad'),
+#         'PASSWORD': os.environ.get('DB_PASSWORD'),
+#         'HOST': os.environ.get('DB_REPLICA_HOST', 'db-replica'),
+#         'PORT': os.environ.get('DB_PORT', '5432'),
+#         'TEST': {'MIRROR': 'default'},
+#     },
 # }
 
+# Local read replica profile: DB_SQLITE_REPLICAS=2 adds db-replica1.sqlite3 and
+# db-replica2.sqlite3, which `python manage.py sync_sqlite_replicas` copies from the primary
+for index in range(1, int(os.environ.get('DB_SQLITE_REPLICAS', 0)) + 1):
+    DATABASES[f'replica{index}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'db-replica{index}.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# Safe-method API reads go to a replica; writers stay on the primary for a while
+# (see config/replicas.py)
+DATABASE_ROUTERS = ['config.replicas.ReplicaRouter']
+DATABASE_REPLICAS = {
+    'ALIASES': [alias for alias in DATABASES if alias != 'default'],
+    'PATHS': ['/api/events/', '/api/async/events/', '/api/logs/'],
+    'STICKY_SECONDS': int(os.environ.get('DB_STICKY_SECONDS', 5)),
+    'CACHE_ALIAS': 'default',
+}
+
 AUTH_USER_MODEL = 'users.User'
 
 # Password validation
@@ -162,7 +193,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -170,6 +201,10 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'config.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
 }
@@ -213,6 +248,110 @@ SIMPLE_JWT = {
 EVENT_MANAGEMENT = {
     'MAX_OPEN_EVENTS_PER_USER': 5,
     'DEFAULT_EVENT_CAPACITY': 50,
+    # Participants embedded in the event detail response
+    'DETAIL_PARTICIPANTS_LIMIT': 50,
+    # Items accepted by one bulk enrollment or bulk event creation request
+    'MAX_BULK_ITEMS': 5000,
+    # Seconds a failed join's "full" or "closed" answer is reused (see events/availability.py)
+    'UNAVAILABLE_TTL': 2,
+}
+
+CACHES = {
+    'default': {
+        # e.g. django.core.cache.backends.filebased.FileBasedCache to share across workers
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'eventhub'),
+    }
+}
+
+# Anonymous event list/detail response cache (see events/cache.py)
+EVENT_RESPONSE_CACHE = {
+    'ENABLED': os.environ.get('EVENT_RESPONSE_CACHE', 'True') == 'True',
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+}
+
+# Claims-based JWT authentication state cache (see users/authentication.py)
+JWT_USER_CACHE = {
+    'ENABLED': os.environ.get('JWT_USER_CACHE', 'True') == 'True',
+    'ALIAS': 'default',
+    'MAX_SIZE': 10000,
+    'TIMEOUT': 30,
+}
+
+# Buffered EventLog writes (see logs/writer.py)
+EVENT_LOG_BUFFER = {
+    'ENABLED': os.environ.get('EVENT_LOG_BUFFER', 'False') == 'True',
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 1.0,
+    'MAX_PENDING': 10000,
+    'ENQUEUE_TIMEOUT': 0.5,
+    'SPOOL_DIR': os.environ.get('EVENT_LOG_SPOOL_DIR'),
+}
+
+# Event logs older than RETENTION_DAYS are moved to compressed segment files
+# by the archive_event_logs command (see logs/archive.py)
+EVENT_LOG_ARCHIVE = {
+    'DIR': os.environ.get('EVENT_LOG_ARCHIVE_DIR', str(BASE_DIR / 'log-archive')),
+    'RETENTION_DAYS': int(os.environ.get('EVENT_LOG_RETENTION_DAYS', 90)),
+    'BATCH_SIZE': 5000,
+    'MAX_RANGE_DAYS': 31,
+}
+
+# Server-sent capacity updates (see events/live.py)
+EVENT_STREAM = {
+    'MAX_EVENTS': 100,
+    'POLL_INTERVAL': 5,
+    'HEARTBEAT': 15,
+}
+
+# Event coordinates and the near= filter (see events/geo.py). GAZETTEER is a CSV
+# file with name,latitude,longitude columns used to geocode event locations.
+EVENT_GEO = {
+    'GEOCODER': 'events.geo.GazetteerGeocoder',
+    'GAZETTEER': os.environ.get('EVENT_GAZETTEER'),
+    'PRECISION': 9,
+    'MAX_CELLS': 32,
+    'DEFAULT_RADIUS_KM': 10,
+    'MAX_RADIUS_KM': 500,
+}
+
+# Closing of events whose date has passed (see events/sweeper.py). ENABLED runs a
+# sweeper thread in every WSGI/ASGI process; otherwise schedule close_past_events.
+EVENT_SWEEPER = {
+    'ENABLED': os.environ.get('EVENT_SWEEPER', 'False') == 'True',
+    'INTERVAL': 60,
+    'BATCH_SIZE': 1000,
+    'GRACE_MINUTES': 0,
+}
+
+# Request metrics served at /metrics in the Prometheus format (see config/metrics.py).
+# With several worker processes, point DIR at a directory they share and empty it on deploy.
+METRICS = {
+    'ENABLED': os.environ.get('METRICS', 'True') == 'True',
+    'DIR': os.environ.get('METRICS_DIR'),
+    'FLUSH_INTERVAL': 5,
+    'TOKEN': os.environ.get('METRICS_TOKEN'),
+    'PROFILE_ROUTES': [route for route in os.environ.get('METRICS_PROFILE_ROUTES', '').split(',') if route],
+    'PROFILE_INTERVAL': 0.005,
+    # Besides logged-in admins; behind a proxy on the same host every client is 127.0.0.1
+    'PROFILE_NETWORKS': [network for network in os.environ.get('METRICS_PROFILE_NETWORKS', '').split(',') if network],
+}
+
+# Token bucket throttles on join/leave and the token endpoints (see config/throttling.py).
+# The default store is the cache above; use a cache shared by all workers, or
+# THROTTLE_STORE=config.throttling.SQLiteStore with THROTTLE_DB on a single host.
+THROTTLES = {
+    'ENABLED': os.environ.get('THROTTLES', 'True') == 'True',
+    'STORE': os.environ.get('THROTTLE_STORE', 'config.throttling.CacheStore'),
+    'CACHE_ALIAS': 'default',
+    'PATH': os.environ.get('THROTTLE_DB', str(BASE_DIR / 'throttle.sqlite3')),
+    'RATES': {
+        'participation-user': '20/min',
+        'participation-ip': '120/min',
+        'participation-event': '50/s',
+        'token-ip': '20/min',
+    },
 }
 
 CORS_ALLOW_CREDENTIALS = True
@@ -0,0 +1,81 @@
+from rest_framework.exceptions import ValidationError
+
+
+def requested_fields(request, available):
+    # ?fields=a,b keeps the listed fields, ?omit=a,b drops them. Returns the selected
+    # names in the serializer's order, or None when the whole payload is wanted.
+    params = [param for param in ('fields', 'omit') if param in request.query_params]
+    if not params:
+        return None
+    if len(params) > 1:
+        raise ValidationError({'fields': ['Use either fields or omit, not both.']})
+
+    param = params[0]
+    names = [name.strip() for name in request.query_params[param].split(',') if name.strip()]
+    if not names:
+        raise ValidationError({param: ['Expected a comma-separated list of field names.']})
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValidationError({param: [
+            f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(available)}."
+        ]})
+    if param == 'fields':
+        return tuple(name for name in available if name in names)
+    return tuple(name for name in available if name not in names)
+
+
+def trim_serializer(serializer, fields):
+    # Drop the unrequested fields before anything is read; for many=True they are
+    # dropped from the child serializer, which renders every item
+    if fields is not None:
+        target = getattr(serializer, 'child', serializer)
+        for name in list(target.fields):
+            if name not in fields:
+                target.fields.pop(name)
+    return serializer
+
+
+def project_queryset(queryset, fields, columns=None, keep=()):
+    # Load only the columns the selected fields read. columns maps a field to them
+    # ('creator_name': ('creator__first_name', 'creator__last_name')); by default
+    # a field reads the column of its own name. Relations no selected field reads
+    # are not joined any more.
+    if fields is None:
+        return queryset
+    selected = set(keep)
+    for name in fields:
+        selected.update((columns or {}).get(name, (name,)))
+    relations = {column.split('__')[0] for column in selected if '__' in column}
+
+    queryset = queryset.select_related(None)
+    if relations:
+        queryset = queryset.select_related(*relations)
+    return queryset.only(*selected)
+
+
+class SparseFieldsMixin:
+    """
+    ``?fields=`` / ``?omit=`` for the list and retrieve actions of a viewset whose
+    serializer is a ``ModelSerializer``. Both the response and the query are
+    trimmed: ``sparse_columns`` maps fields that read other or several columns,
+    and ``sparse_keep`` lists columns the view needs whatever is requested (for
+    example the cursor pagination ordering).
+    """
+    sparse_actions = ('list', 'retrieve')
+    sparse_columns = {}
+    sparse_keep = ()
+
+    def get_sparse_fields(self):
+        if self.action not in self.sparse_actions:
+            return None
+        if not hasattr(self, '_sparse_fields'):
+            self._sparse_fields = requested_fields(self.request, self.get_serializer_class().Meta.fields)
+        return self._sparse_fields
+
+    def filter_queryset(self, queryset):
+        return project_queryset(
+            super().filter_queryset(queryset), self.get_sparse_fields(), self.sparse_columns, self.sparse_keep,
+        )
+
+    def get_serializer(self, *args, **kwargs):
+        return trim_serializer(super().get_serializer(*args, **kwargs), self.get_sparse_fields())
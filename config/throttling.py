@@ -0,0 +1,193 @@
+"""
+Token bucket throttles backed by a store shared by the worker processes.
+
+A bucket holds up to N tokens and refills at N per period, so ``'20/min'``
+allows a burst of 20 requests and then one every 3 seconds. Each request takes
+a token; a request that finds the bucket empty is answered with 429 and a
+``Retry-After`` of the time until the next token.
+
+A throttle's rate is ``THROTTLES['RATES']['<scope>-<kind>']``, where the scope is
+the view's ``throttle_scope`` and the kind is ``user`` (the authenticated user,
+or the client IP), ``ip`` or ``event`` (the event in the URL). A scope without a
+rate for a kind is not throttled by it.
+
+The buckets live in the store named by ``THROTTLES['STORE']``:
+
+- ``CacheStore`` (default) keeps them in the ``CACHE_ALIAS`` cache, which must
+  be shared by the workers (Redis, Memcached) for the limits to hold across
+  processes. Two processes taking the last token at the same moment may both
+  get it, so a limit can be exceeded by the number of concurrent workers.
+- ``SQLiteStore`` keeps them in the SQLite file at ``PATH`` and updates them in
+  a write transaction: exact across the processes of one host. It is the
+  stand-in for a shared store in tests and local multi-worker setups.
+
+A store is any class with ``take(key, capacity, refill_rate)`` returning
+``(allowed, wait)``.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+DEFAULTS = {
+    'ENABLED': True,
+    'STORE': 'config.throttling.CacheStore',
+    'CACHE_ALIAS': 'default',
+    'PATH': None,
+    'RATES': {},
+}
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def throttle_settings():
+    return {**DEFAULTS, **getattr(settings, 'THROTTLES', {})}
+
+
+def parse_rate(rate):
+    # '20/min' -> (capacity 20, refill 20 / 60 tokens per second)
+    count, period = rate.split('/')
+    count = int(count)
+    return count, count / PERIODS[period[0]]
+
+
+def refill(state, now, capacity, refill_rate):
+    # Tokens in a bucket last seen as `state` (tokens, timestamp), or a full one
+    if state is None:
+        return float(capacity)
+    tokens, updated = state
+    return min(float(capacity), tokens + max(0.0, now - updated) * refill_rate)
+
+
+def take_token(tokens, refill_rate):
+    # (tokens left, allowed, seconds until a token is available)
+    if tokens >= 1:
+        return tokens - 1, True, 0.0
+    return tokens, False, (1 - tokens) / refill_rate
+
+
+class CacheStore:
+    def __init__(self, options):
+        self.cache = caches[options['CACHE_ALIAS']]
+
+    def take(self, key, capacity, refill_rate):
+        key = f'throttle:{key}'
+        now = time.time()
+        tokens, allowed, wait = take_token(refill(self.cache.get(key), now, capacity, refill_rate), refill_rate)
+        # An untouched bucket is full again once the timeout passes
+        self.cache.set(key, (tokens, now), timeout=int(capacity / refill_rate) + 1)
+        return allowed, wait
+
+
+class SQLiteStore:
+    def __init__(self, options):
+        self.path = str(options['PATH'])
+        self.local = threading.local()
+
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)'
+            )
+            # Buckets idle for a day are full; dropping them changes nothing
+            connection.execute('DELETE FROM buckets WHERE updated < ?', (time.time() - 86400,))
+            self.local.connection = connection
+        return connection
+
+    def take(self, key, capacity, refill_rate):
+        connection = self.connection()
+        # IMMEDIATE takes the write lock up front: one process updates a bucket at a time
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            state = connection.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens, allowed, wait = take_token(refill(state, now, capacity, refill_rate), refill_rate)
+            connection.execute(
+                'INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)', (key, tokens, now)
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return allowed, wait
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                options = throttle_settings()
+                _store = import_string(options['STORE'])(options)
+    return _store
+
+
+@receiver(setting_changed)
+def reset_store(setting, **kwargs):
+    global _store
+    if setting == 'THROTTLES':
+        _store = None
+
+
+class TokenBucketThrottle(BaseThrottle):
+    kind = None
+
+    def get_key(self, request, view):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        self.delay = None
+        options = throttle_settings()
+        rate = options['RATES'].get(f"{getattr(view, 'throttle_scope', None)}-{self.kind}")
+        if not options['ENABLED'] or rate is None:
+            return True
+        key = self.get_key(request, view)
+        if key is None:
+            return True
+        allowed, self.delay = get_store().take(f'{view.throttle_scope}-{self.kind}:{key}', *parse_rate(rate))
+        return allowed
+
+    def wait(self):
+        return self.delay
+
+
+class UserThrottle(TokenBucketThrottle):
+    kind = 'user'
+
+    def get_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+
+class IPThrottle(TokenBucketThrottle):
+    # Behind proxies, set REST_FRAMEWORK['NUM_PROXIES'] so the client address is used
+    kind = 'ip'
+
+    def get_key(self, request, view):
+        return self.get_ident(request)
+
+
+class EventThrottle(TokenBucketThrottle):
+    # All clients together, per event in the URL
+    kind = 'event'
+
+    def get_key(self, request, view):
+        return view.kwargs.get('pk')
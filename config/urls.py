@@ -15,11 +15,13 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from .metrics import metrics_view, profile_view
+
 schema_view = get_schema_view(
     openapi.Info(
         title="Event Management API",
@@ -37,8 +39,13 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/users/', include('users.urls')),
     path('api/events/', include('events.urls')),
+    path('api/async/events/', include('events.async_urls')),
     path('api/logs/', include('logs.urls')),
 
+    # Prometheus scrape target, with or without the trailing slash
+    re_path(r'^metrics/?$', metrics_view, name='metrics'),
+    path('metrics/profile/', profile_view, name='metrics-profile'),
+
     # API documentation
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
@@ -18,6 +18,9 @@ class EventAdmin(admin.ModelAdmin):
     date_hierarchy = 'date'
     inlines = [ParticipantInline]
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('creator')
+
     fieldsets = (
         (None, {
             'fields': ('name', 'description', 'creator')
@@ -34,16 +37,6 @@ class EventAdmin(admin.ModelAdmin):
         }),
     )
 
-    def participant_count(self, obj):
-        return obj.participant_count
-
-    participant_count.short_description = 'Participants'
-
-    def remaining_capacity(self, obj):
-        return obj.remaining_capacity
-
-    remaining_capacity.short_description = 'Remaining Capacity'
-
     def is_full(self, obj):
         return obj.is_full
 
@@ -0,0 +1,10 @@
+from django.urls import path
+from . import async_views
+
+# Mounted at /api/async/events/; same routes and payloads as EventViewSet
+urlpatterns = [
+    path('', async_views.event_list, name='async-event-list'),
+    path('<str:pk>/', async_views.event_detail, name='async-event-detail'),
+    path('<str:pk>/join/', async_views.event_join, name='async-event-join'),
+    path('<str:pk>/leave/', async_views.event_leave, name='async-event-leave'),
+]
@@ -0,0 +1,224 @@
+"""
+Async event endpoints for ASGI deployments.
+
+``/api/async/events/`` serves event list and detail, join and leave with the
+same payloads as ``EventViewSet``. The views reuse the viewset's queryset,
+filters, ordering, pagination and anonymous response cache. Only the database
+access is different: reads use the async ORM (``acount()``, ``aget()``, async
+iteration), so one ASGI worker keeps many requests in flight without holding
+a thread for each of them.
+
+Join and leave run their transaction in ``sync_to_async``, because Django does
+not support transactions in async code. The ?creator= filter validates its
+value with a query, the cursor paginator reads its page itself and the
+throttles wait on their store; these run in a thread as well.
+"""
+import functools
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import (
+    APIException, MethodNotAllowed, NotAuthenticated, NotFound, ValidationError as APIValidationError,
+)
+from rest_framework.request import Request
+
+from config.metrics import rendering
+from config.renderers import ORJSONRenderer
+from config.sparse import trim_serializer
+from users.authentication import ClaimsJWTAuthentication
+from . import live
+from .cache import cache_settings, generation_may_be_ahead, get_cache, record
+from .models import Event
+from .projections import event_payloads, project_events
+from .serializers import EventSerializer, ParticipantSerializer
+from .views import EventViewSet, join_event, leave_event, unavailable_response
+
+renderer = ORJSONRenderer()
+authentication = ClaimsJWTAuthentication()
+
+
+def render(data, status=200, headers=None):
+    if data is None:
+        return HttpResponse(status=status, headers=headers)
+    with rendering():
+        body = renderer.render(data)
+    return HttpResponse(body, content_type=renderer.media_type, status=status, headers=headers)
+
+
+async def authenticate(request):
+    # Tokens carrying the user claims authenticate from the user state cached in
+    # this process; older tokens, and states read from the shared cache or the
+    # user row, load in a thread
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        return AnonymousUser()
+    token = authentication.get_validated_token(raw_token)
+    if authentication.uses_database(token) or not authentication.reads_state_locally(token):
+        return await sync_to_async(authentication.get_user)(token)
+    return authentication.get_user(token)
+
+
+def endpoint(*methods):
+    # Method check, JWT authentication and DRF-style error payloads
+    def decorator(handler):
+        @csrf_exempt
+        @functools.wraps(handler)
+        async def view(request, *args, **kwargs):
+            try:
+                if request.method not in methods:
+                    raise MethodNotAllowed(request.method)
+                request = Request(request)
+                request.user = await authenticate(request)
+                return await handler(request, *args, **kwargs)
+            except APIException as exc:
+                headers = {}
+                if exc.status_code == 401:
+                    headers['WWW-Authenticate'] = authentication.authenticate_header(request)
+                if getattr(exc, 'wait', None) is not None:
+                    headers['Retry-After'] = str(math.ceil(exc.wait))
+                data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+                return render(data, exc.status_code, headers)
+        return view
+    return decorator
+
+
+def event_view(request, action, **kwargs):
+    # Own basename: cached pages carry links to /api/async/events/
+    return EventViewSet(
+        request=request, action=action, args=(), kwargs=kwargs, format_kwarg=None, basename='async-event',
+    )
+
+
+async def filtered_queryset(view):
+    queryset = view.get_queryset()
+    if 'creator' in view.request.query_params:
+        return await sync_to_async(view.filter_queryset)(queryset)
+    return view.filter_queryset(queryset)
+
+
+async def get_event(view):
+    queryset = await filtered_queryset(view)
+    try:
+        return await queryset.aget(pk=view.kwargs['pk'])
+    except Event.DoesNotExist:
+        raise NotFound('No Event matches the given query.')
+    except (TypeError, ValueError, ValidationError):
+        raise NotFound()
+
+
+async def cached(view, request, produce):
+    # AnonymousResponseCacheMixin.cached_response; writes bump the generation of
+    # both paths. Django's async cache methods would only run these calls in a thread.
+    options = cache_settings()
+    if not options['ENABLED'] or request.user.is_authenticated:
+        return render(await produce())
+
+    cache = get_cache()
+    key = view.cache_key(request)
+    data = cache.get(key)
+    if data is not None:
+        record(hit=True)
+        return render(data, headers={'X-Cache': 'HIT'})
+
+    record(hit=False)
+    data = await produce()
+    if not generation_may_be_ahead():
+        cache.set(key, data, options['TIMEOUT'])
+    return render(data, headers={'X-Cache': 'MISS'})
+
+
+@endpoint('GET')
+async def event_list(request):
+    view = event_view(request, 'list')
+
+    async def produce():
+        fields = view.get_sparse_fields()
+        queryset = await filtered_queryset(view)
+        queryset = project_events(queryset, fields, view.paginator.position_fields(request, queryset, view))
+        page = await view.paginator.apaginate_queryset(queryset, request, view)
+        return view.paginator.get_paginated_response(event_payloads(page, fields)).data
+
+    return await cached(view, request, produce)
+
+
+@endpoint('GET')
+async def event_detail(request, pk):
+    view = event_view(request, 'retrieve', pk=pk)
+
+    async def produce():
+        # EventDetailSerializer's payload; the embedded participants are read here
+        fields = view.get_sparse_fields()
+        event = await get_event(view)
+        data = trim_serializer(EventSerializer(event, context=view.get_serializer_context()), fields).data
+        if fields is None or 'participants' in fields:
+            limit = settings.EVENT_MANAGEMENT.get('DETAIL_PARTICIPANTS_LIMIT', 50)
+            participants = [participant async for participant in event.participants.select_related('user')[:limit]]
+            data['participants'] = ParticipantSerializer(participants, many=True).data
+        return data
+
+    return await cached(view, request, produce)
+
+
+def admit(view, request):
+    # The viewset's throttles, then the cached answer to a join of an event known
+    # to be full or closed (None when the change has to run)
+    view.check_throttles(request)
+    return unavailable_response(view.kwargs['pk']) if view.action == 'join' else None
+
+
+async def change_participation(request, pk, action, handler):
+    if not request.user.is_authenticated:
+        raise NotAuthenticated()
+    view = event_view(request, action, pk=pk)
+    # In a thread: a throttle store may block, SQLiteStore on its write lock
+    response = await sync_to_async(admit)(view, request)
+    if response is None:
+        event = await get_event(view)
+        response = await sync_to_async(handler)(event, request.user)
+    return render(response.data, response.status_code)
+
+
+@endpoint('POST')
+async def event_join(request, pk):
+    return await change_participation(request, pk, 'join', join_event)
+
+
+@endpoint('POST')
+async def event_leave(request, pk):
+    return await change_participation(request, pk, 'leave', leave_event)
+
+
+@endpoint('GET')
+async def event_stream(request):
+    # Server-sent capacity updates for ?events=1,2,3 (see events/live.py).
+    # Anonymous callers may watch open events only, as in the event list.
+    if not isinstance(request._request, ASGIRequest):
+        return render({'detail': 'The event stream is only served under ASGI.'}, 501)
+
+    max_events = live.stream_settings()['MAX_EVENTS']
+    try:
+        event_ids = list(dict.fromkeys(int(value) for value in request.query_params.get('events', '').split(',')))
+    except ValueError:
+        raise APIValidationError({'events': ['Expected a comma-separated list of event ids.']})
+    if len(event_ids) > max_events:
+        raise APIValidationError({'events': [f'At most {max_events} events can be watched at once.']})
+
+    view = event_view(request, 'list')
+    visible = [pk async for pk in view.get_queryset().filter(pk__in=event_ids).values_list('pk', flat=True)]
+    if not visible:
+        raise NotFound('No Event matches the given query.')
+
+    response = StreamingHttpResponse(
+        live.CapacityStream([event_id for event_id in event_ids if event_id in visible]),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx would otherwise buffer the stream
+    return response
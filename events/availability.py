@@ -0,0 +1,35 @@
+"""
+Cached "cannot join" answers.
+
+When a join fails because the event is full or no longer open, the reason is
+kept in the response cache for ``UNAVAILABLE_TTL`` seconds. Further joins of
+that event are rejected from the cache, with the same response, without a
+query. During a ticket drop the retries of everyone who missed out then never
+reach the database.
+
+Every write that frees a seat or reopens the event calls
+``live.capacity_changed()``, which drops the entry once the write commits.
+A failed join racing with such a write can store its answer just after the
+entry was dropped; the TTL bounds how long that stale answer is served.
+"""
+from django.conf import settings
+
+from .cache import get_cache
+
+
+def unavailable_key(event_id):
+    return f'events:unavailable:{event_id}'
+
+
+def mark_unavailable(event_id, message):
+    timeout = settings.EVENT_MANAGEMENT.get('UNAVAILABLE_TTL', 2)
+    get_cache().set(unavailable_key(event_id), str(message), timeout)
+
+
+def unavailable(event_id):
+    # The reason joins of the event fail, or None when unknown
+    return get_cache().get(unavailable_key(event_id))
+
+
+def forget(event_ids):
+    get_cache().delete_many([unavailable_key(event_id) for event_id in event_ids])
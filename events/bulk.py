@@ -0,0 +1,110 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+
+from logs.models import EventLog
+from logs.writer import log_events
+from .cache import bump_generation
+from .models import Event, Participant
+from .search import get_search_backend
+
+User = get_user_model()
+
+# Per-item outcomes reported by the bulk endpoints
+ENROLLED = 'enrolled'
+ALREADY_PARTICIPANT = 'already_participant'
+USER_NOT_FOUND = 'user_not_found'
+EVENT_FULL = 'event_full'
+EVENT_NOT_OPEN = 'event_not_open'
+CREATED = 'created'
+INVALID = 'invalid'
+QUOTA_EXCEEDED = 'quota_exceeded'
+
+
+def enroll(event, user_ids, enrolled_by, attempts=3):
+    # Set-based counterpart of one join per user: a handful of queries and one
+    # bulk insert for the whole list. Returns {user_id: outcome}.
+    for attempt in range(attempts):
+        try:
+            outcomes, emails = _enroll(event, list(dict.fromkeys(user_ids)))
+            break
+        except IntegrityError:
+            # A concurrent join inserted one of the users after our check and
+            # the whole batch rolled back; classify everyone again
+            if attempt == attempts - 1:
+                raise
+
+    enrolled = [user_id for user_id, outcome in outcomes.items() if outcome == ENROLLED]
+    log_events(
+        [
+            EventLog(
+                event=event, user_id=user_id, action=EventLog.Action.JOIN,
+                description=f"User {emails[user_id]} joined event {event.name}",
+                metadata={'enrolled_by': enrolled_by.pk},
+            )
+            for user_id in enrolled
+        ],
+        creators={event.pk: event.creator_id},
+    )
+    return outcomes
+
+
+def _enroll(event, user_ids):
+    outcomes = {}
+    with transaction.atomic():
+        emails = dict(User.objects.filter(pk__in=user_ids, is_active=True).values_list('pk', 'email'))
+        existing = set(event.participants.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+
+        candidates = []
+        for user_id in user_ids:
+            if user_id not in emails:
+                outcomes[user_id] = USER_NOT_FOUND
+            elif user_id in existing:
+                outcomes[user_id] = ALREADY_PARTICIPANT
+            else:
+                candidates.append(user_id)
+                outcomes[user_id] = ENROLLED
+
+        seats = Event.objects.reserve_seats(event.pk, len(candidates)) if candidates else 0
+        for user_id in candidates[seats or 0:]:
+            outcomes[user_id] = EVENT_NOT_OPEN if seats is None else EVENT_FULL
+
+        if seats:
+            # bulk_create skips the post_save counter signal; the seats are already counted
+            Participant.objects.bulk_create(
+                [Participant(event=event, user_id=user_id) for user_id in candidates[:seats]],
+                batch_size=1000,
+            )
+            bump_generation()
+    return outcomes, emails
+
+
+def create_events(creator, events):
+    # Bulk counterpart of Event.save() for unsaved events: one quota count for the
+    # whole batch instead of one per event. Returns one (outcome, event) pair per
+    # input, in order; rejected events are not saved.
+    max_open_events = settings.EVENT_MANAGEMENT.get('MAX_OPEN_EVENTS_PER_USER', 5)
+    results = []
+    with transaction.atomic():
+        open_events = Event.objects.filter(creator=creator, status=Event.Status.OPEN).count()
+        accepted = []
+        for event in events:
+            if event.status == Event.Status.OPEN:
+                if open_events >= max_open_events:
+                    results.append((QUOTA_EXCEEDED, event))
+                    continue
+                open_events += 1
+            event.creator = creator
+            event.remaining_capacity = event.capacity
+            event.locate()
+            accepted.append(event)
+            results.append((CREATED, event))
+
+        if accepted:
+            # bulk_create skips save() and the post_save search/cache signals
+            Event.objects.bulk_create(accepted, batch_size=1000)
+            backend = get_search_backend()
+            if backend is not None:
+                backend.index_events(accepted)
+            bump_generation()
+    return results
@@ -0,0 +1,114 @@
+import hashlib
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+from config.replicas import may_lag
+
+GENERATION_KEY = 'events:generation'
+# When the generation last moved; Last-Modified of event lists
+MODIFIED_KEY = 'events:modified'
+
+DEFAULTS = {
+    'ENABLED': True,
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+}
+
+_stats_lock = threading.Lock()
+stats = {'hits': 0, 'misses': 0}
+
+
+def cache_settings():
+    return {**DEFAULTS, **getattr(settings, 'EVENT_RESPONSE_CACHE', {})}
+
+
+def get_cache():
+    return caches[cache_settings()['ALIAS']]
+
+
+def get_generation():
+    cache = get_cache()
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Seed from the clock so a lost counter never reuses an old generation
+        cache.add(GENERATION_KEY, int(time.time() * 1000), timeout=None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def get_last_modified():
+    # A lost timestamp reads as "modified now", which never yields a stale 304
+    return get_cache().get(MODIFIED_KEY) or time.time()
+
+
+def generation_may_be_ahead():
+    # A lagging replica can serve data older than the current generation; such a
+    # response must not be cached or tagged under it
+    return may_lag(get_last_modified())
+
+
+def _bump_generation():
+    cache = get_cache()
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, int(time.time() * 1000), timeout=None)
+    cache.set(MODIFIED_KEY, time.time(), timeout=None)
+
+
+def bump_generation():
+    # Invalidate every cached response once the write is visible to readers
+    transaction.on_commit(_bump_generation)
+
+
+def record(hit):
+    with _stats_lock:
+        stats['hits' if hit else 'misses'] += 1
+
+
+def get_stats():
+    with _stats_lock:
+        return dict(stats)
+
+
+class AnonymousResponseCacheMixin:
+    # Caches list/retrieve payloads for anonymous callers. Authenticated users get
+    # per-user filters (joined, created) and are never served from the cache.
+
+    def cache_key(self, request):
+        query = urlencode(sorted(request.query_params.lists()), doseq=True)
+        parts = [self.basename, self.action, str(self.kwargs.get(self.lookup_url_kwarg or self.lookup_field, '')),
+                 request.get_host(), query]
+        digest = hashlib.md5('|'.join(parts).encode()).hexdigest()
+        return f'events:response:{get_generation()}:{digest}'
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        options = cache_settings()
+        if not options['ENABLED'] or request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+
+        cache = get_cache()
+        key = self.cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            record(hit=True)
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        record(hit=False)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200 and not generation_may_be_ahead():
+            cache.set(key, response.data, options['TIMEOUT'])
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
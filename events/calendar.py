@@ -0,0 +1,61 @@
+"""
+Per-day and per-week event counts for calendar views.
+
+``calendar_buckets()`` groups the events of a date range by the local day (or
+ISO week, starting on Monday) of their date in one query, counting them by
+status and by availability. It runs on whatever queryset the caller passes, so
+the event list's visibility rules and filters apply unchanged. Only buckets
+that hold events are returned.
+
+The counts are computed on read: the events of a month are one range scan of
+the date index, and a precomputed table could not follow the per-user
+visibility rules (joined and created events) anyway.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate, TruncWeek
+
+from .models import Event
+
+DAY = 'day'
+WEEK = 'week'
+
+COUNTS = {
+    'total': Count('pk'),
+    **{status.lower(): Count('pk', filter=Q(status=status)) for status in Event.Status.values},
+    # Open events that can still be joined, and events with no seat left
+    'available': Count('pk', filter=Q(status=Event.Status.OPEN, remaining_capacity__gt=0)),
+    'full': Count('pk', filter=Q(remaining_capacity=0)),
+}
+
+
+def date_range(start, end, tzinfo):
+    # [start 00:00, the day after end 00:00) in tzinfo
+    return (
+        datetime.combine(start, time.min, tzinfo=tzinfo),
+        datetime.combine(end + timedelta(days=1), time.min, tzinfo=tzinfo),
+    )
+
+
+def calendar_buckets(queryset, start, end, bucket, tzinfo):
+    since, until = date_range(start, end, tzinfo)
+    truncate = TruncDate if bucket == DAY else TruncWeek
+    rows = (
+        queryset.filter(date__gte=since, date__lt=until)
+        .order_by()
+        .annotate(bucket=truncate('date', tzinfo=tzinfo))
+        .values('bucket')
+        .annotate(**COUNTS)
+        .order_by('bucket')
+    )
+    buckets = []
+    for row in rows:
+        day = row.pop('bucket')
+        # TruncWeek yields a local midnight
+        buckets.append({'date': day.date() if isinstance(day, datetime) else day, **row})
+    return buckets
+
+
+def totals(buckets):
+    return {name: sum(bucket[name] for bucket in buckets) for name in COUNTS}
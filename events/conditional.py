@@ -0,0 +1,62 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .cache import generation_may_be_ahead, get_generation, get_last_modified
+
+
+class ConditionalGetMixin:
+    # Strong ETag and Last-Modified validators for list and retrieve, computed
+    # without serializing the body. If-None-Match and If-Modified-Since that still
+    # match are answered with 304 Not Modified.
+    #
+    # A detail is validated by its row's updated_at and participants_version
+    # (bumped by every join and leave), read by the lookup the handler needs anyway.
+    # A list is validated by the response cache generation, which moves on every
+    # event and participant write: no query at all. Lists filtered on the current
+    # time (time_relative_params) change without a write and get no validators.
+    time_relative_params = ()
+
+    def etag(self, request, *parts):
+        # The payload also depends on the renderer, the caller (visibility, joined and
+        # created filters) and the query string
+        query = urlencode(sorted(request.query_params.lists()), doseq=True)
+        parts = [self.basename, self.action, request.accepted_renderer.format, str(request.user.pk), query, *parts]
+        return '"%s"' % hashlib.md5('|'.join(map(str, parts)).encode()).hexdigest()
+
+    def list_validators(self, request):
+        return self.etag(request, get_generation()), get_last_modified()
+
+    def retrieve_validators(self, request):
+        # The handler serializes this same instance, so validation adds no query
+        event = self.validated_object = self.get_object()
+        last_modified = max(event.updated_at, event.participants_changed_at or event.updated_at)
+        return (
+            self.etag(request, event.pk, event.updated_at.isoformat(), event.participants_version),
+            last_modified.timestamp(),
+        )
+
+    def get_object(self):
+        return getattr(self, 'validated_object', None) or super().get_object()
+
+    def conditional_response(self, validators, handler, request, *args, **kwargs):
+        etag, last_modified = validators
+        response = get_conditional_response(request._request, etag=etag, last_modified=int(last_modified))
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        if generation_may_be_ahead() or any(param in request.query_params for param in self.time_relative_params):
+            return super().list(request, *args, **kwargs)
+        return self.conditional_response(self.list_validators(request), super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            self.retrieve_validators(request), super().retrieve, request, *args, **kwargs
+        )
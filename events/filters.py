@@ -1,8 +1,28 @@
 import django_filters
+from django import forms
 from django.utils import timezone
+from . import geo
 from .models import Event
 
 
+class PointField(forms.Field):
+    # "lat,lon" in degrees
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            latitude, longitude = (float(part) for part in value.split(','))
+        except ValueError:
+            raise forms.ValidationError('Expected "latitude,longitude" in degrees.')
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise forms.ValidationError('Latitude must be within [-90, 90] and longitude within [-180, 180].')
+        return latitude, longitude
+
+
+class PointFilter(django_filters.Filter):
+    field_class = PointField
+
+
 class EventFilter(django_filters.FilterSet):
     date_from = django_filters.DateTimeFilter(field_name='date', lookup_expr='gte')
     date_to = django_filters.DateTimeFilter(field_name='date', lookup_expr='lte')
@@ -11,6 +31,10 @@ class EventFilter(django_filters.FilterSet):
     max_capacity = django_filters.NumberFilter(method='filter_max_capacity')
     has_capacity = django_filters.BooleanFilter(method='filter_has_capacity')
     upcoming = django_filters.BooleanFilter(method='filter_upcoming')
+    near = PointFilter(method='filter_near')
+    radius_km = django_filters.NumberFilter(
+        method='filter_radius_km', min_value=0, max_value=geo.geo_settings()['MAX_RADIUS_KM'],
+    )
 
     class Meta:
         model = Event
@@ -26,16 +50,10 @@ class EventFilter(django_filters.FilterSet):
 
     # Filter events that have remaining capacity
     def filter_has_capacity(self, queryset, name, value):
-        from django.db.models import Count, F
-
-        queryset = queryset.annotate(
-            participant_count=Count('participants')
-        )
-
         if value:  # Has capacity
-            return queryset.filter(participant_count__lt=F('capacity'))
+            return queryset.filter(remaining_capacity__gt=0)
         else:  # No capacity
-            return queryset.filter(participant_count__gte=F('capacity'))
+            return queryset.filter(remaining_capacity=0)
 
     # Filter upcoming events
     def filter_upcoming(self, queryset, name, value):
@@ -46,3 +64,13 @@ class EventFilter(django_filters.FilterSet):
         else:  # Past events
             return queryset.filter(date__lt=now)
 
+    # Filter events within radius_km (default 10) of near=lat,lon
+    def filter_near(self, queryset, name, value):
+        radius_km = self.form.cleaned_data.get('radius_km')
+        if radius_km is None:
+            radius_km = geo.geo_settings()['DEFAULT_RADIUS_KM']
+        return geo.near(queryset, *value, float(radius_km))
+
+    # Applied by filter_near
+    def filter_radius_km(self, queryset, name, value):
+        return queryset
@@ -0,0 +1,161 @@
+"""
+Event coordinates and the "events near a point" filter.
+
+Events carry an optional latitude/longitude. When a save leaves them empty, the
+geocoder fills them in from the location text. The default geocoder looks the
+text up in a local gazetteer: a CSV file of ``name,latitude,longitude`` rows.
+Both the geocoder class and the file are set in ``EVENT_GEO``.
+
+Every located event also stores the geohash of its coordinates. A geohash
+prefix is a rectangular grid cell, so the events in a cell are one range scan
+of the geohash index. ``near()`` covers the search circle with at most
+MAX_CELLS cells, at the finest precision that stays under that count. Only the
+events in those cells get the exact great-circle distance check.
+"""
+import csv
+import functools
+import math
+from operator import or_
+
+from django.conf import settings
+from django.db.models import FloatField, Q, Value
+from django.db.models.functions import ASin, Cos, Least, Power, Radians, Sin, Sqrt
+from django.utils.module_loading import import_string
+
+DEFAULTS = {
+    'GEOCODER': 'events.geo.GazetteerGeocoder',
+    'GAZETTEER': None,
+    'PRECISION': 9,  # ~5 m cells
+    'MAX_CELLS': 32,
+    'DEFAULT_RADIUS_KM': 10,
+    'MAX_RADIUS_KM': 500,
+}
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+# Sorts after every geohash character: [prefix, prefix + END) holds the whole cell
+END = '~'
+
+
+def geo_settings():
+    return {**DEFAULTS, **getattr(settings, 'EVENT_GEO', {})}
+
+
+def encode(latitude, longitude, precision=None):
+    precision = precision or geo_settings()['PRECISION']
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        value, interval = (longitude, lon_range) if even else (latitude, lat_range)
+        middle = (interval[0] + interval[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits, bit_count = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    # (height, width) in degrees of a cell; longitude gets the odd bit
+    lat_bits = 5 * precision // 2
+    lon_bits = 5 * precision - lat_bits
+    return 180 / 2 ** lat_bits, 360 / 2 ** lon_bits
+
+
+def covering_cells(latitude, longitude, radius_km):
+    # Geohash prefixes of the cells that intersect the circle's bounding box
+    options = geo_settings()
+    lat_delta = radius_km / KM_PER_DEGREE
+    south, north = max(latitude - lat_delta, -90.0), min(latitude + lat_delta, 90.0)
+    if north >= 90 or south <= -90:
+        west, east = -180.0, 180.0  # the box contains a pole
+    else:
+        lon_delta = lat_delta / math.cos(math.radians(max(abs(south), abs(north))))
+        west, east = (-180.0, 180.0) if lon_delta >= 180 else (longitude - lon_delta, longitude + lon_delta)
+
+    for precision in range(options['PRECISION'], 0, -1):
+        height, width = cell_size(precision)
+        rows = range(int((south + 90) // height), int(min(north + 90, 180 - height / 2) // height) + 1)
+        columns_total = round(360 / width)
+        first, last = int((west + 180) // width), int((east + 180) // width)
+        columns = {column % columns_total for column in range(first, min(last, first + columns_total - 1) + 1)}
+        if len(rows) * len(columns) <= options['MAX_CELLS'] or precision == 1:
+            return sorted(
+                encode(-90 + (row + 0.5) * height, -180 + (column + 0.5) * width, precision)
+                for row in rows for column in columns
+            )
+
+
+def distance_km(latitude, longitude):
+    # Great-circle (haversine) distance from the given point to the event, in SQL
+    lat = math.radians(latitude)
+    half_chord = (
+        Power(Sin((Radians('latitude') - Value(lat)) / 2), 2)
+        + Value(math.cos(lat)) * Cos(Radians('latitude'))
+        * Power(Sin((Radians('longitude') - Value(math.radians(longitude))) / 2), 2)
+    )
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(Least(half_chord, Value(1.0))), output_field=FloatField())
+
+
+def near(queryset, latitude, longitude, radius_km):
+    # Events within radius_km of the point: range scans of the covering cells
+    # narrow the candidates, the distance check is exact. The ranges sit in a
+    # subquery of their own so the planner reads them from the geohash index
+    # instead of walking the date index for the list ordering.
+    cells = covering_cells(latitude, longitude, radius_km)
+    in_cells = functools.reduce(or_, (Q(geohash__gte=cell, geohash__lt=cell + END) for cell in cells))
+    candidates = queryset.model._base_manager.filter(in_cells).values('pk')
+    return queryset.filter(pk__in=candidates).alias(distance_km=distance_km(latitude, longitude)).filter(
+        distance_km__lte=radius_km
+    )
+
+
+def brute_force_near(queryset, latitude, longitude, radius_km):
+    # The same result without the grid, for benchmarks and tests
+    return queryset.filter(latitude__isnull=False).alias(distance_km=distance_km(latitude, longitude)).filter(
+        distance_km__lte=radius_km
+    )
+
+
+def normalize(text):
+    return ' '.join(text.casefold().split())
+
+
+@functools.lru_cache(maxsize=4)
+def load_gazetteer(path):
+    places = {}
+    with open(path, newline='', encoding='utf-8') as gazetteer:
+        for row in csv.DictReader(gazetteer):
+            places[normalize(row['name'])] = (float(row['latitude']), float(row['longitude']))
+    return places
+
+
+class GazetteerGeocoder:
+    # Exact (case- and whitespace-insensitive) match of the whole location, then
+    # of its comma-separated parts from the last: "Hall 3, Main St, Berlin" is
+    # found under "Berlin" when the gazetteer has no entry for the full text
+
+    def __init__(self, path=None):
+        self.path = path or geo_settings()['GAZETTEER']
+
+    def geocode(self, location):
+        if not self.path or not location:
+            return None
+        places = load_gazetteer(str(self.path))
+        parts = [normalize(part) for part in location.split(',')]
+        for candidate in [normalize(location), *reversed(parts)]:
+            if candidate in places:
+                return places[candidate]
+        return None
+
+
+def get_geocoder():
+    return import_string(geo_settings()['GEOCODER'])()
@@ -0,0 +1,179 @@
+"""
+Live capacity updates.
+
+``/api/events/stream/?events=1,2`` is a server-sent event stream of the
+status and seat counters of the given events. The first message sends the
+current state of every event. After that, a message is sent only when an
+event's state changes.
+
+Writers call ``capacity_changed()`` inside their transaction. After commit,
+the in-process ``hub`` reads the new state once and fans it out to the
+streams of this process that watch the event. Writes made by other worker
+processes reach a stream through the response cache generation (see
+events/cache.py). Every write bumps it, and a stream that has heard nothing
+for POLL_INTERVAL seconds re-reads its events when the generation changed.
+
+A slow client never builds a backlog: pending updates are coalesced per
+event, so the client only receives the latest state.
+"""
+import asyncio
+import threading
+import time
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+
+from config.renderers import ORJSONRenderer
+from . import availability
+from .cache import get_generation
+
+DEFAULTS = {
+    'MAX_EVENTS': 100,
+    'POLL_INTERVAL': 5,
+    'HEARTBEAT': 15,
+}
+
+STATE_FIELDS = ('id', 'status', 'capacity', 'participant_count', 'remaining_capacity')
+
+renderer = ORJSONRenderer()
+
+
+def stream_settings():
+    return {**DEFAULTS, **getattr(settings, 'EVENT_STREAM', {})}
+
+
+def to_states(rows, event_ids):
+    # Same keys and values as the detail payload; deleted events are reported as such
+    states = {row['id']: {**row, 'is_full': row['remaining_capacity'] == 0} for row in rows}
+    return [states.get(event_id, {'id': event_id, 'deleted': True}) for event_id in event_ids]
+
+
+def read_states(event_ids):
+    # Looked up through the app registry: events/models.py imports this module
+    Event = apps.get_model('events', 'Event')
+    return to_states(Event.objects.filter(pk__in=event_ids).values(*STATE_FIELDS), event_ids)
+
+
+async def aread_states(event_ids):
+    Event = apps.get_model('events', 'Event')
+    rows = [row async for row in Event.objects.filter(pk__in=event_ids).values(*STATE_FIELDS)]
+    return to_states(rows, event_ids)
+
+
+class Subscription:
+    # One stream's pending updates; pushed from any thread, read on its event loop
+
+    def __init__(self, event_ids):
+        self.event_ids = list(event_ids)
+        self.loop = asyncio.get_running_loop()
+        self.pending = {}
+        self.ready = asyncio.Event()
+
+    def push(self, state):
+        try:
+            self.loop.call_soon_threadsafe(self._push, state)
+        except RuntimeError:
+            pass  # the loop is closed; the stream is gone
+
+    def _push(self, state):
+        self.pending[state['id']] = state
+        self.ready.set()
+
+    async def updates(self, timeout):
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.ready.clear()
+        states, self.pending = list(self.pending.values()), {}
+        return states
+
+
+class CapacityHub:
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, event_ids):
+        subscription = Subscription(event_ids)
+        with self._lock:
+            for event_id in subscription.event_ids:
+                self._subscriptions[event_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for event_id in subscription.event_ids:
+                self._subscriptions[event_id].discard(subscription)
+                if not self._subscriptions[event_id]:
+                    del self._subscriptions[event_id]
+
+    def watched(self, event_ids):
+        with self._lock:
+            return [event_id for event_id in event_ids if event_id in self._subscriptions]
+
+    def publish(self, event_ids):
+        event_ids = self.watched(event_ids)
+        if not event_ids:
+            return
+        for state in read_states(event_ids):
+            with self._lock:
+                subscriptions = list(self._subscriptions.get(state['id'], ()))
+            for subscription in subscriptions:
+                subscription.push(state)
+
+
+hub = CapacityHub()
+
+
+def capacity_changed(*event_ids):
+    # Also drops the cached "cannot join" answers of the events (see events/availability.py).
+    # The streams cost nothing unless one in this process watches one of the events.
+    transaction.on_commit(lambda: availability.forget(event_ids))
+    if hub.watched(event_ids):
+        transaction.on_commit(lambda: hub.publish(event_ids))
+
+
+def message(state):
+    return b'event: capacity\ndata: ' + renderer.render(state) + b'\n\n'
+
+
+class CapacityStream:
+    # Async iterable of server-sent event messages. StreamingHttpResponse calls
+    # close() once the response ends, including when the client disconnects.
+
+    def __init__(self, event_ids):
+        # Subscribed before the first read, so no change can fall in between
+        self.event_ids = event_ids
+        self.subscription = hub.subscribe(event_ids)
+
+    def __aiter__(self):
+        return self.messages()
+
+    async def messages(self):
+        options = stream_settings()
+        generation = get_generation()
+        states = await aread_states(self.event_ids)
+        sent = {}
+        last_write = time.monotonic()
+        while True:
+            changed = [state for state in states if sent.get(state['id']) != state]
+            for state in changed:
+                sent[state['id']] = state
+                yield message(state)
+            if changed:
+                last_write = time.monotonic()
+            elif time.monotonic() - last_write >= options['HEARTBEAT']:
+                # Keeps proxies from closing an idle connection
+                last_write = time.monotonic()
+                yield b': keepalive\n\n'
+
+            states = await self.subscription.updates(options['POLL_INTERVAL'])
+            if not states and get_generation() != generation:
+                generation = get_generation()
+                states = await aread_states(self.event_ids)
+
+    def close(self):
+        hub.unsubscribe(self.subscription)
@@ -0,0 +1,175 @@
+import asyncio
+import io
+import itertools
+import os
+import statistics
+import threading
+import time
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.test.utils import override_settings
+
+from config import benchmarks
+from users.models import User
+from users.serializers import CustomTokenObtainPairSerializer
+
+
+class MemorySampler(threading.Thread):
+    # Peak resident set size and thread count while a run is in progress (Linux)
+
+    def __init__(self, interval=0.005):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.baseline = self.peak = self.rss()
+        self.threads = threading.active_count()
+
+    @staticmethod
+    def rss():
+        try:
+            with open('/proc/self/statm') as statm:
+                return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except OSError:
+            return 0
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, self.rss())
+            self.threads = max(self.threads, threading.active_count())
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        return (self.peak - self.baseline) / 2 ** 20, self.threads
+
+
+class Command(BaseCommand):
+    help = (
+        'Requests/s, latency and memory of the WSGI viewset and the async views served '
+        'through the ASGI application at increasing connection counts. Seeds committed '
+        'data (concurrent connections cannot see an open transaction) and deletes it afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, nargs='+', default=[10, 100, 500])
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--events', type=int, default=200)
+
+    def handle(self, *args, **options):
+        # 'testserver' is the host the requests are sent to
+        with override_settings(ALLOWED_HOSTS=['testserver'], EVENT_RESPONSE_CACHE={'ENABLED': False}):
+            context = benchmarks.seed(users=100, events=options['events'], participants=10, logs=0, spare_events=1)
+            try:
+                self.report(context, options)
+            finally:
+                User.objects.filter(email__startswith='bench').delete()
+
+    def report(self, context, options):
+        token = CustomTokenObtainPairSerializer.get_token(context['user']).access_token
+        headers = {'authorization': f'Bearer {token}', 'host': 'testserver'}
+        event = context['event'].pk
+        routes = [
+            ('list', '/api/events/', '/api/async/events/', 'page=2'),
+            ('detail', f'/api/events/{event}/', f'/api/async/events/{event}/', ''),
+        ]
+        wsgi, asgi = get_wsgi_application(), get_asgi_application()
+
+        self.stdout.write(
+            f"{'route':<8}{'server':<7}{'conns':>6}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}"
+            f"{'peak RSS MB':>13}{'threads':>9}{'errors':>8}"
+        )
+        for connections in options['connections']:
+            for name, wsgi_path, asgi_path, query in routes:
+                for server, run in (
+                    ('wsgi', lambda: self.run_wsgi(wsgi, wsgi_path, query, headers, connections, options['requests'])),
+                    ('asgi', lambda: asyncio.run(
+                        self.run_asgi(asgi, asgi_path, query, headers, connections, options['requests'])
+                    )),
+                ):
+                    sampler = MemorySampler()
+                    sampler.start()
+                    started = time.perf_counter()
+                    results = run()
+                    elapsed = time.perf_counter() - started
+                    memory, threads = sampler.stop()
+
+                    timings = sorted(timing for _, timing in results)
+                    errors = sum(status >= 400 for status, _ in results)
+                    self.stdout.write(
+                        f"{name:<8}{server:<7}{connections:>6}{len(results) / elapsed:>9.0f}"
+                        f"{statistics.median(timings):>9.1f}{timings[int(len(timings) * 0.99) - 1]:>9.1f}"
+                        f"{memory:>13.1f}{threads:>9}{errors:>8}"
+                    )
+
+    def run_wsgi(self, application, path, query, headers, connections, requests):
+        # One thread per connection, as a threaded WSGI server would run them
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+            'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+            'wsgi.url_scheme': 'http', 'wsgi.errors': io.StringIO(),
+            **{f"HTTP_{key.upper()}": value for key, value in headers.items()},
+        }
+
+        remaining = itertools.count()
+        results = []
+
+        def request():
+            statuses = []
+            started = time.perf_counter()
+            response = application({**environ, 'wsgi.input': io.BytesIO()}, lambda status, *_: statuses.append(status))
+            b''.join(response)
+            response.close()  # sends request_finished, which releases the database connection
+            results.append((int(statuses[0].split()[0]), (time.perf_counter() - started) * 1000))
+
+        def connection():
+            while next(remaining) < requests:
+                request()
+
+        threads = [threading.Thread(target=connection) for _ in range(connections)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    async def run_asgi(self, application, path, query, headers, connections, requests):
+        # One coroutine per connection on a single event loop
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+            'root_path': '', 'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+            'headers': [(key.encode(), value.encode()) for key, value in headers.items()],
+        }
+        remaining = itertools.count()
+        results = []
+
+        async def request():
+            body_sent = False
+            statuses = []
+            disconnected = asyncio.Event()
+
+            async def receive():
+                nonlocal body_sent
+                if not body_sent:
+                    body_sent = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                # The client stays connected until the handler cancels this wait
+                await disconnected.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+
+            started = time.perf_counter()
+            await application(scope, receive, send)
+            results.append((statuses[0], (time.perf_counter() - started) * 1000))
+
+        async def connection():
+            while next(remaining) < requests:
+                await request()
+
+        await asyncio.gather(*(connection() for _ in range(connections)))
+        return results
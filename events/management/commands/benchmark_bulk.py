@@ -0,0 +1,87 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from events.models import Event
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare bulk enrollment and bulk event creation with one request per item. '
+        'Seeds data inside a transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--events', type=int, default=500)
+
+    def handle(self, *args, **options):
+        # 'testserver' is the test client's host when running outside the test runner
+        with override_settings(ALLOWED_HOSTS=['testserver']), transaction.atomic():
+            self.run(options)
+            transaction.set_rollback(True)
+
+    def run(self, options):
+        admin = User.objects.create_user(
+            email='bulk-admin@example.com', username='bulk-admin', password=None, role=User.Role.ADMIN,
+        )
+        users = User.objects.bulk_create(
+            User(email=f'bulk{i}@example.com', username=f'bulk{i}') for i in range(options['users'])
+        )
+        date = timezone.now() + timezone.timedelta(days=1)
+        one_by_one, in_bulk = Event.objects.bulk_create(
+            Event(name=name, description='', capacity=options['users'], remaining_capacity=options['users'],
+                  date=date, location='Hall', creator=admin)
+            for name in ('One by one', 'Bulk')
+        )
+        client = APIClient()
+
+        def joins():
+            for user in users:
+                client.force_authenticate(user)
+                client.post(f'/api/events/{one_by_one.pk}/join/')
+
+        def enroll():
+            client.force_authenticate(admin)
+            client.post(f'/api/events/{in_bulk.pk}/enroll/', {'users': [user.pk for user in users]}, format='json')
+
+        def event(i):
+            return {
+                'name': f'Created {i}', 'description': 'x', 'capacity': 10, 'location': 'Hall',
+                'date': '2030-01-01T00:00:00Z', 'status': Event.Status.CLOSED,
+            }
+
+        def creates():
+            client.force_authenticate(admin)
+            for i in range(options['events']):
+                client.post('/api/events/', event(i), format='json')
+
+        def bulk_create():
+            client.force_authenticate(admin)
+            client.post('/api/events/bulk/', [event(i) for i in range(options['events'])], format='json')
+
+        self.stdout.write(f"{'operation':<24}{'items':>7}{'per-request s':>15}{'bulk s':>10}{'items/s':>18}")
+        for name, items, per_request, bulk in (
+            ('enroll participants', len(users), joins, enroll),
+            ('create events', options['events'], creates, bulk_create),
+        ):
+            per_request_s = self.measure(per_request)
+            bulk_s = self.measure(bulk)
+            self.stdout.write(
+                f"{name:<24}{items:>7}{per_request_s:>15.2f}{bulk_s:>10.2f}"
+                f"{items / per_request_s:>8.0f} -> {items / bulk_s:<8.0f}"
+            )
+
+        one_by_one.refresh_from_db()
+        in_bulk.refresh_from_db()
+        assert one_by_one.participant_count == in_bulk.participant_count == len(users)
+
+    def measure(self, operation):
+        started = time.perf_counter()
+        operation()
+        return time.perf_counter() - started
@@ -0,0 +1,59 @@
+import json
+import platform
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from config import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure latency and SQL query counts for every API route on seeded data and write '
+        'the results as JSON. Seeds inside a transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--events', type=int, default=500)
+        parser.add_argument('--participants', type=int, default=50, help='Participants per event.')
+        parser.add_argument('--logs', type=int, default=20000)
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--only', nargs='*', help='Endpoint names to run.')
+        parser.add_argument('--output', default='benchmark-results.json')
+
+    def handle(self, *args, **options):
+        volumes = {key: options[key] for key in ('users', 'events', 'participants', 'logs')}
+
+        with transaction.atomic():
+            context = benchmarks.seed(spare_events=options['iterations'] + 2, **volumes)
+            results = benchmarks.run(context, iterations=options['iterations'], only=options['only'])
+            transaction.set_rollback(True)
+
+        report = {
+            'timestamp': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'volumes': volumes,
+            'iterations': options['iterations'],
+            'endpoints': results,
+        }
+        with open(options['output'], 'w') as fileobj:
+            json.dump(report, fileobj, indent=2)
+
+        failed = 0
+        self.stdout.write(f"{'endpoint':<32}{'status':>7}{'queries':>9}{'budget':>8}{'p50 ms':>10}{'p99 ms':>10}")
+        for result in results:
+            line = (
+                f"{result['name']:<32}{result['status']:>7}{result['queries']:>9}{result['budget']:>8}"
+                f"{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+            )
+            if result['queries'] > result['budget'] or result['status'] >= 400:
+                failed += 1
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
+
+        self.stdout.write(f"Results written to {options['output']}")
+        if failed:
+            raise CommandError(f'{failed} endpoint(s) failed or exceeded their query budget.')
@@ -0,0 +1,87 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from events import geo
+from events.models import Event
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the geohash grid of the near= filter with a brute-force distance scan. '
+        'Seeds events inside a transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=500000)
+        parser.add_argument('--queries', type=int, default=10)
+        parser.add_argument('--radius', type=float, nargs='+', default=[1, 10, 50])
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.run(options)
+            transaction.set_rollback(True)
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        creator = User.objects.create_user(email='geo-bench@example.com', username='geo-bench', password=None)
+        # Spread over Europe, with half of the events in a few dense cities
+        cities = [(rng.uniform(36, 60), rng.uniform(-9, 30)) for _ in range(20)]
+        date = timezone.now()
+
+        def point():
+            if rng.random() < 0.5:
+                latitude, longitude = rng.choice(cities)
+                return latitude + rng.gauss(0, 0.1), longitude + rng.gauss(0, 0.15)
+            return rng.uniform(36, 60), rng.uniform(-9, 30)
+
+        started = time.perf_counter()
+        for start in range(0, options['events'], 10000):
+            events = []
+            for _ in range(min(10000, options['events'] - start)):
+                latitude, longitude = point()
+                events.append(Event(
+                    name='Geo benchmark', description='', capacity=10, remaining_capacity=10, date=date,
+                    location='Somewhere', creator=creator, status=Event.Status.CLOSED,
+                    latitude=latitude, longitude=longitude, geohash=geo.encode(latitude, longitude),
+                ))
+            Event.objects.bulk_create(events, batch_size=2000)
+        self.stdout.write(f"Seeded {options['events']} events in {time.perf_counter() - started:.1f}s")
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE' if connection.vendor in ('sqlite', 'postgresql') else 'SELECT 1')
+
+        queryset = Event.objects.all()
+        self.stdout.write(
+            f"{'radius km':>10}{'cells':>7}{'matches':>9}{'grid ms p50':>13}{'brute ms p50':>14}{'speedup':>9}"
+        )
+        for radius_km in options['radius']:
+            centers = [point() for _ in range(options['queries'])]
+            grid, brute, cells, matches = [], [], [], []
+            for latitude, longitude in centers:
+                with CaptureQueriesContext(connection):
+                    found, elapsed = self.measure(lambda: geo.near(queryset, latitude, longitude, radius_km))
+                expected, brute_elapsed = self.measure(
+                    lambda: geo.brute_force_near(queryset, latitude, longitude, radius_km)
+                )
+                assert found == expected, 'the grid missed or added events'
+                grid.append(elapsed)
+                brute.append(brute_elapsed)
+                cells.append(len(geo.covering_cells(latitude, longitude, radius_km)))
+                matches.append(len(found))
+            self.stdout.write(
+                f"{radius_km:>10g}{statistics.median(cells):>7.0f}{statistics.median(matches):>9.0f}"
+                f"{statistics.median(grid):>13.1f}{statistics.median(brute):>14.1f}"
+                f"{statistics.median(brute) / statistics.median(grid):>8.0f}x"
+            )
+
+    def measure(self, build):
+        started = time.perf_counter()
+        ids = set(build().values_list('pk', flat=True))
+        return ids, (time.perf_counter() - started) * 1000
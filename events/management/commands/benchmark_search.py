@@ -0,0 +1,109 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from events.models import Event
+from events.search import get_search_backend, search_terms
+from users.models import User
+
+WORDS = (
+    'tech music art food sports science health business design data cloud python django '
+    'community workshop summit meetup festival conference concert gallery market startup '
+    'marathon yoga cooking wine jazz rock film theater poetry robotics security mobile web'
+).split()
+CITIES = 'Berlin Paris Tehran London Madrid Rome Vienna Prague Lisbon Oslo'.split()
+QUERIES = ['python', 'jazz festival', 'cloud security workshop', 'Berlin', 'rob', 'nonexistentword']
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the full-text search backend with icontains SearchFilter lookups. '
+        'Seeds events inside a transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        if backend is None:
+            raise CommandError('No full-text search backend for this database.')
+
+        with transaction.atomic():
+            self.run(backend, options)
+            transaction.set_rollback(True)
+
+    def run(self, backend, options):
+        rng = random.Random(options['seed'])
+        # Themed words are rare enough to be selective; filler words pad descriptions
+        filler = [''.join(rng.choices('abcdefghijklmnopqrstuvwxyz', k=rng.randint(4, 9))) for _ in range(5000)]
+        creator = User.objects.create_user(
+            email='search-benchmark@example.com', username='search-benchmark', password=None,
+            role=User.Role.EVENT_CREATOR,
+        )
+        now = timezone.now()
+
+        started = time.perf_counter()
+        Event.objects.bulk_create(
+            (
+                Event(
+                    name=' '.join(rng.choices(WORDS, k=3)).title(),
+                    description=' '.join(rng.choices(WORDS, k=3) + rng.choices(filler, k=57)),
+                    location=f'{rng.choice(CITIES)} {rng.choice(WORDS).title()} Hall',
+                    date=now + timedelta(hours=i),
+                    capacity=100,
+                    remaining_capacity=100,
+                    creator=creator,
+                )
+                for i in range(options['events'])
+            ),
+            batch_size=5000,
+        )
+        self.stdout.write(f"Seeded {options['events']} events in {time.perf_counter() - started:.2f}s")
+
+        started = time.perf_counter()
+        backend.rebuild()
+        self.stdout.write(f"Built {type(backend).__name__} index in {time.perf_counter() - started:.2f}s")
+
+        self.stdout.write(f"{'query':<28}{'matches':>9}{'icontains ms':>15}{'full-text ms':>15}{'speedup':>9}")
+        for text in QUERIES:
+            terms = search_terms(text)
+            icontains_ms, matches = self.measure(lambda: self.icontains(terms), options['repeat'])
+            fulltext_ms, _ = self.measure(
+                lambda: backend.search(Event.objects.all(), terms).order_by(
+                    '-search_rank' if backend.rank_descending else 'search_rank', 'id'
+                ),
+                options['repeat'],
+            )
+            self.stdout.write(
+                f"{text:<28}{matches:>9}{icontains_ms:>15.2f}{fulltext_ms:>15.2f}"
+                f"{icontains_ms / fulltext_ms:>8.1f}x"
+            )
+
+    def icontains(self, terms):
+        # Equivalent of SearchFilter with search_fields = ['name', 'description', 'location']
+        queryset = Event.objects.all()
+        for term in terms:
+            queryset = queryset.filter(
+                Q(name__icontains=term) | Q(description__icontains=term) | Q(location__icontains=term)
+            )
+        return queryset
+
+    def measure(self, build_queryset, repeat):
+        # Time a paginated request: the COUNT(*) plus the first page of 10
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            queryset = build_queryset()
+            matches = queryset.count()
+            list(queryset[:10])
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings), matches
@@ -0,0 +1,70 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from config import benchmarks
+from config.renderers import ORJSONRenderer
+from events.models import Event
+from events.projections import event_payloads, project_events
+from events.serializers import EventSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Cost of reading and serializing 1,000 events with EventSerializer and with the '
+        'values() projection, and of rendering them with JSONRenderer and ORJSONRenderer. '
+        'Seeds data inside a transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            benchmarks.seed(users=20, events=options['events'], participants=5, logs=0, spare_events=1)
+            self.run(options)
+            transaction.set_rollback(True)
+
+    def run(self, options):
+        queryset = Event.objects.select_related('creator').order_by('-date', 'id')
+        serialize = {
+            'EventSerializer': lambda: EventSerializer(queryset.all(), many=True).data,
+            'values() projection': lambda: event_payloads(project_events(queryset.all())),
+        }
+        renderers = {'JSONRenderer': JSONRenderer(), 'ORJSONRenderer': ORJSONRenderer()}
+
+        payloads = {name: produce() for name, produce in serialize.items()}
+        outputs = {(serializer, renderer_name): renderer.render(data)
+                   for serializer, data in payloads.items() for renderer_name, renderer in renderers.items()}
+        assert len(set(outputs.values())) == 1, 'the fast paths changed the response body'
+
+        per_thousand = 1000 / options['events']
+        self.stdout.write(f"{'step':<36}{'ms per 1,000 events':>20}{'queries':>9}")
+        for name, produce in serialize.items():
+            with CaptureQueriesContext(connection) as queries:
+                produce()
+            self.stdout.write(
+                f"{'read + serialize, ' + name:<36}{self.measure(produce, options) * per_thousand:>20.2f}"
+                f"{len(queries):>9}"
+            )
+        data = payloads['values() projection']
+        for name, renderer in renderers.items():
+            self.stdout.write(
+                f"{'render, ' + name:<36}"
+                f"{self.measure(lambda: renderer.render(data), options) * per_thousand:>20.2f}{0:>9}"
+            )
+        self.stdout.write(f'{len(outputs)} combinations rendered {len(next(iter(outputs.values())))} identical bytes')
+
+    def measure(self, operation, options):
+        # Median milliseconds over --repeat runs
+        timings = []
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            operation()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
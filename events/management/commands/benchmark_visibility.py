@@ -0,0 +1,133 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from events.models import Event, Participant
+from events.visibility import joined_event_ids, visible_logs, visible_participants
+from logs.models import EventLog
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the semi-join visibility predicates with the previous fan-out joins '
+        'for the event log, participant and joined-events listings. Seeds data inside '
+        'a transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10_000)
+        parser.add_argument('--events', type=int, default=5_000)
+        parser.add_argument('--participants', type=int, default=1_000_000)
+        parser.add_argument('--logs', type=int, default=200_000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.run(options)
+            transaction.set_rollback(True)
+
+    def run(self, options):
+        member, creator = self.seed(options)
+        self.report(member, creator, options['repeat'])
+
+    def seed(self, options):
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+
+        started = time.perf_counter()
+        creators = User.objects.bulk_create(
+            User(email=f'creator{i}@example.com', username=f'creator{i}', role=User.Role.EVENT_CREATOR)
+            for i in range(max(1, options['users'] // 100))
+        )
+        users = User.objects.bulk_create(
+            (User(email=f'member{i}@example.com', username=f'member{i}') for i in range(options['users'])),
+            batch_size=5000,
+        )
+        events = Event.objects.bulk_create(
+            (
+                Event(
+                    name=f'Event {i}', description='', location='Hall', capacity=options['participants'],
+                    date=now + timedelta(hours=i), creator=rng.choice(creators),
+                )
+                for i in range(options['events'])
+            ),
+            batch_size=5000,
+        )
+
+        # Spread participations evenly: every user joins the same number of events
+        per_user = max(1, options['participants'] // len(users))
+        participations = (
+            Participant(event_id=event_id, user_id=user.pk)
+            for user in users
+            for event_id in rng.sample([event.pk for event in events], min(per_user, len(events)))
+        )
+        Participant.objects.bulk_create(participations, batch_size=5000)
+        EventLog.objects.bulk_create(
+            (
+                EventLog(
+                    event_id=rng.choice(events).pk, user_id=rng.choice(users).pk,
+                    action=EventLog.Action.JOIN, description='',
+                )
+                for _ in range(options['logs'])
+            ),
+            batch_size=5000,
+        )
+        self.stdout.write(
+            f"Seeded {len(users)} users, {len(events)} events, {Participant.objects.count()} participants "
+            f"and {options['logs']} logs in {time.perf_counter() - started:.2f}s"
+        )
+
+        return users[0], creators[0]
+
+    def report(self, member, creator, repeat):
+        cases = [
+            (
+                'logs, regular user',
+                EventLog.objects.filter(event__participants__user=member),
+                visible_logs(EventLog.objects.all(), member),
+                ('-timestamp', 'id'),
+            ),
+            (
+                'logs, event creator',
+                EventLog.objects.filter(event__creator=creator),
+                visible_logs(EventLog.objects.all(), creator),
+                ('-timestamp', 'id'),
+            ),
+            (
+                'participants, event creator',
+                Participant.objects.filter(event__creator=creator),
+                visible_participants(Participant.objects.all(), creator),
+                ('joined_at', 'id'),
+            ),
+            (
+                'events, ?joined=true',
+                Event.objects.filter(participants__user=member),
+                Event.objects.filter(pk__in=joined_event_ids(member)),
+                ('-date', 'id'),
+            ),
+        ]
+
+        self.stdout.write(f"{'listing':<30}{'rows':>9}{'join ms':>12}{'semi-join ms':>15}{'speedup':>9}")
+        for name, join, semi_join, ordering in cases:
+            join_ms, rows = self.measure(join.order_by(*ordering), repeat)
+            semi_join_ms, _ = self.measure(semi_join.order_by(*ordering), repeat)
+            self.stdout.write(
+                f"{name:<30}{rows:>9}{join_ms:>12.2f}{semi_join_ms:>15.2f}{join_ms / semi_join_ms:>8.1f}x"
+            )
+
+    def measure(self, queryset, repeat):
+        # Time a paginated request: the COUNT(*) plus the first page of 10
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            rows = queryset.count()
+            list(queryset[:10])
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings), rows
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from events.sweeper import close_past_events, past_events, sweeper_settings
+
+
+class Command(BaseCommand):
+    help = (
+        'Close open events whose date has passed, in batched UPDATEs with a STATUS_CHANGE log per event. '
+        'Runs once, or every --interval seconds.'
+    )
+
+    def add_arguments(self, parser):
+        options = sweeper_settings()
+        parser.add_argument('--batch-size', type=int, default=options['BATCH_SIZE'])
+        parser.add_argument('--interval', type=float, default=None)
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many events would be closed.')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            self.stdout.write(f"{past_events().count()} past event(s) would be closed.")
+            return
+
+        while True:
+            started = time.perf_counter()
+            closed = close_past_events(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Closed {closed} past event(s) at {timezone.now():%Y-%m-%d %H:%M:%S} "
+                f"in {(time.perf_counter() - started) * 1000:.0f} ms."
+            ))
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
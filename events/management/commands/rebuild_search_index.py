@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from events.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for events from scratch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        if backend is None:
+            raise CommandError('No full-text search backend for this database.')
+
+        with transaction.atomic():
+            indexed = backend.rebuild(batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} event(s) with {type(backend).__name__}."))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from events.models import Event
+
+
+class Command(BaseCommand):
+    help = 'Recompute Event.participant_count and remaining_capacity from the Participant table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Only report drifted events.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        drifted_ids = list(Event.objects.drifted().order_by('pk').values_list('pk', flat=True))
+
+        if options['dry_run']:
+            self.stdout.write(f"{len(drifted_ids)} event(s) have drifted counters.")
+            return
+
+        fixed = 0
+        for start in range(0, len(drifted_ids), batch_size):
+            with transaction.atomic():
+                fixed += Event.objects.recount_participants(
+                    Event.objects.filter(pk__in=drifted_ids[start:start + batch_size])
+                )
+
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {fixed} event(s)."))
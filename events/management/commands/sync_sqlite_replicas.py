@@ -0,0 +1,45 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from config.replicas import replica_settings
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the SQLite primary database into the SQLite read replicas (DB_SQLITE_REPLICAS), '
+        'once or every --interval seconds, standing in for replication on a local setup.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None)
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        replicas = [
+            connections[alias] for alias in replica_settings()['ALIASES'] if connections[alias].vendor == 'sqlite'
+        ]
+        if primary.vendor != 'sqlite' or not replicas:
+            raise CommandError('Needs a SQLite primary and SQLite replicas; set DB_SQLITE_REPLICAS.')
+
+        while True:
+            started = time.perf_counter()
+            for replica in replicas:
+                self.copy(primary.settings_dict['NAME'], replica.settings_dict['NAME'])
+            self.stdout.write(
+                f"Copied the primary to {len(replicas)} replica(s) in {(time.perf_counter() - started) * 1000:.0f} ms."
+            )
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
+
+    def copy(self, source_path, target_path):
+        # SQLite's online backup: a consistent snapshot, even while the primary is written to
+        source, target = sqlite3.connect(source_path), sqlite3.connect(target_path)
+        try:
+            source.backup(target)
+        finally:
+            source.close()
+            target.close()
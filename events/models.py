@@ -1,8 +1,90 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import Lookup
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
-from django.db.models import Count
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest, Now
+from . import availability, geo
+from .cache import bump_generation
+from .live import capacity_changed
+
+# Denormalized counters maintained by UPDATE statements, never by instance saves
+COUNTER_FIELDS = ('participant_count', 'remaining_capacity', 'participants_version', 'participants_changed_at')
+# Saved together: the geohash follows the coordinates, which may follow the location
+LOCATION_FIELDS = ('location', 'latitude', 'longitude', 'geohash')
+
+
+def participants_changed():
+    # Added to every UPDATE of the counters; feeds the event's ETag and Last-Modified
+    return {'participants_version': F('participants_version') + 1, 'participants_changed_at': Now()}
+
+
+class EventManager(models.Manager):
+    def adjust_participant_count(self, event_id, delta):
+        # Single atomic UPDATE; SET expressions see the pre-update row values
+        bump_generation()
+        capacity_changed(event_id)
+        return self.filter(pk=event_id).update(
+            participant_count=Greatest(F('participant_count') + delta, 0),
+            remaining_capacity=Greatest(F('capacity') - F('participant_count') - delta, 0),
+            **participants_changed(),
+        )
+
+    def reserve_seats(self, event_id, wanted):
+        # Claim up to `wanted` seats of an open event with a conditional UPDATE.
+        # Returns the number claimed, or None when the event is not open. A
+        # concurrent join between the read and the UPDATE makes the UPDATE miss;
+        # the loop then reads the new remaining capacity and tries again.
+        while True:
+            current = self.filter(pk=event_id).values_list('status', 'remaining_capacity').first()
+            if current is None or current[0] != Event.Status.OPEN:
+                return None
+            seats = min(wanted, current[1])
+            if seats == 0:
+                return 0
+            if self.filter(pk=event_id, status=Event.Status.OPEN, remaining_capacity__gte=seats).update(
+                participant_count=F('participant_count') + seats,
+                remaining_capacity=F('remaining_capacity') - seats,
+                **participants_changed(),
+            ):
+                capacity_changed(event_id)
+                return seats
+
+    def actual_participant_count(self):
+        return Coalesce(Subquery(
+            Participant.objects.filter(event=OuterRef('pk'))
+            .order_by()
+            .values('event')
+            .annotate(total=Count('pk'))
+            .values('total')
+        ), 0)
+
+    def drifted(self):
+        # Events whose stored counters disagree with the Participant table
+        actual = self.actual_participant_count()
+        return self.annotate(actual_participant_count=actual).filter(
+            ~Q(participant_count=F('actual_participant_count'))
+            | ~Q(remaining_capacity=Greatest(F('capacity') - F('actual_participant_count'), 0))
+        )
+
+    def recount_participants(self, queryset=None):
+        # Recompute the counters from the Participant table. Only drifted events are
+        # written, and like every counter write they drop their cached join answers
+        # and reach the streams watching them.
+        queryset = (self.all() if queryset is None else queryset).filter(pk__in=self.drifted().values('pk'))
+        event_ids = list(queryset.values_list('pk', flat=True))
+        if not event_ids:
+            return 0
+        actual = self.actual_participant_count()
+        bump_generation()
+        capacity_changed(*event_ids)
+        return queryset.update(
+            participant_count=actual,
+            remaining_capacity=Greatest(F('capacity') - actual, 0),
+            **participants_changed(),
+        )
 
 
 class Event(models.Model):
@@ -16,6 +98,14 @@ class Event(models.Model):
     capacity = models.PositiveIntegerField(default=settings.EVENT_MANAGEMENT.get('DEFAULT_EVENT_CAPACITY', 50))
     date = models.DateTimeField()
     location = models.CharField(max_length=255)
+    # Geocoded from location when not given (see events/geo.py)
+    latitude = models.FloatField(
+        null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)],
+    )
+    longitude = models.FloatField(
+        null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)],
+    )
+    geohash = models.CharField(max_length=12, blank=True, default='', editable=False)
     status = models.CharField(
         max_length=10,
         choices=Status.choices,
@@ -24,19 +114,51 @@ class Event(models.Model):
     creator = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
-        related_name='created_events'
+        related_name='created_events',
+        db_index=False,  # covered by the (creator, status) index
     )
+    participant_count = models.PositiveIntegerField(default=0, editable=False)
+    remaining_capacity = models.PositiveIntegerField(default=0, editable=False)
+    # Bumped on every join and leave, which leave updated_at alone
+    participants_version = models.PositiveBigIntegerField(default=0, editable=False)
+    participants_changed_at = models.DateTimeField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = EventManager()
+
     class Meta:
         ordering = ['-date']
+        indexes = [
+            # Authenticated listing, ordered by date
+            models.Index(fields=['-date', 'id'], name='event_date_idx'),
+            # Anonymous listing and status filters: status=OPEN ORDER BY date
+            models.Index(fields=['status', '-date', 'id'], name='event_status_date_idx'),
+            # Grid cells of the near= filter: one range scan per geohash prefix
+            models.Index(fields=['geohash'], name='event_geohash_idx'),
+            # Open-events quota in clean() and the created=true filter
+            models.Index(fields=['creator', 'status'], name='event_creator_status_idx'),
+            # Hot OPEN working set; stays small once past events are closed
+            models.Index(
+                fields=['-date', 'id', 'remaining_capacity'],
+                name='event_open_date_idx',
+                condition=Q(status='OPEN'),
+            ),
+        ]
         verbose_name = _('event')
         verbose_name_plural = _('events')
 
     def __str__(self):
         return self.name
 
+    @staticmethod
+    def open_events_quota_error():
+        # Raised by clean(); bulk creation reports the same message per rejected item
+        return ValidationError(
+            _('You have reached the maximum number of open events (%(max_events)s).'),
+            params={'max_events': settings.EVENT_MANAGEMENT.get('MAX_OPEN_EVENTS_PER_USER', 5)},
+        )
+
     def clean(self):
         # Check if user has reached the maximum number of open events
         if self.status == self.Status.OPEN and not self.pk:  # Only for new events
@@ -47,47 +169,126 @@ class Event(models.Model):
 
             max_open_events = settings.EVENT_MANAGEMENT.get('MAX_OPEN_EVENTS_PER_USER', 5)
             if user_open_events_count >= max_open_events:
-                raise ValidationError(
-                    _('You have reached the maximum number of open events (%(max_events)s).'),
-                    params={'max_events': max_open_events},
-                )
+                raise self.open_events_quota_error()
+
+    def locate(self):
+        # Fill in missing coordinates from the location text and hash them
+        if self.latitude is None or self.longitude is None:
+            point = geo.get_geocoder().geocode(self.location)
+            self.latitude, self.longitude = point or (None, None)
+        if self.latitude is None:
+            self.geohash = ''
+        else:
+            self.geohash = geo.encode(self.latitude, self.longitude)
 
     def save(self, *args, **kwargs):
         self.clean()
+        self.locate()
+
+        if self._state.adding:
+            self.remaining_capacity = max(0, self.capacity - self.participant_count)
+            super().save(*args, **kwargs)
+            return
+
+        # Never write the counters back from a possibly stale instance
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in COUNTER_FIELDS
+            ]
+        if any(name in LOCATION_FIELDS for name in update_fields):
+            update_fields = [*update_fields, *(name for name in LOCATION_FIELDS if name not in update_fields)]
+        update_fields = [name for name in update_fields if name not in COUNTER_FIELDS]
+        if 'capacity' in update_fields:
+            # Recomputed in the same UPDATE from the stored participant_count;
+            # SET expressions see the old row, so the new capacity goes in as a value
+            self.remaining_capacity = Greatest(Value(self.capacity) - F('participant_count'), 0)
+            update_fields.append('remaining_capacity')
+        kwargs['update_fields'] = update_fields
         super().save(*args, **kwargs)
 
-    @property
-    def participant_count(self):
-        return self.participants.count()
+        if 'remaining_capacity' in update_fields:
+            # Deferred: loaded from the database on next access
+            del self.remaining_capacity
 
     @property
     def is_full(self):
-        return self.participant_count >= self.capacity
-
-    @property
-    def remaining_capacity(self):
-        return max(0, self.capacity - self.participant_count)
+        return self.remaining_capacity == 0
 
     @property
     def can_be_deleted(self):
         return self.participant_count == 0
 
 
+class ParticipantManager(models.Manager):
+    def reserve(self, event, user):
+        # Reserve a seat and insert the participant in one transaction.
+        # The conditional UPDATE takes the row lock, so concurrent joins can never
+        # push participant_count past capacity; no check-then-act window exists.
+        with transaction.atomic():
+            reserved = Event.objects.filter(
+                pk=event.pk,
+                status=Event.Status.OPEN,
+                remaining_capacity__gt=0,
+            ).update(
+                participant_count=F('participant_count') + 1,
+                remaining_capacity=F('remaining_capacity') - 1,
+                **participants_changed(),
+            )
+
+            if not reserved:
+                current_status = Event.objects.filter(pk=event.pk).values_list('status', flat=True).first()
+                if current_status != Event.Status.OPEN:
+                    message = _('Cannot join a closed or canceled event.')
+                else:
+                    message = _('This event has reached its capacity.')
+                # Later joins are answered from the cache until a seat frees up
+                if current_status is not None:
+                    availability.mark_unavailable(event.pk, message)
+                raise ValidationError(message)
+
+            # bulk_create skips save()/clean() and the post_save counter signal,
+            # the seat has already been counted above
+            try:
+                participant, = self.bulk_create([self.model(event=event, user=user)])
+            except IntegrityError:
+                raise ValidationError(_('You are already a participant of this event.'))
+
+            bump_generation()
+            capacity_changed(event.pk)
+
+        return participant
+
+
 class Participant(models.Model):
     event = models.ForeignKey(
         Event,
         on_delete=models.CASCADE,
-        related_name='participants'
+        related_name='participants',
+        db_index=False,  # covered by unique_together (event, user)
     )
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
-        related_name='participations'
+        related_name='participations',
+        db_index=False,  # covered by the (user, event) index
     )
     joined_at = models.DateTimeField(auto_now_add=True)
 
+    objects = ParticipantManager()
+
     class Meta:
+        ordering = ['joined_at', 'id']
         unique_together = ('event', 'user')
+        indexes = [
+            # joined=true filter and a user's own participations
+            models.Index(fields=['user', 'event'], name='participant_user_event_idx'),
+            # An event's roster in join order
+            models.Index(fields=['event', 'joined_at'], name='participant_event_joined_idx'),
+            # Admin listing in join order
+            models.Index(fields=['joined_at', 'id'], name='participant_joined_idx'),
+        ]
         verbose_name = _('participant')
         verbose_name_plural = _('participants')
 
@@ -107,3 +308,53 @@ class Participant(models.Model):
         self.clean()
         super().save(*args, **kwargs)
 
+
+
+class SearchDocumentField(models.TextField):
+    # The indexed document of a full-text index row; filtered with __match
+    pass
+
+
+@SearchDocumentField.register_lookup
+class Match(Lookup):
+    # document__match=<query>: the right-hand side is a query string for FTS5,
+    # or a tsquery expression for PostgreSQL
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', (*lhs_params, *rhs_params)
+
+    def as_postgresql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} @@ {rhs}', (*lhs_params, *rhs_params)
+
+
+# Rows of the full-text index side tables, created and written by the backends
+# in events/search.py. Unmanaged, so the ORM can join them to events; the
+# relation is never followed on delete (the backends remove their rows).
+class EventFTS(models.Model):
+    event = models.OneToOneField(
+        Event, primary_key=True, db_column='rowid', related_name='fts',
+        on_delete=models.DO_NOTHING, db_constraint=False,
+    )
+    # FTS5's hidden column named after the table: MATCH on it searches every column
+    document = SearchDocumentField(db_column='events_event_fts')
+
+    class Meta:
+        managed = False
+        db_table = 'events_event_fts'
+
+
+class EventSearchVector(models.Model):
+    event = models.OneToOneField(
+        Event, primary_key=True, related_name='search_vector',
+        on_delete=models.DO_NOTHING, db_constraint=False,
+    )
+    document = SearchDocumentField()
+
+    class Meta:
+        managed = False
+        db_table = 'events_event_search'
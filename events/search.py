@@ -0,0 +1,178 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, FloatField, Func, Value
+from django.utils.module_loading import import_string
+from rest_framework.filters import OrderingFilter, SearchFilter
+
+from .models import Event
+
+EVENT_TABLE = Event._meta.db_table
+
+
+def search_terms(text):
+    # Only word characters ever reach the engine's query syntax
+    return re.findall(r'\w+', text or '')
+
+
+class BaseSearchBackend:
+    # Full-text index over Event name/description/location kept in a side table
+    table = None
+    # Reverse relation from Event to the unmanaged model of the side table
+    relation = None
+    # Whether a higher search_rank means a better match
+    rank_descending = False
+
+    def install(self):
+        raise NotImplementedError
+
+    def index_events(self, events):
+        raise NotImplementedError
+
+    def remove_events(self, event_ids):
+        raise NotImplementedError
+
+    def query(self, terms):
+        # Return the right-hand side of document__match for the terms
+        raise NotImplementedError
+
+    def rank(self, terms):
+        # Return an expression computing the relevance of the joined index row
+        raise NotImplementedError
+
+    def rebuild(self, batch_size=2000):
+        self.install()
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+        indexed = 0
+        events = Event.objects.only('id', 'name', 'description', 'location').order_by('pk')
+        batch = []
+        for event in events.iterator(chunk_size=batch_size):
+            batch.append(event)
+            if len(batch) >= batch_size:
+                indexed += self.index_events(batch)
+                batch = []
+        if batch:
+            indexed += self.index_events(batch)
+        return indexed
+
+    def search(self, queryset, terms):
+        # Inner join of the index, so the engine evaluates the query once and
+        # drives the join, instead of once per event row
+        return queryset.filter(**{f'{self.relation}__document__match': self.query(terms)}).annotate(
+            search_rank=self.rank(terms),
+        )
+
+
+class SQLiteFTS5Backend(BaseSearchBackend):
+    table = 'events_event_fts'
+    relation = 'fts'
+    # bm25 column weights: name, description, location
+    weights = (10.0, 1.0, 5.0)
+
+    def install(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} '
+                f'USING fts5(name, description, location, tokenize="unicode61 remove_diacritics 2")'
+            )
+
+    def index_events(self, events):
+        rows = [(event.pk, event.name, event.description, event.location) for event in events]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT OR REPLACE INTO {self.table} (rowid, name, description, location) VALUES (%s, %s, %s, %s)',
+                rows,
+            )
+        return len(rows)
+
+    def remove_events(self, event_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(pk,) for pk in event_ids])
+
+    def query(self, terms):
+        # Every term must match, as a prefix, in any column
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def rank(self, terms):
+        return Func(
+            F(f'{self.relation}__document'), *(Value(weight) for weight in self.weights),
+            function='bm25', output_field=FloatField(),
+        )
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    table = 'events_event_search'
+    relation = 'search_vector'
+    rank_descending = True
+    config = 'english'
+
+    def install(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.table} ('
+                f'event_id bigint PRIMARY KEY REFERENCES {EVENT_TABLE} (id) ON DELETE CASCADE, '
+                f'document tsvector NOT NULL)'
+            )
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {self.table}_document ON {self.table} USING GIN (document)')
+
+    def index_events(self, events):
+        rows = [(event.pk, event.name, event.location, event.description) for event in events]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {self.table} (event_id, document) VALUES (%s, '
+                f"setweight(to_tsvector('{self.config}', %s), 'A') || "
+                f"setweight(to_tsvector('{self.config}', %s), 'B') || "
+                f"setweight(to_tsvector('{self.config}', %s), 'C')) "
+                f'ON CONFLICT (event_id) DO UPDATE SET document = EXCLUDED.document',
+                rows,
+            )
+        return len(rows)
+
+    def remove_events(self, event_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE event_id = ANY(%s)', [list(event_ids)])
+
+    def query(self, terms):
+        return Func(Value(self.config), Value(' & '.join(f'{term}:*' for term in terms)), function='to_tsquery')
+
+    def rank(self, terms):
+        return Func(
+            F(f'{self.relation}__document'), self.query(terms), function='ts_rank', output_field=FloatField(),
+        )
+
+
+BACKENDS = {
+    'sqlite': SQLiteFTS5Backend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_search_backend():
+    # EVENT_SEARCH_BACKEND overrides the backend picked from the database vendor
+    path = getattr(settings, 'EVENT_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    backend_class = BACKENDS.get(connection.vendor)
+    return backend_class() if backend_class else None
+
+
+class EventSearchFilter(SearchFilter):
+    # Ranked full-text search; falls back to SearchFilter's icontains
+    # lookups over view.search_fields when the database has no backend
+
+    def filter_queryset(self, request, queryset, view):
+        backend = get_search_backend()
+        if backend is None:
+            return super().filter_queryset(request, queryset, view)
+
+        terms = search_terms(request.query_params.get(self.search_param, ''))
+        if not terms:
+            return queryset
+        queryset = backend.search(queryset, terms)
+
+        # An explicit ?ordering= wins over relevance
+        if OrderingFilter.ordering_param in request.query_params:
+            return queryset
+        return queryset.order_by('-search_rank' if backend.rank_descending else 'search_rank', 'id')
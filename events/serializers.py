@@ -1,5 +1,11 @@
+import zoneinfo
+from datetime import timedelta
+
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+from .calendar import DAY, WEEK
 from .models import Event, Participant
 
 User = get_user_model()
@@ -28,7 +34,7 @@ class EventSerializer(serializers.ModelSerializer):
     class Meta:
         model = Event
         fields = (
-            'id', 'name', 'description', 'capacity', 'date', 'location',
+            'id', 'name', 'description', 'capacity', 'date', 'location', 'latitude', 'longitude',
             'status', 'creator', 'creator_name', 'created_at', 'updated_at',
             'participant_count', 'remaining_capacity', 'is_full', 'can_be_deleted'
         )
@@ -37,42 +43,74 @@ class EventSerializer(serializers.ModelSerializer):
     def get_creator_name(self, obj):
         return f"{obj.creator.first_name} {obj.creator.last_name}"
 
+    def validate(self, attrs):
+        # Coordinates come in pairs; without them the location is geocoded
+        if ('latitude' in attrs) != ('longitude' in attrs) or (attrs.get('latitude') is None) != (
+            attrs.get('longitude') is None
+        ):
+            raise serializers.ValidationError({"latitude": "Give both latitude and longitude, or neither."})
+        return attrs
+
     def create(self, validated_data):
         # Set the creator to the current user
         validated_data['creator'] = self.context['request'].user
         return super().create(validated_data)
 
+    def update(self, instance, validated_data):
+        # A new location without new coordinates is geocoded again
+        if 'location' in validated_data and 'latitude' not in validated_data:
+            validated_data.update(latitude=None, longitude=None)
+        return super().update(instance, validated_data)
+
 
 class EventDetailSerializer(EventSerializer):
-    participants = ParticipantSerializer(many=True, read_only=True, source='participants.all')
+    # Only the first participants are embedded; the full roster is served by
+    # /api/events/{id}/participants/ (optionally streamed with ?export=csv|ndjson)
+    participants = serializers.SerializerMethodField()
 
     class Meta(EventSerializer.Meta):
         fields = EventSerializer.Meta.fields + ('participants',)
 
-
-class ParticipantCreateSerializer(serializers.ModelSerializer):
-
-    class Meta:
-        model = Participant
-        fields = ('event',)
-
-    def validate_event(self, value):
-        # Check if event is open
-        if value.status != Event.Status.OPEN:
-            raise serializers.ValidationError("Cannot join a closed or canceled event.")
-
-        # Check if event has reached capacity
-        if value.is_full:
-            raise serializers.ValidationError("This event has reached its capacity.")
-
-        # Check if user is already a participant
-        user = self.context['request'].user
-        if Participant.objects.filter(event=value, user=user).exists():
-            raise serializers.ValidationError("You are already a participant of this event.")
-
-        return value
-
-    def create(self, validated_data):
-        validated_data['user'] = self.context['request'].user
-        return super().create(validated_data)
-
+    def get_participants(self, obj):
+        limit = settings.EVENT_MANAGEMENT.get('DETAIL_PARTICIPANTS_LIMIT', 50)
+        participants = obj.participants.select_related('user')[:limit]
+        return ParticipantSerializer(participants, many=True).data
+
+
+
+class EnrollmentSerializer(serializers.Serializer):
+    users = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.EVENT_MANAGEMENT.get('MAX_BULK_ITEMS', 5000),
+    )
+
+
+class CalendarQuerySerializer(serializers.Serializer):
+    # Query parameters of /api/events/calendar/; start and end are inclusive local
+    # dates and default to the current month, tz to the server time zone
+    MAX_DAYS = 400
+
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    bucket = serializers.ChoiceField(choices=[DAY, WEEK], default=DAY)
+    tz = serializers.CharField(required=False)
+
+    def validate_tz(self, value):
+        try:
+            return zoneinfo.ZoneInfo(value)
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            raise serializers.ValidationError("Unknown time zone.")
+
+    def validate(self, attrs):
+        attrs.setdefault('tz', timezone.get_current_timezone())
+        today = timezone.now().astimezone(attrs['tz']).date()
+        attrs.setdefault('start', attrs.get('end', today).replace(day=1))
+        if 'end' not in attrs:
+            next_month = (attrs['start'].replace(day=1) + timedelta(days=32)).replace(day=1)
+            attrs['end'] = next_month - timedelta(days=1)
+        if attrs['end'] < attrs['start']:
+            raise serializers.ValidationError({"end": "Must not be earlier than start."})
+        if (attrs['end'] - attrs['start']).days >= self.MAX_DAYS:
+            raise serializers.ValidationError({"end": f"The range cannot exceed {self.MAX_DAYS} days."})
+        return attrs
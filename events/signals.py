@@ -0,0 +1,89 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete, post_migrate, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import Event, Participant, participants_changed
+from .search import get_search_backend
+from .cache import bump_generation
+from .live import capacity_changed
+
+User = get_user_model()
+# User fields event payloads show: creator_name, and user_name and user_email of
+# the embedded participants
+DISPLAYED_USER_FIELDS = ('first_name', 'last_name', 'email')
+
+
+# Keep Event.participant_count / remaining_capacity in sync with the Participant table.
+# post_delete also fires for queryset and admin bulk deletes, and for cascades.
+@receiver(post_save, sender=Participant)
+def increment_participant_count(sender, instance, created, **kwargs):
+    if created:
+        Event.objects.adjust_participant_count(instance.event_id, 1)
+
+
+@receiver(post_delete, sender=Participant)
+def decrement_participant_count(sender, instance, **kwargs):
+    Event.objects.adjust_participant_count(instance.event_id, -1)
+
+
+# Keep the full-text search index in step with event writes
+@receiver(post_save, sender=Event)
+def index_event(sender, instance, **kwargs):
+    backend = get_search_backend()
+    if backend is not None:
+        backend.index_events([instance])
+
+
+@receiver(post_delete, sender=Event)
+def unindex_event(sender, instance, **kwargs):
+    backend = get_search_backend()
+    if backend is not None:
+        backend.remove_events([instance.pk])
+
+
+@receiver(post_migrate)
+def install_search_index(sender, **kwargs):
+    if sender.name != 'events':
+        return
+    backend = get_search_backend()
+    if backend is not None:
+        backend.install()
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def invalidate_cached_responses(sender, **kwargs):
+    bump_generation()
+
+
+# Status and capacity edits, and deletions, reach the live capacity streams
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def publish_capacity(sender, instance, **kwargs):
+    capacity_changed(instance.pk)
+
+
+# Renaming a user changes the payloads of the events they created or joined
+# without touching those rows. Move their validators (updated_at for creator_name,
+# the participants version for the roster) and the cache generation along.
+@receiver(pre_save, sender=User)
+def detect_user_rename(sender, instance, update_fields=None, **kwargs):
+    instance._displayed_fields_changed = False
+    if instance._state.adding:
+        return
+    if update_fields is not None and not set(update_fields) & set(DISPLAYED_USER_FIELDS):
+        return  # e.g. the last_login update at every login
+    previous = User.objects.filter(pk=instance.pk).values_list(*DISPLAYED_USER_FIELDS).first()
+    current = tuple(getattr(instance, name) for name in DISPLAYED_USER_FIELDS)
+    instance._displayed_fields_changed = previous is not None and previous != current
+
+
+@receiver(post_save, sender=User)
+def invalidate_renamed_user_events(sender, instance, **kwargs):
+    if not getattr(instance, '_displayed_fields_changed', False):
+        return
+    Event.objects.filter(creator_id=instance.pk).update(updated_at=timezone.now())
+    Event.objects.filter(
+        pk__in=Participant.objects.filter(user_id=instance.pk).values('event_id'),
+    ).update(**participants_changed())
+    bump_generation()
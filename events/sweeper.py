@@ -0,0 +1,149 @@
+"""
+Closing of past events.
+
+Events stay OPEN after their date unless someone closes them, so the OPEN set
+(anonymous listing, the open-events quota, the partial OPEN index) would only
+grow. ``close_past_events()`` moves events whose date is more than
+``GRACE_MINUTES`` in the past to CLOSED, ``BATCH_SIZE`` events per transaction:
+one indexed SELECT of the batch, one UPDATE and one bulk INSERT of the
+STATUS_CHANGE logs. Run it with the ``close_past_events`` management command
+(from cron, or with ``--interval``), or set ``EVENT_SWEEPER['ENABLED']`` to
+have every WSGI/ASGI process sweep every ``INTERVAL`` seconds in a background
+thread.
+
+Sweepers in several processes do not close an event twice: where the database
+can, the batch rows are locked with SKIP LOCKED, and the UPDATE only touches
+events that are still open.
+"""
+import atexit
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections, connections, router, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+
+from logs.models import EventLog
+from logs.writer import log_events
+from .cache import bump_generation
+from .live import capacity_changed
+from .models import Event
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'INTERVAL': 60,
+    'BATCH_SIZE': 1000,
+    'GRACE_MINUTES': 0,
+}
+
+
+def sweeper_settings():
+    return {**DEFAULTS, **getattr(settings, 'EVENT_SWEEPER', {})}
+
+
+def past_events(now=None):
+    # Served by the partial index on open events, in date order
+    cutoff = (now or timezone.now()) - timedelta(minutes=sweeper_settings()['GRACE_MINUTES'])
+    return Event.objects.filter(status=Event.Status.OPEN, date__lt=cutoff)
+
+
+def close_batch(now, batch_size):
+    alias = router.db_for_write(Event)
+    skip_locked = connections[alias].features.has_select_for_update_skip_locked
+    with transaction.atomic(using=alias):
+        batch = list(
+            past_events(now).using(alias).select_for_update(skip_locked=skip_locked)
+            .order_by('date', 'id').values_list('pk', 'creator_id', 'name')[:batch_size]
+        )
+        if not batch:
+            return 0
+        event_ids = [event_id for event_id, _, _ in batch]
+        Event.objects.using(alias).filter(pk__in=event_ids, status=Event.Status.OPEN).update(
+            status=Event.Status.CLOSED, updated_at=now,
+        )
+        log_events(
+            [
+                EventLog(
+                    event_id=event_id, user_id=creator_id, action=EventLog.Action.STATUS_CHANGE,
+                    description=f"Event {name} closed automatically after its date passed",
+                    metadata={'from': Event.Status.OPEN, 'to': Event.Status.CLOSED, 'reason': 'date_passed'},
+                )
+                for event_id, creator_id, name in batch
+            ],
+            creators={event_id: creator_id for event_id, creator_id, _ in batch},
+        )
+        bump_generation()
+        capacity_changed(*event_ids)
+    return len(batch)
+
+
+def close_past_events(batch_size=None, now=None):
+    # Returns the number of events closed
+    batch_size = batch_size or sweeper_settings()['BATCH_SIZE']
+    now = now or timezone.now()
+    closed = 0
+    while True:
+        count = close_batch(now, batch_size)
+        closed += count
+        if count < batch_size:
+            return closed
+
+
+class Sweeper:
+    def __init__(self, interval=60, batch_size=1000):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='event-sweeper', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            close_old_connections()
+            try:
+                closed = close_past_events(self.batch_size)
+            except Exception:
+                logger.exception('Failed to close past events; retrying in %s s', self.interval)
+                continue
+            if closed:
+                logger.info('Closed %d past event(s)', closed)
+
+
+_sweeper = None
+_sweeper_lock = threading.Lock()
+
+
+def start():
+    # Called by config/wsgi.py and config/asgi.py; a no-op unless enabled
+    global _sweeper
+    options = sweeper_settings()
+    if not options['ENABLED']:
+        return None
+    with _sweeper_lock:
+        if _sweeper is None:
+            _sweeper = Sweeper(interval=options['INTERVAL'], batch_size=options['BATCH_SIZE'])
+    return _sweeper
+
+
+@atexit.register
+def shutdown():
+    global _sweeper
+    with _sweeper_lock:
+        if _sweeper is not None:
+            _sweeper.stop()
+            _sweeper = None
+
+
+@receiver(setting_changed)
+def reset_sweeper(setting, **kwargs):
+    if setting == 'EVENT_SWEEPER':
+        shutdown()
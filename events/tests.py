@@ -1,3 +1,1592 @@
-from django.test import TestCase
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import connection, router, OperationalError
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.mixins import ListModelMixin
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from config import benchmarks, metrics, replicas, throttling
+from config.pagination import EventPagination
+from config.renderers import ORJSONRenderer
+from logs.models import EventLog
+from users.authentication import user_states
+from users.models import User
+from users.serializers import CustomTokenObtainPairSerializer
+from . import availability, geo, live, sweeper
+from .cache import bump_generation, generation_may_be_ahead, get_generation, get_stats
+from .models import Event, Participant
+from .projections import ProjectedListMixin
+from .search import get_search_backend
+
+
+class ReserveSeatStressTest(TransactionTestCase):
+    users = 2000
+    capacity = 500
+    workers = 8
+
+    def setUp(self):
+        creator = User.objects.create_user(
+            email='creator@example.com', username='creator', password='pass',
+            role=User.Role.EVENT_CREATOR,
+        )
+        self.event = Event.objects.create(
+            name='Ticket drop', description='', capacity=self.capacity,
+            date=timezone.now() + timezone.timedelta(days=1), location='Arena', creator=creator,
+        )
+        User.objects.bulk_create(
+            User(email=f'user{i}@example.com', username=f'user{i}') for i in range(self.users)
+        )
+        self.user_ids = list(User.objects.filter(role=User.Role.REGULAR_USER).values_list('pk', flat=True))
+
+    def join(self, user_id):
+        user = User(pk=user_id)
+        try:
+            # SQLite serializes writers; retry while the database is locked
+            while True:
+                try:
+                    Participant.objects.reserve(self.event, user)
+                    return 'joined'
+                except OperationalError:
+                    time.sleep(0.001)
+        except ValidationError as exc:
+            return exc.messages[0]
+        finally:
+            connection.close()
+
+    def test_concurrent_joins_never_overbook(self):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(self.join, self.user_ids))
+        elapsed = time.perf_counter() - started
+
+        self.event.refresh_from_db()
+        self.assertEqual(results.count('joined'), self.capacity)
+        self.assertEqual(Participant.objects.filter(event=self.event).count(), self.capacity)
+        self.assertEqual(self.event.participant_count, self.capacity)
+        self.assertEqual(self.event.remaining_capacity, 0)
+        self.assertEqual(results.count('This event has reached its capacity.'), self.users - self.capacity)
+
+        sys.stderr.write(
+            f"\n{self.users} concurrent joins on {self.workers} threads: "
+            f"{elapsed:.2f}s, {self.users / elapsed:.0f} joins/s\n"
+        )
+
+
+class ParticipantCounterTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create_user(
+            email='creator@example.com', username='creator', password='pass', role=User.Role.EVENT_CREATOR,
+        )
+        cls.users = User.objects.bulk_create(
+            User(email=f'user{i}@example.com', username=f'user{i}') for i in range(3)
+        )
+        cls.event = Event.objects.create(
+            name='Meetup', description='', capacity=3,
+            date=timezone.now() + timezone.timedelta(days=1), location='Hall', creator=cls.creator,
+        )
+
+    def counters(self):
+        return Event.objects.values_list('participant_count', 'remaining_capacity').get(pk=self.event.pk)
+
+    def test_signals_follow_participant_writes(self):
+        for user in self.users:
+            Participant.objects.create(event=self.event, user=user)
+        self.assertEqual(self.counters(), (3, 0))
+
+        Participant.objects.filter(user=self.users[0]).delete()
+        self.assertEqual(self.counters(), (2, 1))
+        self.users[1].delete()  # cascades to the participation
+        self.assertEqual(self.counters(), (1, 2))
+
+    def test_capacity_edit_recomputes_remaining_in_one_update(self):
+        Participant.objects.create(event=self.event, user=self.users[0])
+        event = Event.objects.get(pk=self.event.pk)
+        event.capacity = 10
+        with CaptureQueriesContext(connection) as queries:
+            event.save()
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "events_event"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(event.remaining_capacity, 9)
+        self.assertEqual(self.counters(), (1, 9))
+
+        event.capacity = 0
+        event.save(update_fields=['capacity'])
+        self.assertEqual(self.counters(), (1, 0))
+
+    def test_reconcile_command(self):
+        Participant.objects.create(event=self.event, user=self.users[0])
+        # Drift the counters behind the signals' back
+        Event.objects.filter(pk=self.event.pk).update(participant_count=3, remaining_capacity=0)
+
+        out = StringIO()
+        call_command('reconcile_participant_counts', '--dry-run', stdout=out)
+        self.assertIn('1 event(s) have drifted counters', out.getvalue())
+        self.assertEqual(self.counters(), (3, 0))
+
+        call_command('reconcile_participant_counts', stdout=out)
+        self.assertIn('Reconciled 1 event(s)', out.getvalue())
+        self.assertEqual(self.counters(), (1, 2))
+        self.assertFalse(Event.objects.drifted().exists())
+
+    def test_recount_frees_cached_full_answers(self):
+        caches['default'].clear()
+        Participant.objects.create(event=self.event, user=self.users[0])
+        Event.objects.filter(pk=self.event.pk).update(participant_count=3, remaining_capacity=0)
+        availability.mark_unavailable(self.event.pk, 'This event has reached its capacity.')
+
+        with mock.patch.object(live.hub, 'watched', return_value=[self.event.pk]), \
+                mock.patch.object(live.hub, 'publish') as publish, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(Event.objects.recount_participants(), 1)
+        self.assertIsNone(availability.unavailable(self.event.pk))
+        publish.assert_called_once_with((self.event.pk,))
+        self.assertEqual(self.counters(), (1, 2))
+
+        # Nothing drifted, nothing written
+        with self.assertNumQueries(1):
+            self.assertEqual(Event.objects.recount_participants(), 0)
+
+
+class CursorPaginationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        creator = User.objects.create_user(
+            email='creator@example.com', username='creator', password='pass', role=User.Role.EVENT_CREATOR,
+        )
+        date = timezone.now() + timezone.timedelta(days=1)
+        # Long runs of equal names and dates: most rows are tied on the cursor position
+        Event.objects.bulk_create(
+            Event(name=f'Event {i % 3}', description='', capacity=5, remaining_capacity=5,
+                  date=date + timezone.timedelta(days=i // 12), location='Hall', creator=creator)
+            for i in range(35)
+        )
+
+    def walk(self, url):
+        # Follow `next` to the end, then `previous` back to the start
+        client = APIClient()
+        forward, backward = [], []
+        while url:
+            data = client.get(url).data
+            forward.append([event['id'] for event in data['results']])
+            url = data['next']
+        url = data['previous']
+        while url:
+            data = client.get(url).data
+            backward.append([event['id'] for event in data['results']])
+            url = data['previous']
+        return forward, backward
+
+    def test_next_and_previous_across_ties(self):
+        events = list(Event.objects.values_list('pk', 'name', 'date'))
+        expected = {
+            'name': sorted(events, key=lambda event: (event[1], event[0])),
+            '-date': sorted(sorted(events), key=lambda event: event[2], reverse=True),
+            # Not a (field, id) pair: CursorPagination's own offsets, forward only
+            'name,-date': sorted(sorted(events), key=lambda event: (event[1], -event[2].timestamp())),
+        }
+        for ordering, rows in expected.items():
+            with self.subTest(ordering=ordering):
+                forward, backward = self.walk(f'/api/events/?pagination=cursor&ordering={ordering}')
+                self.assertEqual(sum(forward, []), [pk for pk, *_ in rows])
+                self.assertEqual([len(page) for page in forward], [10, 10, 10, 5])
+                if ',' not in ordering:
+                    self.assertEqual(backward, forward[-2::-1])
+
+    def test_rejects_bad_cursors(self):
+        # Not a cursor, and a cursor whose position is not a (value, id) pair
+        for cursor in ('bm9wZQ', 'cD1hYmM%3D'):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(APIClient().get(f'/api/events/?cursor={cursor}').status_code, 404)
+
+
+class QueryPlanTest(TestCase):
+    # Runs EXPLAIN on every SELECT an endpoint issues against a seeded database and
+    # fails when the planner falls back to a full table scan.
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            email='admin@example.com', username='admin', password='pass', role=User.Role.ADMIN,
+        )
+        cls.creator = User.objects.create_user(
+            email='creator@example.com', username='creator', password='pass',
+            role=User.Role.EVENT_CREATOR,
+        )
+        cls.user = User.objects.create_user(email='user@example.com', username='user', password='pass')
+        users = User.objects.bulk_create(
+            User(email=f'user{i}@example.com', username=f'user{i}') for i in range(50)
+        )
+
+        now = timezone.now()
+        events = Event.objects.bulk_create(
+            Event(
+                name=f'Event {i}', description='Seeded event', capacity=20, remaining_capacity=20,
+                date=now + timezone.timedelta(days=i - 100), location='Hall',
+                status=Event.Status.OPEN if i % 3 else Event.Status.CLOSED,
+                creator=cls.creator if i % 2 else cls.admin,
+            )
+            for i in range(300)
+        )
+        Participant.objects.bulk_create(
+            Participant(event=event, user=user)
+            for event in events[1::3] for user in users[:10] + [cls.user]
+        )
+        Event.objects.recount_participants()
+        EventLog.objects.bulk_create(
+            EventLog(event=participant.event, user=participant.user, action=EventLog.Action.JOIN, description='')
+            for participant in Participant.objects.select_related('event', 'user')
+        )
+        cls.event = events[1]
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('EXPLAIN ' + sql)
+                return [line for line, in cursor.fetchall() if 'Seq Scan' in line]
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            # "SCAN <table>" without "USING ... INDEX" is a full table scan
+            return [
+                detail for *_, detail in cursor.fetchall()
+                if detail.startswith('SCAN ') and ' USING ' not in detail
+                and 'VIRTUAL TABLE' not in detail and 'CONSTANT ROW' not in detail
+            ]
+
+    def assert_no_full_scans(self, user, url):
+        client = APIClient()
+        if user:
+            client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            with self.subTest(url=url, sql=sql):
+                self.assertEqual(self.explain(sql), [], f'{url} issues a full table scan:\n{sql}')
+
+    def test_event_endpoints(self):
+        event = self.event.pk
+        cases = [
+            (None, '/api/events/'),
+            (None, '/api/events/?has_capacity=true'),
+            (None, '/api/events/?upcoming=true'),
+            (None, '/api/events/?search=seeded'),
+            (None, f'/api/events/{event}/'),
+            (self.admin, '/api/events/'),
+            (self.admin, '/api/events/?status=OPEN'),
+            (self.admin, '/api/events/?date_from=2000-01-01T00:00:00Z&pagination=cursor'),
+            (self.creator, '/api/events/?created=true'),
+            (self.user, '/api/events/?joined=true'),
+            (self.admin, f'/api/events/{event}/'),
+            (self.admin, f'/api/events/{event}/participants/'),
+        ]
+        for user, url in cases:
+            self.assert_no_full_scans(user, url)
+
+    def test_participant_endpoints(self):
+        for user in (self.admin, self.creator, self.user):
+            self.assert_no_full_scans(user, '/api/events/participants/')
+
+    def test_log_endpoints(self):
+        for user in (self.admin, self.creator, self.user):
+            self.assert_no_full_scans(user, '/api/logs/')
+        self.assert_no_full_scans(self.admin, f'/api/logs/?event={self.event.pk}')
+        self.assert_no_full_scans(self.admin, f'/api/logs/?user={self.user.pk}')
+
+
+class VisibilityTest(TestCase):
+    # The event, participant and log viewsets share the rules in events/visibility.py
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            email='admin@example.com', username='admin', password='pass', role=User.Role.ADMIN,
+        )
+        cls.creator = User.objects.create_user(
+            email='creator@example.com', username='creator', password='pass',
+            role=User.Role.EVENT_CREATOR,
+        )
+        cls.user = User.objects.create_user(email='user@example.com', username='user', password='pass')
+        date = timezone.now() + timezone.timedelta(days=1)
+        cls.created, cls.joined, cls.other = Event.objects.bulk_create(
+            Event(name=name, description='', capacity=10, remaining_capacity=10, date=date,
+                  location='Hall', creator=creator)
+            for name, creator in (('Created', cls.creator), ('Joined', cls.admin), ('Other', cls.admin))
+        )
+        Participant.objects.bulk_create([
+            Participant(event=cls.created, user=cls.user),
+            Participant(event=cls.joined, user=cls.creator),
+            Participant(event=cls.joined, user=cls.user),
+            Participant(event=cls.other, user=cls.admin),
+        ])
+        EventLog.objects.bulk_create(
+            EventLog(event=event, user=cls.admin, action=EventLog.Action.UPDATE, description='')
+            for event in (cls.created, cls.joined, cls.other) for _ in range(2)
+        )
+
+    def results(self, user, url):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_logs(self):
+        cases = [
+            (self.admin, {self.created.pk: 2, self.joined.pk: 2, self.other.pk: 2}),
+            (self.creator, {self.created.pk: 2, self.joined.pk: 2}),
+            (self.user, {self.created.pk: 2, self.joined.pk: 2}),
+        ]
+        for user, expected in cases:
+            with self.subTest(user=user.username):
+                events = [log['event'] for log in self.results(user, '/api/logs/')]
+                self.assertEqual({pk: events.count(pk) for pk in set(events)}, expected)
+
+    def test_participants(self):
+        cases = [
+            (self.admin, 4),
+            (self.creator, 2),  # the participant of their event and their own participation
+            (self.user, 2),
+        ]
+        for user, expected in cases:
+            with self.subTest(user=user.username):
+                self.assertEqual(len(self.results(user, '/api/events/participants/')), expected)
+
+    def test_joined_events(self):
+        events = self.results(self.user, '/api/events/?joined=true')
+        self.assertEqual(sorted(event['id'] for event in events), [self.created.pk, self.joined.pk])
+
+
+class BulkOperationsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            email='admin@example.com', username='admin', password='pass', role=User.Role.ADMIN,
+        )
+        cls.creator = User.objects.create_user(
+            email='creator@example.com', username='creator', password='pass',
+            role=User.Role.EVENT_CREATOR,
+        )
+        cls.users = User.objects.bulk_create(
+            User(email=f'user{i}@example.com', username=f'user{i}') for i in range(5)
+        )
+        cls.event = Event.objects.create(
+            name='Workshop', description='', capacity=3,
+            date=timezone.now() + timezone.timedelta(days=1), location='Hall', creator=cls.creator,
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_enroll_reports_each_user(self):
+        Participant.objects.create(event=self.event, user=self.users[0])
+        self.client.force_authenticate(self.creator)
+        user_ids = [user.pk for user in self.users] + [999999]
+        response = self.client.post(f'/api/events/{self.event.pk}/enroll/', {'users': user_ids}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['enrolled'], 2)
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['already_participant', 'enrolled', 'enrolled', 'event_full', 'event_full', 'user_not_found'],
+        )
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.participant_count, 3)
+        self.assertEqual(self.event.remaining_capacity, 0)
+        self.assertEqual(self.event.participants.count(), 3)
+        self.assertEqual(
+            EventLog.objects.filter(event=self.event, action=EventLog.Action.JOIN, metadata__enrolled_by=self.creator.pk)
+            .count(),
+            2,
+        )
+
+    def test_enroll_requires_event_owner(self):
+        self.client.force_authenticate(self.users[0])
+        response = self.client.post(
+            f'/api/events/{self.event.pk}/enroll/', {'users': [self.users[1].pk]}, format='json',
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_bulk_create_enforces_open_event_quota(self):
+        # The creator already has one open event, the default limit is five
+        event = {
+            'name': 'Bulk', 'description': 'x', 'capacity': 10, 'location': 'Hall',
+            'date': '2030-01-01T00:00:00Z',
+        }
+        items = [event] * 5 + [{**event, 'status': Event.Status.CLOSED}, {**event, 'capacity': -1}]
+        self.client.force_authenticate(self.creator)
+        response = self.client.post('/api/events/bulk/', items, format='json')
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['created'] * 4 + ['quota_exceeded', 'created', 'invalid'],
+        )
+        self.assertEqual(
+            response.data['results'][4]['errors'],
+            {'status': ['You have reached the maximum number of open events (5).']},
+        )
+        self.assertEqual(response.data['created'], 5)
+        self.assertEqual(Event.objects.filter(creator=self.creator, status=Event.Status.OPEN).count(), 5)
+        created = Event.objects.get(pk=response.data['results'][0]['id'])
+        self.assertEqual(created.remaining_capacity, 10)
+
+
+class SearchTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create_user(
+            email='creator@example.com', username='creator', password='pass', role=User.Role.EVENT_CREATOR,
+        )
+        date = timezone.now() + timezone.timedelta(days=1)
+        for name, description, location in [
+            ('Meetup', 'Python talks', 'Hall'),
+            ('Gathering', 'Talks', 'Python Hall'),
+            ('Python Summit', 'Talks', 'Hall'),
+            ('Jazz Night', 'Music', 'Club'),
+        ]:
+            Event.objects.create(
+                name=name, description=description, location=location, capacity=5, date=date, creator=cls.creator,
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.creator)
+
+    def names(self, query):
+        return [event['name'] for event in self.client.get(f'/api/events/?{query}').data['results']]
+
+    def test_ranks_name_over_location_over_description(self):
+        self.assertEqual(self.names('search=pyth'), ['Python Summit', 'Gathering', 'Meetup'])
+        self.assertEqual(self.names('search=python talks'), ['Python Summit', 'Gathering', 'Meetup'])
+        self.assertEqual(self.names('search=nothing'), [])
+        # An explicit ordering wins over relevance
+        self.assertEqual(self.names('search=python&ordering=name'), ['Gathering', 'Meetup', 'Python Summit'])
+
+    def test_index_follows_event_writes(self):
+        event = Event.objects.get(name='Jazz Night')
+        self.assertEqual(self.names('search=jazz'), ['Jazz Night'])
+
+        event.name = 'Blues Night'
+        event.save()
+        self.assertEqual(self.names('search=jazz'), [])
+        self.assertEqual(self.names('search=blues'), ['Blues Night'])
+
+        event.delete()
+        self.assertEqual(self.names('search=blues'), [])
+        self.assertEqual(self.names('search=night'), [])
+
+        # Bulk creation skips post_save and indexes the accepted events itself
+        response = self.client.post('/api/events/bulk/', [{
+            'name': 'Salsa Night', 'description': 'Dance', 'capacity': 10, 'location': 'Club',
+            'date': '2030-01-01T00:00:00Z',
+        }], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.names('search=salsa'), ['Salsa Night'])
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {get_search_backend().table}')
+        self.assertEqual(self.names('search=python'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.names('search=python'), ['Python Summit', 'Gathering', 'Meetup'])
+
+
+class AsyncEventViewsTest(TestCase):
+    # /api/async/events/ must serve the same payloads as EventViewSet
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.context = benchmarks.seed(users=30, events=30, participants=12, logs=0, spare_events=1)
+
+    def setUp(self):
+        # Primary keys are reused between tests: no cached join answer or user state may leak
+        caches['default'].clear()
+        user_states.clear()
+
+    def client_for(self, user):
+        client = APIClient()
+        if user:
+            token = CustomTokenObtainPairSerializer.get_token(user).access_token
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return client
+
+    def test_reads_match_viewset(self):
+        event = self.context['event'].pk
+        paths = [
+            '', '?page=2', '?page=99', '?has_capacity=true&upcoming=true', '?joined=true', '?search=benchmark',
+            '?pagination=cursor', '?ordering=name', f"?creator={self.context['creator'].pk}", '?status=BAD',
+            f'{event}/', '999999/', 'abc/', '?fields=id,name,date,location,remaining_capacity',
+            '?omit=description&pagination=cursor', '?fields=bogus', f'{event}/?omit=description,participants',
+            f'{event}/?fields=creator_name,participants',
+        ]
+        for user in (None, self.context['user']):
+            client = self.client_for(user)
+            for path in paths:
+                with self.subTest(user=user, path=path):
+                    expected = client.get(f'/api/events/{path}')
+                    response = client.get(f'/api/async/events/{path}')
+                    self.assertEqual(response.status_code, expected.status_code)
+                    self.assertEqual(
+                        response.content, expected.content.replace(b'/api/events/', b'/api/async/events/'),
+                    )
+
+    def test_join_and_leave(self):
+        event = self.context['join_event']
+        client = self.client_for(self.context['user'])
+
+        response = client.post(f'/api/async/events/{event.pk}/join/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['user'], self.context['user'].pk)
+        response = client.post(f'/api/async/events/{event.pk}/join/')
+        self.assertEqual(response.json(), {'event': ['You are already a participant of this event.']})
+        event.refresh_from_db()
+        self.assertEqual(event.participant_count, 1)
+
+        self.assertEqual(client.post(f'/api/async/events/{event.pk}/leave/').status_code, 204)
+        self.assertEqual(client.post(f'/api/async/events/{event.pk}/leave/').status_code, 400)
+        self.assertEqual(self.client_for(None).post(f'/api/async/events/{event.pk}/leave/').status_code, 401)
+        self.assertEqual(
+            list(EventLog.objects.filter(event=event).order_by('id').values_list('action', flat=True)),
+            [EventLog.Action.JOIN, EventLog.Action.LEAVE],
+        )
+
+
+class LiveCapacityStreamTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create_user(
+            email='creator@example.com', username='creator', password='pass',
+            role=User.Role.EVENT_CREATOR,
+        )
+        cls.user = User.objects.create_user(email='user@example.com', username='user', password='pass')
+        date = timezone.now() + timezone.timedelta(days=1)
+        cls.event, cls.closed = Event.objects.bulk_create(
+            Event(name=name, description='', capacity=2, remaining_capacity=2, date=date, location='Hall',
+                  status=status, creator=cls.creator)
+            for name, status in (('Open', Event.Status.OPEN), ('Closed', Event.Status.CLOSED))
+        )
+
+    def setUp(self):
+        # A fresh hub per test; streams left open by a test never leak into the next
+        hub = mock.patch.object(live, 'hub', live.CapacityHub())
+        hub.start()
+        self.addCleanup(hub.stop)
+
+    def write(self, change):
+        # Runs the write and its on_commit callbacks, as a committed transaction would
+        def run():
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+        return sync_to_async(run)()
+
+    async def next_state(self, messages):
+        message = await asyncio.wait_for(anext(messages), 2)
+        return json.loads(message.decode().split('data: ', 1)[1])
+
+    async def test_pushes_joins_and_status_changes(self):
+        response = await AsyncClient().get(f'/api/events/stream/?events={self.event.pk},{self.closed.pk}')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        messages = aiter(response.streaming_content)
+        # Anonymous callers only see open events
+        self.assertEqual(await self.next_state(messages), {
+            'id': self.event.pk, 'status': 'OPEN', 'capacity': 2, 'participant_count': 0,
+            'remaining_capacity': 2, 'is_full': False,
+        })
+
+        await self.write(lambda: Participant.objects.reserve(self.event, self.user))
+        self.assertEqual((await self.next_state(messages))['remaining_capacity'], 1)
+
+        def close():
+            self.event.status = Event.Status.CLOSED
+            self.event.save()
+        await self.write(close)
+        self.assertEqual((await self.next_state(messages))['status'], 'CLOSED')
+
+        await messages.aclose()
+
+    async def test_closing_the_response_unsubscribes(self):
+        # StreamingHttpResponse.close() calls CapacityStream.close()
+        stream = live.CapacityStream([self.event.pk])
+        self.assertEqual(live.hub.watched([self.event.pk]), [self.event.pk])
+        stream.close()
+        self.assertEqual(live.hub.watched([self.event.pk]), [])
+
+    @override_settings(EVENT_STREAM={'POLL_INTERVAL': 0.05})
+    async def test_picks_up_writes_of_other_processes(self):
+        response = await AsyncClient().get(f'/api/events/stream/?events={self.event.pk}')
+        messages = aiter(response.streaming_content)
+        await self.next_state(messages)
+
+        # No capacity_changed(): only the cache generation tells the stream
+        def update():
+            Event.objects.filter(pk=self.event.pk).update(capacity=5, remaining_capacity=5)
+            bump_generation()
+        await self.write(update)
+        self.assertEqual((await self.next_state(messages))['capacity'], 5)
+        await messages.aclose()
+
+    async def test_rejects_bad_requests(self):
+        client = AsyncClient()
+        self.assertEqual((await client.get('/api/events/stream/?events=x')).status_code, 400)
+        self.assertEqual((await client.get(f'/api/events/stream/?events={self.closed.pk}')).status_code, 404)
+
+    def test_requires_asgi(self):
+        # Under WSGI the stream would never end
+        self.assertEqual(APIClient().get(f'/api/events/stream/?events={self.event.pk}').status_code, 501)
+
+
+class ProjectedListTest(TestCase):
+    # The values() fast path and the orjson renderer must not change a single byte
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.context = benchmarks.seed(users=12, events=15, participants=3, logs=0, spare_events=1)
+        creator = User.objects.create_user(
+            email='zoe@example.com', username='zoe', password='pass',
+            role=User.Role.EVENT_CREATOR, first_name='Zoë', last_name='Ünal',
+        )
+        full = Event.objects.create(
+            name='Café ☕ \u2028 "quoted"', description='Line\nbreak\x01\u2029', capacity=1,
+            date=timezone.now() + timezone.timedelta(days=3, microseconds=123456), location='Hall',
+            creator=creator,
+        )
+        Participant.objects.create(event=full, user=cls.context['user'])
+
+    def test_list_matches_serializer(self):
+        paths = [
+            '', '?page=2', '?search=benchmark', '?search=caf', '?pagination=cursor', '?ordering=-participant_count',
+            '?has_capacity=false', f"?creator={self.context['creator'].pk}",
+        ]
+        client = APIClient()
+        for user in (None, self.context['user']):
+            client.force_authenticate(user)
+            for path in paths:
+                with self.subTest(user=user, path=path):
+                    response = client.get(f'/api/events/{path}')
+                    with mock.patch.object(ProjectedListMixin, 'list', ListModelMixin.list), \
+                            mock.patch.object(ORJSONRenderer, 'render', JSONRenderer.render):
+                        bump_generation()  # skip the anonymous response cache
+                        expected = client.get(f'/api/events/{path}')
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response.content, expected.content)
+
+    def test_renderer_matches_json_renderer(self):
+        data = {
+            'text': 'Zoë \u2028\u2029 \x00\x1f\x7f "\\/', 'lazy': gettext_lazy('Not found.'),
+            'error': ErrorDetail('Invalid.', code='invalid'), 'decimal': Decimal('1.50'),
+            'datetime': timezone.now(), 'date': timezone.now().date(), 'big': 2 ** 70,
+            'numbers': (1, -2, 0.5, 1 / 3), 1: None, 'nested': [{'a': [True, False]}],
+        }
+        for value in (data, [data], None, ''):
+            for media_type in ('application/json', 'application/json; indent=2'):
+                with self.subTest(value=value, media_type=media_type):
+                    self.assertEqual(
+                        ORJSONRenderer().render(value, media_type), JSONRenderer().render(value, media_type),
+                    )
+
+
+class SparseFieldsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.context = benchmarks.seed(users=12, events=5, participants=3, logs=0, spare_events=1)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.context['admin'])
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, ' '.join(query['sql'] for query in queries.captured_queries)
+
+    def test_event_list_and_detail(self):
+        mobile = ['id', 'name', 'date', 'location', 'remaining_capacity']
+        for path in ('', '?pagination=cursor'):
+            response, sql = self.get(f"/api/events/?fields={','.join(mobile)}&{path}")
+            self.assertEqual(list(response.data['results'][0]), mobile)
+            self.assertNotIn('description', sql)
+            self.assertNotIn('users_user', sql)
+
+        event = self.context['event'].pk
+        response, sql = self.get(f'/api/events/{event}/?omit=description,participants')
+        self.assertNotIn('description', response.data)
+        self.assertNotIn('participants', response.data)
+        self.assertNotIn('"description"', sql)
+        self.assertNotIn('events_participant', sql)
+
+        response, sql = self.get(f'/api/events/{event}/?fields=creator_name')
+        self.assertEqual(list(response.data), ['creator_name'])
+        self.assertIn('users_user', sql)
+
+    def test_cursor_pages_with_any_ordering(self):
+        # The cursor position is read from the row even when fields leaves it out
+        for ordering in ('name', '-participant_count', 'created_at'):
+            expected = list(Event.objects.order_by(ordering, 'id').values_list('id', flat=True))
+            for prefix in ('/api/events/', '/api/async/events/'):
+                with self.subTest(ordering=ordering, endpoint=prefix):
+                    ids = []
+                    url = f'{prefix}?pagination=cursor&ordering={ordering}&fields=id'
+                    while url:
+                        with mock.patch.object(EventPagination, 'page_size', 2):
+                            response = self.client.get(url)
+                        self.assertEqual(response.status_code, 200)
+                        data = response.json()
+                        self.assertEqual({key for item in data['results'] for key in item}, {'id'})
+                        ids += [item['id'] for item in data['results']]
+                        url = data['next']
+                    self.assertEqual(ids, expected)
+                    self.assertGreater(len(expected), 2)
+
+    def test_participants(self):
+        response, sql = self.get('/api/events/participants/?fields=id,user')
+        self.assertEqual(list(response.data['results'][0]), ['id', 'user'])
+        self.assertNotIn('users_user', sql)
+        self.assertNotIn('events_event', sql)
+
+        response, sql = self.get(f"/api/events/{self.context['event'].pk}/participants/?omit=user_name,joined_at")
+        self.assertEqual(list(response.data[0]), ['id', 'user', 'user_email'])
+        self.assertNotIn('first_name', sql.split('events_participant', 1)[1])
+
+    def test_rejects_bad_selections(self):
+        for query in ('fields=bogus', 'omit=name&fields=id', 'fields=,'):
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(f'/api/events/?{query}').status_code, 400)
+
+
+class RosterExportTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            email='admin@example.com', username='admin', password='pass', role=User.Role.ADMIN,
+        )
+        cls.creator, cls.other_creator = (
+            User.objects.create_user(
+                email=f'{name}@example.com', username=name, password='pass', role=User.Role.EVENT_CREATOR,
+            )
+            for name in ('creator', 'other')
+        )
+        cls.user = User.objects.create_user(
+            email='user@example.com', username='user', password='pass',
+            first_name='=HYPERLINK("http://evil")', last_name='-1',
+        )
+        cls.event = Event.objects.create(
+            name='Roster', description='', capacity=10, date=timezone.now() + timezone.timedelta(days=1),
+            location='Hall', creator=cls.creator,
+        )
+        cls.participant = Participant.objects.create(event=cls.event, user=cls.user)
+        cls.url = f'/api/events/{cls.event.pk}/participants/'
+
+    def export(self, user, export_format):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get(f'{self.url}?export={export_format}')
+
+    def test_csv(self):
+        response = self.export(self.creator, 'csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn(f'event-{self.event.pk}-participants.csv', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,user,user_email,user_name,joined_at')
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith(f'{self.participant.pk},{self.user.pk},user@example.com,'))
+        # Cells a spreadsheet would evaluate are quoted
+        self.assertIn('"\'=HYPERLINK(""http://evil"") -1"', lines[1])
+
+    def test_ndjson(self):
+        response = self.export(self.creator, 'ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual((rows[0]['id'], rows[0]['user']), (self.participant.pk, self.user.pk))
+        # JSON needs no formula quoting
+        self.assertEqual(rows[0]['user_name'], '=HYPERLINK("http://evil") -1')
+
+    def test_unknown_format(self):
+        response = self.export(self.creator, 'xlsx')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('export', response.data)
+
+    def test_access(self):
+        cases = [
+            (self.creator, 200),
+            (self.admin, 200),
+            (self.other_creator, 403),
+            (self.user, 403),
+        ]
+        for user, expected in cases:
+            for export_format in ('csv', 'ndjson'):
+                with self.subTest(user=user.username, export=export_format):
+                    self.assertEqual(self.export(user, export_format).status_code, expected)
+        self.assertEqual(APIClient().get(f'{self.url}?export=csv').status_code, 401)
+
+
+@override_settings(DATABASE_REPLICAS={'ALIASES': ['replica1'], 'STICKY_SECONDS': 60})
+class ReplicaRoutingTest(SimpleTestCase):
+    # Routing decisions only; no replica database is needed to check them
+
+    def setUp(self):
+        caches['default'].clear()
+        self.factory = RequestFactory()
+
+    def token(self, user_id):
+        token = AccessToken()
+        token['user_id'] = user_id
+        return f'Bearer {token}'
+
+    def routed(self, method, path, user_id=None, status=200):
+        # The alias Event reads go to while the request is served
+        seen = []
+
+        def view(request):
+            seen.append((router.db_for_read(Event), router.db_for_write(Event)))
+            return HttpResponse(status=status)
+
+        headers = {'HTTP_AUTHORIZATION': self.token(user_id)} if user_id else {}
+        replicas.ReplicaMiddleware(view)(getattr(self.factory, method)(path, **headers))
+        self.assertEqual(seen[0][1], 'default')
+        return seen[0][0]
+
+    def test_safe_api_reads_go_to_replicas(self):
+        self.assertEqual(self.routed('get', '/api/events/'), 'replica1')
+        self.assertEqual(self.routed('get', '/api/logs/', user_id=7), 'replica1')
+        self.assertEqual(self.routed('get', '/api/users/me/', user_id=7), 'default')
+        self.assertEqual(self.routed('post', '/api/events/1/join/', user_id=7), 'default')
+        self.assertEqual(router.db_for_read(Event), 'default')
+
+    def test_writers_stick_to_the_primary(self):
+        self.routed('post', '/api/events/1/join/', user_id=7, status=400)
+        self.assertEqual(self.routed('get', '/api/events/', user_id=7), 'replica1')
+
+        self.routed('post', '/api/events/1/join/', user_id=7, status=201)
+        self.assertEqual(self.routed('get', '/api/events/1/', user_id=7), 'default')
+        self.assertEqual(self.routed('get', '/api/events/1/', user_id=8), 'replica1')
+        self.assertEqual(self.routed('get', '/api/events/1/'), 'replica1')
+
+    async def test_async_requests(self):
+        seen = []
+
+        async def view(request):
+            seen.append(router.db_for_read(Event))
+            return HttpResponse(status=204)
+
+        middleware = replicas.ReplicaMiddleware(view)
+        await middleware(self.factory.delete('/api/events/1/', HTTP_AUTHORIZATION=self.token(7)))
+        await middleware(self.factory.get('/api/async/events/', HTTP_AUTHORIZATION=self.token(7)))
+        await middleware(self.factory.get('/api/async/events/', HTTP_AUTHORIZATION=self.token(8)))
+        self.assertEqual(seen, ['default', 'default', 'replica1'])
+
+    def test_replica_responses_right_after_a_write_are_not_cached(self):
+        token = replicas.current_replica.set('replica1')
+        self.addCleanup(replicas.current_replica.reset, token)
+        with mock.patch('events.cache.get_last_modified', return_value=time.time()):
+            self.assertTrue(generation_may_be_ahead())
+        with mock.patch('events.cache.get_last_modified', return_value=time.time() - 61):
+            self.assertFalse(generation_may_be_ahead())
+
+
+class NearFilterTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create_user(
+            email='creator@example.com', username='creator', password='pass', role=User.Role.EVENT_CREATOR,
+        )
+        # A dense cluster around London plus events all over the globe, the poles
+        # and the antimeridian included
+        rng = random.Random(7)
+        points = [(rng.uniform(51, 52), rng.uniform(-1, 1)) for _ in range(300)]
+        points += [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(300)]
+        points += [(89.9, 0), (0, 179.99), (0, -179.99)]
+        events = []
+        for latitude, longitude in points:
+            event = Event(
+                name='Geo', description='', capacity=5, remaining_capacity=5, date=timezone.now(),
+                location='Somewhere', creator=cls.creator, latitude=latitude, longitude=longitude,
+                status=Event.Status.CLOSED,
+            )
+            event.locate()
+            events.append(event)
+        cls.events = Event.objects.bulk_create(events)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.creator)
+
+    def haversine(self, latitude, longitude, event):
+        lat1, lon1, lat2, lon2 = map(math.radians, (latitude, longitude, event.latitude, event.longitude))
+        half_chord = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+        return 2 * geo.EARTH_RADIUS_KM * math.asin(math.sqrt(half_chord))
+
+    def test_matches_exact_distances(self):
+        for latitude, longitude, radius_km in [
+            (51.5, 0, 5), (51.5, 0, 40), (89.5, 90, 100), (0, 180, 50), (-20, 30, 500), (10, 10, 0.5),
+        ]:
+            with self.subTest(latitude=latitude, longitude=longitude, radius_km=radius_km):
+                response = self.client.get('/api/events/', {
+                    'near': f'{latitude},{longitude}', 'radius_km': radius_km, 'fields': 'id',
+                    'pagination': 'cursor',
+                })
+                found = {item['id'] for item in response.data['results']}
+                while response.data['next']:
+                    response = self.client.get(response.data['next'])
+                    found |= {item['id'] for item in response.data['results']}
+                expected = {
+                    event.pk for event in self.events if self.haversine(latitude, longitude, event) <= radius_km
+                }
+                self.assertEqual(found, expected)
+                self.assertEqual(
+                    found, set(geo.brute_force_near(Event.objects.all(), latitude, longitude, radius_km)
+                               .values_list('pk', flat=True)),
+                )
+
+    def test_rejects_bad_points(self):
+        for query in ('near=abc', 'near=91,0', 'near=1,2,3', 'near=51,0&radius_km=-1', 'near=51,0&radius_km=100000'):
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(f'/api/events/?{query}').status_code, 400)
+
+    def test_locations_are_geocoded_from_the_gazetteer(self):
+        gazetteer = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False)
+        gazetteer.write('name,latitude,longitude\nBerlin,52.52,13.405\nParis,48.8566,2.3522\n')
+        gazetteer.close()
+        self.addCleanup(os.remove, gazetteer.name)
+
+        with override_settings(EVENT_GEO={'GAZETTEER': gazetteer.name}):
+            data = {'name': 'Meetup', 'description': 'x', 'capacity': 10, 'date': '2030-01-01T00:00:00Z',
+                    'location': 'Hall 3,  berlin'}
+            created = Event.objects.get(pk=self.client.post('/api/events/', data, format='json').data['id'])
+            self.assertEqual((created.latitude, created.longitude), (52.52, 13.405))
+            self.assertEqual(created.geohash, geo.encode(52.52, 13.405))
+
+            self.client.patch(f'/api/events/{created.pk}/', {'location': 'Paris'}, format='json')
+            created.refresh_from_db()
+            self.assertEqual((created.latitude, created.longitude), (48.8566, 2.3522))
+
+            # Given coordinates win; an unknown place stays unlocated
+            data.update(name='Elsewhere', latitude=1.5, longitude=2.5)
+            response = self.client.post('/api/events/', data, format='json')
+            self.assertEqual((response.data['latitude'], response.data['longitude']), (1.5, 2.5))
+            data.update(location='Atlantis', latitude=None, longitude=None)
+            response = self.client.post('/api/events/', data, format='json')
+            self.assertIsNone(response.data['latitude'])
+            self.assertEqual(Event.objects.get(pk=response.data['id']).geohash, '')
+
+            data.update(latitude=1.5)
+            self.assertEqual(self.client.post('/api/events/', data, format='json').status_code, 400)
+
+
+class CalendarTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create_user(
+            email='creator@example.com', username='creator', password='pass', role=User.Role.EVENT_CREATOR,
+        )
+        cls.user = User.objects.create_user(email='user@example.com', username='user', password='pass')
+        # (day of October 2030, UTC time, status, remaining capacity)
+        rows = [
+            (1, '09:00', 'OPEN', 5), (1, '18:00', 'OPEN', 0), (1, '20:00', 'CLOSED', 5),
+            (5, '23:30', 'OPEN', 5), (6, '10:00', 'CANCELED', 5), (13, '12:00', 'OPEN', 5),
+            (31, '23:30', 'OPEN', 5), (30, '12:00', 'CLOSED', 0),
+        ]
+        cls.events = Event.objects.bulk_create(
+            Event(
+                name=f'Calendar {index}', description='', capacity=5, remaining_capacity=remaining,
+                date=timezone.datetime.fromisoformat(f'2030-10-{day:02d}T{clock}:00+00:00'),
+                location='Hall', creator=cls.creator, status=status,
+            )
+            for index, (day, clock, status, remaining) in enumerate(rows)
+        )
+        Participant.objects.bulk_create([Participant(event=cls.events[2], user=cls.user)])
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def calendar(self, **params):
+        response = self.client.get('/api/events/calendar/', {'start': '2030-10-01', 'end': '2030-10-31', **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        return {str(bucket.pop('date')): bucket for bucket in response.data['buckets']}, response.data['totals']
+
+    def test_counts_per_day_in_one_query(self):
+        self.client.force_authenticate(self.creator)
+        with self.assertNumQueries(1):
+            buckets, totals = self.calendar()
+        self.assertEqual(list(buckets), ['2030-10-01', '2030-10-05', '2030-10-06', '2030-10-13', '2030-10-30',
+                                         '2030-10-31'])
+        self.assertEqual(buckets['2030-10-01'], {
+            'total': 3, 'open': 2, 'closed': 1, 'canceled': 0, 'available': 1, 'full': 1,
+        })
+        self.assertEqual(totals, {'total': 8, 'open': 5, 'closed': 2, 'canceled': 1, 'available': 4, 'full': 2})
+
+        # The list's filters apply too
+        buckets, totals = self.calendar(status='CLOSED')
+        self.assertEqual(list(buckets), ['2030-10-01', '2030-10-30'])
+
+    def test_same_visibility_as_the_list(self):
+        # Anonymous callers count open events only
+        buckets, totals = self.calendar()
+        self.assertEqual(totals['total'], 5)
+        self.assertEqual(totals['closed'] + totals['canceled'], 0)
+
+        self.client.force_authenticate(self.user)
+        buckets, totals = self.calendar(joined='true')
+        self.assertEqual(buckets, {'2030-10-01': {
+            'total': 1, 'open': 0, 'closed': 1, 'canceled': 0, 'available': 0, 'full': 0,
+        }})
+
+    def test_weeks_and_time_zones(self):
+        self.client.force_authenticate(self.creator)
+        # 23:30 UTC is the next day in Berlin: Oct 5 moves to Oct 6, Oct 31 leaves the range
+        buckets, totals = self.calendar(tz='Europe/Berlin')
+        self.assertNotIn('2030-10-05', buckets)
+        self.assertEqual(buckets['2030-10-06']['total'], 2)
+        self.assertEqual(totals['total'], 7)
+
+        # ISO weeks start on Monday; Oct 1 2030 is a Tuesday
+        buckets, totals = self.calendar(bucket='week')
+        self.assertEqual({day: bucket['total'] for day, bucket in buckets.items()}, {
+            '2030-09-30': 5, '2030-10-07': 1, '2030-10-28': 2,
+        })
+
+    def test_rejects_bad_ranges(self):
+        for query in ('start=2030-10-31&end=2030-10-01', 'start=2030-01-01&end=2031-12-31', 'bucket=year',
+                      'tz=Mars/Olympus', 'start=soon'):
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(f'/api/events/calendar/?{query}').status_code, 400)
+
+
+class SweeperTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create_user(
+            email='creator@example.com', username='creator', password='pass', role=User.Role.EVENT_CREATOR,
+        )
+        now = timezone.now()
+        cls.past = Event.objects.bulk_create(
+            Event(name=f'Past {i}', description='', capacity=5, remaining_capacity=5, location='Hall',
+                  date=now - timezone.timedelta(days=i + 1), creator=cls.creator)
+            for i in range(5)
+        )
+        # bulk_create skips the open-events quota these past events would otherwise exhaust
+        cls.upcoming, cls.canceled = Event.objects.bulk_create([
+            Event(name='Upcoming', description='', capacity=5, remaining_capacity=5, location='Hall',
+                  date=now + timezone.timedelta(days=1), creator=cls.creator),
+            Event(name='Canceled', description='', capacity=5, remaining_capacity=5, location='Hall',
+                  status=Event.Status.CANCELED, date=now - timezone.timedelta(days=1), creator=cls.creator),
+        ])
+
+    def test_closes_past_open_events_in_batches(self):
+        generation = get_generation()
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            self.assertEqual(sweeper.close_past_events(batch_size=2), 5)
+        # Per batch: the SELECT, the UPDATE and the log INSERT; the short last batch ends the run
+        statements = [query['sql'].split()[0] for query in queries if 'SAVEPOINT' not in query['sql']]
+        self.assertEqual(statements, ['SELECT', 'UPDATE', 'INSERT'] * 3)
+
+        self.assertEqual(
+            set(Event.objects.filter(status=Event.Status.CLOSED).values_list('pk', flat=True)),
+            {event.pk for event in self.past},
+        )
+        self.assertEqual(Event.objects.get(pk=self.upcoming.pk).status, Event.Status.OPEN)
+        self.assertEqual(Event.objects.get(pk=self.canceled.pk).status, Event.Status.CANCELED)
+        self.assertTrue(all(
+            event.updated_at > self.past[0].updated_at
+            for event in Event.objects.filter(pk__in=[past.pk for past in self.past])
+        ))
+        logs = EventLog.objects.filter(action=EventLog.Action.STATUS_CHANGE)
+        self.assertEqual(
+            sorted(logs.values_list('event_id', 'user_id')), sorted((event.pk, self.creator.pk) for event in self.past),
+        )
+        self.assertEqual(logs[0].metadata, {'from': 'OPEN', 'to': 'CLOSED', 'reason': 'date_passed'})
+        self.assertGreater(get_generation(), generation)
+
+        # Nothing left to do
+        self.assertEqual(sweeper.close_past_events(), 0)
+        self.assertEqual(APIClient().get('/api/events/').data['count'], 1)
+
+    def test_grace_period_and_command(self):
+        out = StringIO()
+        with override_settings(EVENT_SWEEPER={'GRACE_MINUTES': 3 * 24 * 60}):
+            call_command('close_past_events', '--dry-run', stdout=out)
+            self.assertIn('3 past event(s) would be closed', out.getvalue())
+            call_command('close_past_events', stdout=out)
+        self.assertEqual(Event.objects.filter(status=Event.Status.OPEN).count(), 3)
+
+    def test_uses_the_open_events_index(self):
+        plan = sweeper.past_events().order_by('date', 'id').explain()
+        self.assertRegex(plan, 'event_open_date_idx|event_status_date_idx')
+
+
+@override_settings(METRICS={'PROFILE_ROUTES': ['event-list'], 'PROFILE_INTERVAL': 0.0001})
+class MetricsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.context = benchmarks.seed(users=5, events=5, participants=2, logs=0, spare_events=1)
+
+    def setUp(self):
+        # Primary keys are reused between tests: no cached join answer or user state may leak
+        caches['default'].clear()
+        user_states.clear()
+
+    def scrape(self, **headers):
+        response = self.client.get('/metrics', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        return samples
+
+    def test_records_each_route(self):
+        client = APIClient()
+        client.force_authenticate(self.context['user'])
+        with CaptureQueriesContext(connection) as queries:
+            client.get('/api/events/')
+        list_queries = len(queries)  # the next request clears the query log
+        client.post(f"/api/events/{self.context['join_event'].pk}/join/")
+        client.get('/api/events/999999/')
+
+        samples = self.scrape()
+        labels = 'route="event-list",method="GET"'
+        self.assertEqual(samples[f'eventhub_requests_total{{{labels},status="200"}}'], 1)
+        self.assertEqual(samples['eventhub_requests_total{route="event-join",method="POST",status="201"}'], 1)
+        self.assertEqual(samples['eventhub_requests_total{route="event-detail",method="GET",status="404"}'], 1)
+        self.assertEqual(samples[f'eventhub_db_queries_sum{{{labels}}}'], list_queries)
+        self.assertEqual(samples[f'eventhub_db_queries_bucket{{{labels},le="+Inf"}}'], 1)
+        self.assertGreater(samples[f'eventhub_db_duration_seconds_total{{{labels}}}'], 0)
+        self.assertGreater(samples[f'eventhub_serialization_duration_seconds_total{{{labels}}}'], 0)
+        self.assertGreater(samples[f'eventhub_render_duration_seconds_total{{{labels}}}'], 0)
+        self.assertGreater(samples[f'eventhub_request_duration_seconds_sum{{{labels}}}'], 0)
+        self.assertGreater(samples[f'eventhub_response_size_bytes_sum{{{labels}}}'], 100)
+
+        # The profiled route has folded stacks; others have none
+        self.client.force_login(self.context['admin'])
+        profile = self.client.get('/metrics/profile/', {'route': 'event-list'}).content.decode()
+        self.assertIn('list (', profile)
+        self.assertEqual(self.client.get('/metrics/profile/', {'route': 'event-join'}).content, b'')
+
+    def test_times_serializers_and_every_renderer(self):
+        client = APIClient()
+        client.force_authenticate(self.context['admin'])
+        client.get('/api/users/')
+        # The browsable API and indented JSON bypass orjson
+        client.get(f"/api/events/{self.context['event'].pk}/?format=api")
+        client.get('/api/logs/', HTTP_ACCEPT='application/json; indent=2')
+
+        samples = self.scrape()
+        for labels in ('route="user-list",method="GET"', 'route="event-detail",method="GET"',
+                       'route="eventlog-list",method="GET"'):
+            with self.subTest(labels=labels):
+                self.assertGreater(samples[f'eventhub_serialization_duration_seconds_total{{{labels}}}'], 0)
+                self.assertGreater(samples[f'eventhub_render_duration_seconds_total{{{labels}}}'], 0)
+
+    async def test_counts_queries_of_async_views(self):
+        await self.async_client.get('/api/async/events/')
+        samples = await sync_to_async(self.scrape)()
+        labels = 'route="async-event-list",method="GET"'
+        self.assertGreater(samples[f'eventhub_db_queries_sum{{{labels}}}'], 0)
+        self.assertGreater(samples[f'eventhub_serialization_duration_seconds_total{{{labels}}}'], 0)
+        self.assertGreater(samples[f'eventhub_render_duration_seconds_total{{{labels}}}'], 0)
+
+    def test_adds_up_worker_processes(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with override_settings(METRICS={'DIR': directory, 'FLUSH_INTERVAL': 60}):
+            self.client.get('/api/events/')
+            other = metrics.Registry()
+            labels = (('route', 'event-list'), ('method', 'GET'))
+            other.inc('eventhub_requests_total', (*labels, ('status', '200')), 2)
+            other.observe('eventhub_db_queries', labels, metrics.DEFAULTS['QUERY_BUCKETS'], 4)
+            with open(os.path.join(directory, 'metrics-1-1.json'), 'w') as fileobj:
+                json.dump(other.snapshot(), fileobj)
+
+            samples = self.scrape()
+            self.assertEqual(samples['eventhub_requests_total{route="event-list",method="GET",status="200"}'], 3)
+            self.assertEqual(samples['eventhub_db_queries_count{route="event-list",method="GET"}'], 2)
+
+            # This process's own file is written at shutdown
+            metrics.shutdown()
+            self.assertEqual(len(os.listdir(directory)), 2)
+
+    def test_token(self):
+        with override_settings(METRICS={'TOKEN': 'secret'}):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            self.assertEqual(self.client.get('/metrics/profile/').status_code, 403)
+            self.scrape(authorization='Bearer secret')
+
+    def test_profile_access(self):
+        profile = '/metrics/profile/'
+        # Not public, and not open to other roles
+        self.assertEqual(self.client.get(profile).status_code, 403)
+        self.client.force_login(self.context['user'])
+        self.assertEqual(self.client.get(profile).status_code, 403)
+        self.client.force_login(self.context['admin'])
+        self.assertEqual(self.client.get(profile).status_code, 200)
+        self.client.logout()
+
+        # The test client connects from 127.0.0.1
+        with override_settings(METRICS={'PROFILE_NETWORKS': ['10.0.0.0/8']}):
+            self.assertEqual(self.client.get(profile).status_code, 403)
+        with override_settings(METRICS={'PROFILE_NETWORKS': ['127.0.0.0/8', '::1/128']}):
+            self.assertEqual(self.client.get(profile).status_code, 200)
+        with override_settings(METRICS={'PROFILE_NETWORKS': ['127.0.0.0/8'], 'TOKEN': 'secret'}):
+            self.assertEqual(self.client.get(profile).status_code, 403)
+            self.assertEqual(self.client.get(profile, headers={'authorization': 'Bearer secret'}).status_code, 200)
+
+
+def take_tokens(path, count):
+    # Runs in a child process of ThrottlingTest
+    store = throttling.SQLiteStore({'PATH': path})
+    return sum(store.take('shared', 100, 100 / 86400)[0] for _ in range(count))
+
+
+class ThrottlingTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create_user(
+            email='creator@example.com', username='creator', password='pass', role=User.Role.EVENT_CREATOR,
+        )
+        cls.users = User.objects.bulk_create(
+            User(email=f'fan{i}@example.com', username=f'fan{i}') for i in range(4)
+        )
+        cls.event = Event.objects.create(
+            name='Ticket drop', description='', capacity=1, location='Arena',
+            date=timezone.now() + timezone.timedelta(days=1), creator=cls.creator,
+        )
+
+    def setUp(self):
+        # Primary keys are reused between tests: no cached join answer or user state may leak
+        caches['default'].clear()
+        user_states.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'throttle.sqlite3')
+
+    def throttles(self, **rates):
+        return override_settings(THROTTLES={'STORE': 'config.throttling.SQLiteStore', 'PATH': self.path,
+                                            'RATES': rates})
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def test_token_buckets_per_user_and_per_event(self):
+        # A request the user's bucket rejects takes no token from the event's
+        with self.throttles(**{'participation-user': '2/min', 'participation-event': '4/min'}):
+            client = self.client_for(self.users[0])
+            self.assertEqual(client.post(f'/api/events/{self.event.pk}/join/').status_code, 201)
+            self.assertEqual(client.post(f'/api/events/{self.event.pk}/leave/').status_code, 204)
+            response = client.post(f'/api/events/{self.event.pk}/join/')
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response['Retry-After'], '30')
+
+            # Other users have their own bucket, but share the event's
+            self.assertEqual(self.client_for(self.users[1]).post(f'/api/events/{self.event.pk}/join/').status_code, 201)
+            self.assertEqual(self.client_for(self.users[2]).post(f'/api/events/{self.event.pk}/join/').status_code, 400)
+            self.assertEqual(self.client_for(self.users[3]).post(f'/api/events/{self.event.pk}/join/').status_code, 429)
+
+        with self.throttles(**{'token-ip': '1/min'}):
+            data = {'email': self.creator.email, 'password': 'pass'}
+            self.assertEqual(self.client.post('/api/users/token/', data).status_code, 200)
+            self.assertEqual(self.client.post('/api/users/token/', data).status_code, 429)
+
+    def test_rejected_requests_leave_the_event_budget_to_others(self):
+        with self.throttles(**{'participation-user': '2/min', 'participation-event': '10/min'}):
+            client = self.client_for(self.users[0])
+            statuses = [client.post(f'/api/events/{self.event.pk}/leave/').status_code for _ in range(20)]
+            self.assertEqual(statuses, [400] * 2 + [429] * 18)
+            self.assertEqual(self.client_for(self.users[1]).post(f'/api/events/{self.event.pk}/join/').status_code, 201)
+
+    def test_sqlite_store_is_exact_across_processes(self):
+        # Four processes take 50 tokens each from one bucket of 100 that barely refills
+        with multiprocessing.get_context('fork').Pool(4) as pool:
+            allowed = pool.starmap(take_tokens, [(self.path, 50)] * 4)
+        self.assertEqual(sum(allowed), 100)
+
+        store = throttling.SQLiteStore({'PATH': self.path})
+        self.assertEqual(store.take('second', 1, 1)[0], True)
+        allowed, wait = store.take('second', 1, 1)
+        self.assertFalse(allowed)
+        self.assertTrue(0 < wait <= 1)
+
+    def test_joins_of_a_full_event_are_rejected_from_the_cache(self):
+        first, second, third, _ = (self.client_for(user) for user in self.users)
+        self.assertEqual(first.post(f'/api/events/{self.event.pk}/join/').status_code, 201)
+        expected = second.post(f'/api/events/{self.event.pk}/join/')
+        self.assertEqual(expected.status_code, 400)
+
+        with self.assertNumQueries(0):
+            response = third.post(f'/api/events/{self.event.pk}/join/')
+        self.assertEqual((response.status_code, response.data), (400, expected.data))
+
+        # A freed seat drops the cached answer
+        with self.captureOnCommitCallbacks(execute=True):
+            first.post(f'/api/events/{self.event.pk}/leave/')
+        self.assertEqual(third.post(f'/api/events/{self.event.pk}/join/').status_code, 201)
+
+    async def test_async_join(self):
+        client = AsyncClient()
+        for user in self.users[:2]:
+            token = CustomTokenObtainPairSerializer.get_token(user).access_token
+            response = await client.post(
+                f'/api/async/events/{self.event.pk}/join/', headers={'Authorization': f'Bearer {token}'},
+            )
+        self.assertEqual(response.status_code, 400)
+
+        token = CustomTokenObtainPairSerializer.get_token(self.users[2]).access_token
+        headers = {'Authorization': f'Bearer {token}'}
+        with self.throttles(**{'participation-user': '1/min'}):
+            response = await client.post(f'/api/async/events/{self.event.pk}/join/', headers=headers)
+            self.assertEqual(response.json(), {'event': ['This event has reached its capacity.']})
+            response = await client.post(f'/api/async/events/{self.event.pk}/join/', headers=headers)
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response['Retry-After'], '60')
+
+
+# On a replica, list validators are withheld right after a write (see ReplicaRoutingTest)
+@override_settings(DATABASE_REPLICAS={'ALIASES': []})
+class ResponseCacheTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create_user(
+            email='creator@example.com', username='creator', password='pass',
+            role=User.Role.EVENT_CREATOR, first_name='Eve', last_name='Creator',
+        )
+        cls.user = User.objects.create_user(email='user@example.com', username='user', password='pass')
+        cls.event = Event.objects.create(
+            name='Workshop', description='', capacity=10,
+            date=timezone.now() + timezone.timedelta(days=1), location='Hall', creator=cls.creator,
+        )
+
+    def setUp(self):
+        caches['default'].clear()
+        self.client = APIClient()
+
+    def get(self, url='/api/events/'):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def assert_refreshed(self, url='/api/events/'):
+        self.assertEqual(self.get(url)['X-Cache'], 'MISS')
+        self.assertEqual(self.get(url)['X-Cache'], 'HIT')
+
+    def test_hits_and_misses(self):
+        stats = get_stats()
+        self.assert_refreshed()
+        self.assert_refreshed(f'/api/events/{self.event.pk}/')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get()['X-Cache'], 'HIT')
+        # Another query string is another entry
+        self.assertEqual(self.get('/api/events/?ordering=name')['X-Cache'], 'MISS')
+        after = get_stats()
+        self.assertEqual(after['hits'] - stats['hits'], 3)
+        self.assertEqual(after['misses'] - stats['misses'], 3)
+
+        # Authenticated callers are never served from the cache
+        self.client.force_authenticate(self.user)
+        self.assertNotIn('X-Cache', self.get())
+
+    def test_writes_invalidate(self):
+        self.assert_refreshed()
+        writes = [
+            lambda: Event.objects.filter(pk=self.event.pk).first().save(),
+            lambda: Participant.objects.reserve(self.event, self.user),
+            lambda: Participant.objects.filter(event=self.event).delete(),
+        ]
+        for write in writes:
+            with self.captureOnCommitCallbacks(execute=True):
+                write()
+            self.assert_refreshed()
+
+    def test_creator_rename_invalidates(self):
+        self.assert_refreshed()
+        # Logins save last_login only, which no payload shows
+        with self.captureOnCommitCallbacks(execute=True):
+            self.creator.last_login = timezone.now()
+            self.creator.save(update_fields=['last_login'])
+        self.assertEqual(self.get()['X-Cache'], 'HIT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.creator.first_name = 'Evelyn'
+            self.creator.save()
+        response = self.get()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['creator_name'], 'Evelyn Creator')
+
+
+class ConditionalGetTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create_user(
+            email='creator@example.com', username='creator', password='pass',
+            role=User.Role.EVENT_CREATOR,
+        )
+        cls.user = User.objects.create_user(email='user@example.com', username='user', password='pass')
+        cls.event = Event.objects.create(
+            name='Workshop', description='', capacity=10,
+            date=timezone.now() + timezone.timedelta(days=1), location='Hall', creator=cls.creator,
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_detail_revalidates_with_one_query(self):
+        url = f'/api/events/{self.event.pk}/'
+        response = self.client.get(url)
+        etag = response['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+        # A join leaves updated_at alone but must still change the tag
+        Participant.objects.reserve(self.event, self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_revalidates_without_queries(self):
+        response = self.client.get('/api/events/')
+        etag = response['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/events/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 0)
+
+        # Other callers and other query strings get other tags
+        self.assertEqual(self.client.get('/api/events/?page=1', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(APIClient().get('/api/events/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.location = 'Hall 2'
+            self.event.save()
+        self.assertEqual(self.client.get('/api/events/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_if_modified_since(self):
+        response = self.client.get('/api/events/')
+        last_modified = response['Last-Modified']
+        self.assertEqual(self.client.get('/api/events/', HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(
+            self.client.get('/api/events/', HTTP_IF_MODIFIED_SINCE='Mon, 01 Jan 2001 00:00:00 GMT').status_code, 200,
+        )
+        # If-None-Match takes precedence over If-Modified-Since
+        response = self.client.get('/api/events/', HTTP_IF_MODIFIED_SINCE=last_modified, HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_time_relative_lists_are_not_validated(self):
+        response = self.client.get('/api/events/?upcoming=true')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertNotIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+
+        # The event passes without any write: revalidation must not answer 304
+        last_modified = self.client.get('/api/events/')['Last-Modified']
+        later = timezone.now() + timezone.timedelta(days=2)
+        with mock.patch('events.filters.timezone.now', return_value=later):
+            response = self.client.get('/api/events/?upcoming=true', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [])
+
+    def test_user_renames_change_the_tags(self):
+        Participant.objects.reserve(self.event, self.user)
+        detail = f'/api/events/{self.event.pk}/'
+        tags = {url: self.client.get(url)['ETag'] for url in ('/api/events/', detail)}
+
+        for user, name in ((self.creator, 'creator_name'), (self.user, 'participants')):
+            with self.subTest(renamed=name), self.captureOnCommitCallbacks(execute=True):
+                user.last_name = 'Renamed'
+                user.save()
+            for url, etag in tags.items():
+                with self.subTest(renamed=name, url=url):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                    self.assertEqual(response.status_code, 200)
+                    tags[url] = response['ETag']
+            self.assertIn('Renamed', json.dumps(self.client.get(detail).data[name]))
+
+
+class EndpointQueryBudgetTest(TestCase):
+    # Every route must stay within its query budget; an N+1 in a serializer
+    # (creator_name, user_name, ...) shows up as a budget overrun.
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.context = benchmarks.seed(users=30, events=30, participants=12, logs=200, spare_events=5)
+
+    def setUp(self):
+        # Primary keys are reused between tests: no cached join answer or user state may leak
+        caches['default'].clear()
+        user_states.clear()
+
+    def test_endpoints_stay_within_query_budget(self):
+        for result in benchmarks.run(self.context, iterations=2):
+            with self.subTest(endpoint=result['name']):
+                self.assertLess(result['status'], 400)
+                self.assertLessEqual(result['queries'], result['budget'])
+
+    def test_every_route_has_a_budget(self):
+        routes = benchmarks.routes()
+        self.assertIn('api/events/stream/', routes)
+        self.assertEqual(routes - benchmarks.budgeted_routes(self.context), set())
+
+    def test_benchmark_command_fails_on_an_overrun(self):
+        over = {'name': 'event-list', 'status': 200, 'queries': 9, 'budget': 3, 'p50_ms': 1.0, 'p99_ms': 2.0}
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.object(benchmarks, 'seed', return_value=self.context), \
+                mock.patch.object(benchmarks, 'run', return_value=[over]):
+            output = os.path.join(directory, 'results.json')
+            with self.assertRaisesMessage(CommandError, '1 endpoint(s) failed or exceeded'):
+                call_command('benchmark_endpoints', iterations=1, output=output, stdout=StringIO())
+            with open(output) as fileobj:
+                self.assertEqual(json.load(fileobj)['endpoints'], [over])
@@ -1,11 +1,15 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from .async_views import event_stream
 from .views import EventViewSet, ParticipantViewSet
 
 router = DefaultRouter()
-router.register(r'', EventViewSet)
+# Register participants first so 'participants/' is not captured as an event pk
 router.register(r'participants', ParticipantViewSet, basename='participant')
+router.register(r'', EventViewSet)
 
 urlpatterns = [
+    # Before the router, which would take 'stream' for an event pk
+    path('stream/', event_stream, name='event-stream'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,30 +1,115 @@
+from functools import partial
+
 from rest_framework import viewsets, status, permissions, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Count, F, Q
-from django.utils import timezone
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import Event, Participant
 from .serializers import (
-    EventSerializer, EventDetailSerializer,
-    ParticipantSerializer, ParticipantCreateSerializer
+    EventSerializer, EventDetailSerializer, ParticipantSerializer, EnrollmentSerializer, CalendarQuerySerializer
 )
 from .permissions import IsEventCreatorOrReadOnly
 from .filters import EventFilter
+from .search import EventSearchFilter
+from .cache import AnonymousResponseCacheMixin, generation_may_be_ahead, get_stats
+from .calendar import calendar_buckets, totals
+from .conditional import ConditionalGetMixin
+from .projections import ProjectedListMixin
+from .exports import ROSTER_CONTENT_TYPES, roster_response
+from .visibility import joined_event_ids, visible_participants
+from . import availability, bulk
+from config.pagination import EventPagination, ParticipantPagination
+from config.sparse import SparseFieldsMixin, project_queryset, requested_fields, trim_serializer
+from config.throttling import EventThrottle, IPThrottle, UserThrottle
 from users.permissions import IsAdminUser, IsEventCreator
 from logs.models import EventLog
+from logs.writer import log_event
+
+
+def unavailable_response(event_id):
+    # The answer a join of an event known to be full or closed would get, from
+    # the cache; None when the join has to run
+    message = availability.unavailable(event_id)
+    if message is None:
+        return None
+    return Response({'event': [message]}, status=status.HTTP_400_BAD_REQUEST)
+
+
+def join_event(event, user):
+    # Shared by EventViewSet.join and the async view in events/async_views.py
+    try:
+        participant = Participant.objects.reserve(event, user)
+    except ValidationError as exc:
+        return Response({'event': exc.messages}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Log the event
+    log_event(
+        event=event,
+        user=user,
+        action=EventLog.Action.JOIN,
+        description=f"User {user.email} joined event {event.name}"
+    )
+
+    return Response(
+        ParticipantSerializer(participant).data,
+        status=status.HTTP_201_CREATED
+    )
+
+
+def leave_event(event, user):
+    try:
+        participant = Participant.objects.get(event=event, user=user)
+    except Participant.DoesNotExist:
+        return Response(
+            {"detail": "You are not a participant of this event."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    participant.delete()
+
+    # Log the event
+    log_event(
+        event=event,
+        user=user,
+        action=EventLog.Action.LEAVE,
+        description=f"User {user.email} left event {event.name}"
+    )
+
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+# Columns read by the ParticipantSerializer fields that are not a column of their own
+PARTICIPANT_COLUMNS = {
+    'user_email': ('user__email',),
+    'user_name': ('user__first_name', 'user__last_name'),
+}
 
 
-class EventViewSet(viewsets.ModelViewSet):
-    queryset = Event.objects.annotate(
-        participant_count=Count('participants')
-    ).select_related('creator')
+class EventViewSet(
+    ConditionalGetMixin, AnonymousResponseCacheMixin, ProjectedListMixin, SparseFieldsMixin, viewsets.ModelViewSet
+):
+    queryset = Event.objects.select_related('creator')
     serializer_class = EventSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    sparse_columns = {
+        'creator_name': ('creator__first_name', 'creator__last_name'),
+        'is_full': ('remaining_capacity',),
+        'can_be_deleted': ('participant_count',),
+        'participants': (),
+    }
+    # The conditional GET validators
+    sparse_keep = ('updated_at', 'participants_version', 'participants_changed_at')
+    # Filtered on the current time: no list validators
+    time_relative_params = ('upcoming',)
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, EventSearchFilter]
     filterset_class = EventFilter
     search_fields = ['name', 'description', 'location']
     ordering_fields = ['date', 'created_at', 'name', 'participant_count']
-    ordering = ['-date']
+    ordering = ['-date', 'id']
+    pagination_class = EventPagination
+    # Join and leave are throttled per user, per client address and per event
+    throttle_scope = 'participation'
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -32,7 +117,7 @@ class EventViewSet(viewsets.ModelViewSet):
         # Filter by user's joined events
         joined = self.request.query_params.get('joined', None)
         if joined and self.request.user.is_authenticated:
-            queryset = queryset.filter(participants__user=self.request.user)
+            queryset = queryset.filter(pk__in=joined_event_ids(self.request.user))
 
         # Filter by user's created events
         created = self.request.query_params.get('created', None)
@@ -46,16 +131,31 @@ class EventViewSet(viewsets.ModelViewSet):
         return queryset
 
     def get_permissions(self):
-        if self.action in ['create']:
+        if self.action in ['create', 'bulk_create']:
             permission_classes = [IsEventCreator]
         elif self.action in ['update', 'partial_update', 'destroy']:
             permission_classes = [IsEventCreatorOrReadOnly]
-        elif self.action in ['participants']:
+        elif self.action in ['participants', 'enroll']:
             permission_classes = [permissions.IsAuthenticated, IsEventCreatorOrReadOnly]
+        elif self.action in ['cache_stats']:
+            permission_classes = [IsAdminUser]
         else:
             permission_classes = [permissions.AllowAny]
         return [permission() for permission in permission_classes]
 
+    def get_throttles(self):
+        if self.action in ['join', 'leave']:
+            # The event's bucket is shared by all clients, so it comes last
+            return [UserThrottle(), IPThrottle(), EventThrottle()]
+        return super().get_throttles()
+
+    def check_throttles(self, request):
+        # DRF asks every throttle, so a request the user or IP bucket rejected would
+        # still take a token from the event's: stop at the first denial instead
+        for throttle in self.get_throttles():
+            if not throttle.allow_request(request, self):
+                self.throttled(request, throttle.wait())
+
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return EventDetailSerializer
@@ -69,90 +169,144 @@ class EventViewSet(viewsets.ModelViewSet):
             )
         instance.delete()
 
-    @action(detail=True, methods=['get'])
-    def participants(self, request, pk=None):
-        event = self.get_object()
+    @action(detail=False, methods=['get'], url_path='cache-stats')
+    def cache_stats(self, request):
+        return Response(get_stats())
 
-        # Only event creator or admin can see participants
-        if not (request.user == event.creator or request.user.is_admin):
+    @action(detail=False, methods=['get'])
+    def calendar(self, request):
+        # Event counts per day or week of a date range, for the events the list
+        # would show with the same filters; cached and revalidated like the list
+        handler = partial(self.cached_response, self.calendar_counts)
+        if generation_may_be_ahead():
+            return handler(request)
+        return self.conditional_response(self.list_validators(request), handler, request)
+
+    def calendar_counts(self, request):
+        query = CalendarQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        buckets = calendar_buckets(
+            self.filter_queryset(self.get_queryset()), params['start'], params['end'], params['bucket'], params['tz'],
+        )
+        return Response({
+            'start': params['start'],
+            'end': params['end'],
+            'bucket': params['bucket'],
+            'tz': str(params['tz']),
+            'totals': totals(buckets),
+            'buckets': buckets,
+        })
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_create(self, request):
+        # Create a list of events in one call; returns one result per item
+        items = request.data
+        max_items = settings.EVENT_MANAGEMENT.get('MAX_BULK_ITEMS', 5000)
+        if not isinstance(items, list) or not items or len(items) > max_items:
             return Response(
-                {"detail": "You do not have permission to view participants."},
-                status=status.HTTP_403_FORBIDDEN
+                {"detail": f"Expected a list of 1 to {max_items} events."},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
-        participants = event.participants.all()
-        serializer = ParticipantSerializer(participants, many=True)
-        return Response(serializer.data)
+        results = [None] * len(items)
+        valid = []
+        for index, item in enumerate(items):
+            serializer = EventSerializer(data=item, context=self.get_serializer_context())
+            if serializer.is_valid():
+                valid.append((index, Event(**serializer.validated_data)))
+            else:
+                results[index] = {'index': index, 'status': bulk.INVALID, 'errors': serializer.errors}
 
-    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
-    def join(self, request, pk=None):
-        event = self.get_object()
+        quota_error = {'status': Event.open_events_quota_error().messages}
+        outcomes = bulk.create_events(request.user, [event for _, event in valid])
+        for (index, _), (outcome, event) in zip(valid, outcomes):
+            if outcome == bulk.CREATED:
+                results[index] = {'index': index, 'status': outcome, 'id': event.pk}
+            else:
+                results[index] = {'index': index, 'status': outcome, 'errors': quota_error}
 
-        # Create serializer with event
-        serializer = ParticipantCreateSerializer(
-            data={'event': event.id},
-            context={'request': request}
+        created = sum(result['status'] == bulk.CREATED for result in results)
+        return Response(
+            {'created': created, 'results': results},
+            status=status.HTTP_201_CREATED if created == len(items) else status.HTTP_207_MULTI_STATUS
         )
 
-        if serializer.is_valid():
-            participant = serializer.save()
-
-            # Log the event
-            EventLog.objects.create(
-                event=event,
-                user=request.user,
-                action='JOIN',
-                description=f"User {request.user.email} joined event {event.name}"
-            )
-
+    @action(detail=True, methods=['post'])
+    def enroll(self, request, pk=None):
+        # Add a list of users to the event in one call; returns one result per user
+        event = self.get_object()
+        if not (request.user == event.creator or request.user.is_admin):
             return Response(
-                ParticipantSerializer(participant).data,
-                status=status.HTTP_201_CREATED
+                {"detail": "You do not have permission to enroll participants."},
+                status=status.HTTP_403_FORBIDDEN
             )
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
-    def leave(self, request, pk=None):
+        serializer = EnrollmentSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        outcomes = bulk.enroll(event, serializer.validated_data['users'], enrolled_by=request.user)
+
+        enrolled = sum(outcome == bulk.ENROLLED for outcome in outcomes.values())
+        return Response({
+            'enrolled': enrolled,
+            'results': [{'user': user_id, 'status': outcome} for user_id, outcome in outcomes.items()],
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'])
+    def participants(self, request, pk=None):
         event = self.get_object()
 
-        try:
-            participant = Participant.objects.get(event=event, user=request.user)
-        except Participant.DoesNotExist:
+        # Only event creator or admin can see participants
+        if not (request.user == event.creator or request.user.is_admin):
             return Response(
-                {"detail": "You are not a participant of this event."},
-                status=status.HTTP_400_BAD_REQUEST
+                {"detail": "You do not have permission to view participants."},
+                status=status.HTTP_403_FORBIDDEN
             )
 
-        participant.delete()
+        # ?export=csv|ndjson streams the whole roster in constant memory
+        export_format = request.query_params.get('export')
+        if export_format is not None:
+            if export_format not in ROSTER_CONTENT_TYPES:
+                return Response(
+                    {"export": [f"Unknown format. Available: {', '.join(ROSTER_CONTENT_TYPES)}."]},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            return roster_response(event, export_format)
 
-        # Log the event
-        EventLog.objects.create(
-            event=event,
-            user=request.user,
-            action='LEAVE',
-            description=f"User {request.user.email} left event {event.name}"
+        fields = requested_fields(request, ParticipantSerializer.Meta.fields)
+        # event_id is read when the related manager attaches the event to each row
+        participants = project_queryset(
+            event.participants.select_related('user'), fields, PARTICIPANT_COLUMNS, keep=('event',),
         )
+        serializer = trim_serializer(ParticipantSerializer(participants, many=True), fields)
+        return Response(serializer.data)
 
-        return Response(status=status.HTTP_204_NO_CONTENT)
+    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def join(self, request, pk=None):
+        response = unavailable_response(pk)
+        if response is None:
+            response = join_event(self.get_object(), request.user)
+        return response
 
+    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def leave(self, request, pk=None):
+        return leave_event(self.get_object(), request.user)
 
-class ParticipantViewSet(viewsets.ReadOnlyModelViewSet):
+
+class ParticipantViewSet(SparseFieldsMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = ParticipantSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ParticipantPagination
+    sparse_columns = PARTICIPANT_COLUMNS
+    sparse_keep = ('joined_at',)  # the cursor position
 
     def get_queryset(self):
-        user = self.request.user
-
-        # Admin can see all participants
-        if user.is_admin:
-            return Participant.objects.all().select_related('user', 'event')
-
-        # Event creators can see participants of their events
-        if user.is_event_creator:
-            return Participant.objects.filter(
-                event__creator=user
-            ).select_related('user', 'event')
+        # Schema generation runs without an authenticated user
+        if getattr(self, 'swagger_fake_view', False):
+            return Participant.objects.none()
 
-        # Regular users can see their own participations
-        return Participant.objects.filter(user=user).select_related('user', 'event')
+        # Admins see every participation, event creators the participants of their
+        # events, and every user their own participations
+        queryset = Participant.objects.select_related('user', 'event')
+        return visible_participants(queryset, self.request.user)
 
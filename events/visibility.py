@@ -0,0 +1,54 @@
+from django.db.models import Q
+
+from .models import Event, Participant
+
+# Visibility rules shared by the event, participant and event log viewsets.
+# Every rule is a semi-join (`IN (SELECT ...)`) probed through an index, so a
+# row matches at most once however many participations back it, and the outer
+# query keeps its own ordering index.
+
+
+def created_event_ids(user):
+    return Event.objects.filter(creator=user).values('pk')
+
+
+def joined_event_ids(user):
+    return Participant.objects.filter(user=user).values('event_id')
+
+
+def event_access(user, field='event'):
+    # Rows whose event the user takes part in or, for event creators, created.
+    # Regular users cannot create events, so they skip that branch entirely.
+    access = Q(**{f'{field}__in': joined_event_ids(user)})
+    if user.is_event_creator:
+        access |= Q(**{f'{field}__in': created_event_ids(user)})
+    return access
+
+
+def participant_access(user):
+    # The user's own participations and, for event creators, everyone taking
+    # part in their events
+    access = Q(user=user)
+    if user.is_event_creator:
+        access |= Q(event__in=created_event_ids(user))
+    return access
+
+
+def visible_logs(queryset, user):
+    if user.is_admin:
+        return queryset
+    return queryset.filter(event_access(user))
+
+
+def visible_participants(queryset, user):
+    if user.is_admin:
+        return queryset
+    return queryset.filter(participant_access(user))
+
+
+def accessible_event_ids(user):
+    # event_access() evaluated to a set, for records that live outside the database
+    event_ids = set(joined_event_ids(user).values_list('event_id', flat=True))
+    if user.is_event_creator:
+        event_ids.update(created_event_ids(user).values_list('pk', flat=True))
+    return event_ids
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import EventLog
+from .models import EventLog, EventLogSegment
 
 
 @admin.register(EventLog)
@@ -9,6 +9,9 @@ class EventLogAdmin(admin.ModelAdmin):
     search_fields = ('event__name', 'user__email', 'description')
     readonly_fields = ('event', 'user', 'action', 'description', 'metadata', 'timestamp')
     date_hierarchy = 'timestamp'
+    # Skip the unfiltered COUNT(*) next to every filtered count; older logs are
+    # archived to segment files (see EventLogSegmentAdmin)
+    show_full_result_count = False
 
     fieldsets = (
         (None, {
@@ -33,3 +36,21 @@ class EventLogAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('user', 'event')
 
+
+
+@admin.register(EventLogSegment)
+class EventLogSegmentAdmin(admin.ModelAdmin):
+    list_display = ('path', 'start', 'end', 'rows', 'size', 'created_at')
+    readonly_fields = ('path', 'start', 'end', 'first_id', 'last_id', 'rows', 'size', 'created_at')
+    date_hierarchy = 'start'
+
+    def has_add_permission(self, request):
+        # Segments are only written by the archive_event_logs command
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        # Deleting the row would orphan its file
+        return False
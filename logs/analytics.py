@@ -0,0 +1,188 @@
+"""
+Join/leave analytics rollups.
+
+``EventActivity`` and ``CreatorActivity`` hold join and leave counts per minute,
+hour and day bucket. ``record_activity()`` folds JOIN and LEAVE logs into them
+with one upsert statement per table. ``logs.writer`` calls it in the same
+transaction that writes the logs, so the rollups never disagree with the log.
+``rebuild()`` recomputes everything from the EventLog table and the archive
+segments (see logs/archive.py).
+
+Reads touch one row per non-empty bucket, plus one aggregate that anchors the
+participant curve to the event's current ``participant_count``.
+"""
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db import connections, router, transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_datetime
+
+from events.models import Event
+from .archive import read_segment
+from .models import CreatorActivity, EventActivity, EventLog, EventLogSegment, Granularity
+
+ACTIONS = {EventLog.Action.JOIN: 0, EventLog.Action.LEAVE: 1}
+
+STEPS = {
+    Granularity.MINUTE: timedelta(minutes=1),
+    Granularity.HOUR: timedelta(hours=1),
+    Granularity.DAY: timedelta(days=1),
+}
+
+
+def truncate(timestamp, granularity):
+    timestamp = timestamp.astimezone(dt_timezone.utc).replace(second=0, microsecond=0)
+    if granularity in (Granularity.HOUR, Granularity.DAY):
+        timestamp = timestamp.replace(minute=0)
+    if granularity == Granularity.DAY:
+        timestamp = timestamp.replace(hour=0)
+    return timestamp
+
+
+def bucket_counts(entries):
+    # entries: (event_id, creator_id, action, timestamp); returns the per-event
+    # and per-creator [joins, leaves] counters keyed by (id, granularity, bucket)
+    events = defaultdict(lambda: [0, 0])
+    creators = defaultdict(lambda: [0, 0])
+    for event_id, creator_id, action, timestamp in entries:
+        if action not in ACTIONS or event_id is None:
+            continue
+        for granularity in STEPS:
+            bucket = truncate(timestamp, granularity)
+            events[event_id, granularity, bucket][ACTIONS[action]] += 1
+            if creator_id is not None:
+                creators[creator_id, granularity, bucket][ACTIONS[action]] += 1
+    return events, creators
+
+
+def upsert(model, key, counts, chunk_size=1000):
+    # Add the counters to existing buckets, creating missing ones
+    alias = router.db_for_write(model)
+    connection = connections[alias]
+    items = list(counts.items())
+
+    if not connection.features.supports_update_conflicts_with_target:
+        for (key_id, granularity, bucket), (joins, leaves) in items:
+            lookup = {f'{key}_id': key_id, 'granularity': granularity, 'bucket': bucket}
+            updated = model.objects.using(alias).filter(**lookup).update(
+                joins=F('joins') + joins, leaves=F('leaves') + leaves,
+            )
+            if not updated:
+                model.objects.using(alias).create(**lookup, joins=joins, leaves=leaves)
+        return
+
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    column = qn(model._meta.get_field(key).column)
+    for start in range(0, len(items), chunk_size):
+        chunk = items[start:start + chunk_size]
+        params = []
+        for (key_id, granularity, bucket), (joins, leaves) in chunk:
+            params += [key_id, granularity, connection.ops.adapt_datetimefield_value(bucket), joins, leaves]
+        values = ', '.join(['(%s, %s, %s, %s, %s)'] * len(chunk))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({column}, granularity, bucket, joins, leaves) VALUES {values} '
+                f'ON CONFLICT ({column}, granularity, bucket) DO UPDATE SET '
+                f'joins = {table}.joins + EXCLUDED.joins, leaves = {table}.leaves + EXCLUDED.leaves',
+                params,
+            )
+
+
+def apply_counts(entries):
+    events, creators = bucket_counts(entries)
+    upsert(EventActivity, 'event', events)
+    upsert(CreatorActivity, 'creator', creators)
+
+
+def record_activity(logs, creators=None):
+    # creators maps event id to creator id; looked up when not given
+    logs = [log for log in logs if log.action in ACTIONS and log.event_id is not None]
+    if not logs:
+        return
+    if creators is None:
+        creators = dict(
+            Event.objects.filter(pk__in={log.event_id for log in logs}).values_list('pk', 'creator_id')
+        )
+    apply_counts((log.event_id, creators.get(log.event_id), log.action, log.timestamp) for log in logs)
+
+
+def rebuild(batch_size=5000):
+    # Returns the number of JOIN/LEAVE logs folded into the new rollups
+    folded = 0
+    with transaction.atomic():
+        EventActivity.objects.all().delete()
+        CreatorActivity.objects.all().delete()
+
+        rows = EventLog.objects.filter(action__in=ACTIONS, event__isnull=False).values_list(
+            'event_id', 'event__creator_id', 'action', 'timestamp',
+        )
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                apply_counts(batch)
+                folded += len(batch)
+                batch = []
+        apply_counts(batch)
+        folded += len(batch)
+
+        # Archived logs of events that still exist
+        for segment in EventLogSegment.objects.all():
+            records = [record for record in read_segment(segment) if record['action'] in ACTIONS]
+            creators = dict(
+                Event.objects.filter(pk__in={record['event'] for record in records}).values_list('pk', 'creator_id')
+            )
+            entries = [
+                (record['event'], creators[record['event']], record['action'], parse_datetime(record['timestamp']))
+                for record in records if record['event'] in creators
+            ]
+            apply_counts(entries)
+            folded += len(entries)
+    return folded
+
+
+def series(model, lookup, granularity, since, until):
+    return list(
+        model.objects.filter(**lookup, granularity=granularity, bucket__gte=since, bucket__lt=until)
+        .order_by('bucket')
+        .values('bucket', 'joins', 'leaves')
+    )
+
+
+def event_series(event, granularity, since, until):
+    buckets = series(EventActivity, {'event': event}, granularity, since, until)
+
+    # Walk back from the current count: participants at the end of a bucket are the
+    # current count minus everything that happened afterwards. Whole days after
+    # `until` come from the day rollup, the rest of until's day from `granularity`.
+    next_day = truncate(until, Granularity.DAY) + STEPS[Granularity.DAY]
+    later = EventActivity.objects.filter(event=event).aggregate(
+        net=Coalesce(Sum(
+            F('joins') - F('leaves'),
+            filter=(
+                Q(granularity=granularity, bucket__gte=until, bucket__lt=next_day)
+                | Q(granularity=Granularity.DAY, bucket__gte=next_day)
+            ),
+        ), 0)
+    )['net']
+
+    participants = event.participant_count - later
+    for bucket in reversed(buckets):
+        bucket['participants'] = participants
+        bucket['fill_rate'] = round(participants / event.capacity, 4) if event.capacity else None
+        participants -= bucket['joins'] - bucket['leaves']
+    return buckets
+
+
+def creator_series(creator_id, granularity, since, until):
+    return series(CreatorActivity, {'creator_id': creator_id}, granularity, since, until)
+
+
+def totals(buckets):
+    return {
+        'joins': sum(bucket['joins'] for bucket in buckets),
+        'leaves': sum(bucket['leaves'] for bucket in buckets),
+    }
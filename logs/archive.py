@@ -0,0 +1,130 @@
+"""
+EventLog archive.
+
+The EventLog table only holds recent ("hot") records. ``archive_logs()`` moves
+records older than a cutoff into gzip-compressed JSON-lines segment files under
+``EVENT_LOG_ARCHIVE['DIR']``, one file per calendar month per batch, and deletes
+them from the table in the same batch. Each file is written and renamed into
+place before its ``EventLogSegment`` row is created and the records deleted in
+one transaction, so a crash leaves the records in the table and at worst an
+orphaned file that the next run overwrites.
+
+Archived records keep the API representation of ``EventLogSerializer`` and are
+read back by time range, in archive order, with ``archived_logs()``.
+"""
+import gzip
+import json
+import os
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers
+
+from .models import EventLog, EventLogSegment
+
+DEFAULTS = {
+    'DIR': 'log-archive',
+    'RETENTION_DAYS': 90,
+    'BATCH_SIZE': 5000,
+    'MAX_RANGE_DAYS': 31,
+}
+
+# Same keys as EventLogSerializer
+ARCHIVE_FIELDS = {
+    'id': 'id',
+    'event': 'event_id',
+    'event_name': 'event__name',
+    'user': 'user_id',
+    'user_email': 'user__email',
+    'action': 'action',
+    'description': 'description',
+    'metadata': 'metadata',
+    'timestamp': 'timestamp',
+}
+
+
+def archive_settings():
+    return {**DEFAULTS, **getattr(settings, 'EVENT_LOG_ARCHIVE', {})}
+
+
+def segment_path(relative_path):
+    return os.path.join(archive_settings()['DIR'], relative_path)
+
+
+def write_segment(month, rows):
+    timestamp = serializers.DateTimeField()
+    relative_path = f"{month}/eventlog-{rows[0]['id']}-{rows[-1]['id']}.jsonl.gz"
+    path = segment_path(relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    partial = path + '.partial'
+    with gzip.open(partial, 'wt', encoding='utf-8') as segment:
+        for row in rows:
+            record = {key: row[column] for key, column in ARCHIVE_FIELDS.items()}
+            record['timestamp'] = timestamp.to_representation(row['timestamp'])
+            segment.write(json.dumps(record) + '\n')
+    with open(partial, 'rb') as segment:
+        os.fsync(segment.fileno())
+    os.replace(partial, path)
+
+    return EventLogSegment(
+        path=relative_path,
+        start=min(row['timestamp'] for row in rows),
+        end=max(row['timestamp'] for row in rows),
+        first_id=rows[0]['id'],
+        last_id=rows[-1]['id'],
+        rows=len(rows),
+        size=os.path.getsize(path),
+    )
+
+
+def archive_logs(before, batch_size=None):
+    # Returns (records archived, segments written)
+    batch_size = batch_size or archive_settings()['BATCH_SIZE']
+    archived = written = 0
+    last_id = 0
+
+    while True:
+        rows = list(
+            EventLog.objects.filter(timestamp__lt=before, pk__gt=last_id)
+            .order_by('id')
+            .values(*ARCHIVE_FIELDS.values())[:batch_size]
+        )
+        if not rows:
+            return archived, written
+
+        months = defaultdict(list)
+        for row in rows:
+            months[row['timestamp'].strftime('%Y/%m')].append(row)
+        segments = [write_segment(month, month_rows) for month, month_rows in months.items()]
+
+        with transaction.atomic():
+            EventLogSegment.objects.bulk_create(segments)
+            EventLog.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+
+        archived += len(rows)
+        written += len(segments)
+        last_id = rows[-1]['id']
+
+
+def read_segment(segment):
+    with gzip.open(segment_path(segment.path), 'rt', encoding='utf-8') as lines:
+        for line in lines:
+            yield json.loads(line)
+
+
+def archived_logs(since, until, after=None):
+    # (segment id, record) pairs with since <= timestamp < until, in archive
+    # order: by segment, then by id within it. Reading resumes behind `after`,
+    # such a pair of ids, and a segment is only opened once the caller gets to it.
+    segments = EventLogSegment.objects.filter(start__lt=until, end__gte=since).order_by('id')
+    if after is not None:
+        segments = segments.filter(pk__gte=after[0])
+    for segment in segments.iterator():
+        for record in read_segment(segment):
+            if after is not None and (segment.pk, record['id']) <= after:
+                continue
+            if since <= parse_datetime(record['timestamp']) < until:
+                yield segment.pk, record
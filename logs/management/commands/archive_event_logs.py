@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from logs.archive import archive_logs, archive_settings
+from logs.models import EventLog
+
+
+class Command(BaseCommand):
+    help = (
+        'Move event logs older than the retention period into compressed JSON-lines '
+        'segment files and delete them from the EventLog table in batches.'
+    )
+
+    def add_arguments(self, parser):
+        options = archive_settings()
+        parser.add_argument('--older-than-days', type=int, default=options['RETENTION_DAYS'])
+        parser.add_argument('--batch-size', type=int, default=options['BATCH_SIZE'])
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many logs would be archived.')
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['older_than_days'])
+
+        if options['dry_run']:
+            count = EventLog.objects.filter(timestamp__lt=before).count()
+            self.stdout.write(f"{count} log(s) older than {before:%Y-%m-%d %H:%M} would be archived.")
+            return
+
+        archived, segments = archive_logs(before, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {archived} log(s) into {segments} segment(s) under {archive_settings()['DIR']}."
+        ))
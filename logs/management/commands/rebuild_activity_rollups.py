@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from logs.analytics import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the minute/hour/day join and leave rollups from the event log '
+        'and its archive segments.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        folded = rebuild(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt activity rollups from {folded} join/leave log(s)."))
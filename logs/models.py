@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 
@@ -18,12 +19,14 @@ class EventLog(models.Model):
         on_delete=models.CASCADE,
         related_name='logs',
         null=True,
-        blank=True
+        blank=True,
+        db_index=False,  # covered by the (event, timestamp) index
     )
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
-        related_name='event_logs'
+        related_name='event_logs',
+        db_index=False,  # covered by the (user, timestamp) index
     )
     action = models.CharField(
         max_length=20,
@@ -31,13 +34,100 @@ class EventLog(models.Model):
     )
     description = models.TextField()
     metadata = models.JSONField(default=dict, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the action happens, not when a buffered record is flushed
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # Admin listing and the admin changelist, newest first
+            models.Index(fields=['-timestamp', 'id'], name='eventlog_timestamp_idx'),
+            # Logs of an event (creators, participants, ?event= filter)
+            models.Index(fields=['event', 'timestamp'], name='eventlog_event_ts_idx'),
+            # Logs of a user (?user= filter)
+            models.Index(fields=['user', 'timestamp'], name='eventlog_user_ts_idx'),
+        ]
         verbose_name = _('event log')
         verbose_name_plural = _('event logs')
 
     def __str__(self):
         return f"{self.action} by {self.user.email} at {self.timestamp}"
 
+
+
+class EventLogSegment(models.Model):
+    # A gzip-compressed JSON-lines file of logs moved out of the EventLog table
+    # by the archive_event_logs command (see logs/archive.py)
+    path = models.CharField(max_length=255, unique=True)  # relative to EVENT_LOG_ARCHIVE['DIR']
+    start = models.DateTimeField()  # oldest record
+    end = models.DateTimeField()  # newest record
+    first_id = models.BigIntegerField()
+    last_id = models.BigIntegerField()
+    rows = models.PositiveIntegerField()
+    size = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['start', 'id']
+        indexes = [
+            # Segments overlapping a requested time range
+            models.Index(fields=['start', 'end'], name='eventlogsegment_range_idx'),
+        ]
+        verbose_name = _('event log segment')
+        verbose_name_plural = _('event log segments')
+
+    def __str__(self):
+        return self.path
+
+
+class Granularity(models.TextChoices):
+    MINUTE = 'minute', _('Minute')
+    HOUR = 'hour', _('Hour')
+    DAY = 'day', _('Day')
+
+
+# Join/leave counters per time bucket, kept up to date as JOIN and LEAVE logs are
+# written (see logs/analytics.py) and rebuilt by the rebuild_activity_rollups command
+class EventActivity(models.Model):
+    event = models.ForeignKey(
+        'events.Event',
+        on_delete=models.CASCADE,
+        related_name='activity',
+        db_index=False,  # covered by the unique (event, granularity, bucket) index
+    )
+    granularity = models.CharField(max_length=10, choices=Granularity.choices)
+    bucket = models.DateTimeField()  # start of the minute, hour or day (UTC)
+    joins = models.PositiveIntegerField(default=0)
+    leaves = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['event', 'granularity', 'bucket']
+        unique_together = ['event', 'granularity', 'bucket']
+        verbose_name = _('event activity')
+        verbose_name_plural = _('event activity')
+
+    def __str__(self):
+        return f"{self.event_id} {self.granularity} {self.bucket}: +{self.joins} -{self.leaves}"
+
+
+class CreatorActivity(models.Model):
+    # The same counters summed over all events of a creator
+    creator = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='event_activity',
+        db_index=False,  # covered by the unique (creator, granularity, bucket) index
+    )
+    granularity = models.CharField(max_length=10, choices=Granularity.choices)
+    bucket = models.DateTimeField()
+    joins = models.PositiveIntegerField(default=0)
+    leaves = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['creator', 'granularity', 'bucket']
+        unique_together = ['creator', 'granularity', 'bucket']
+        verbose_name = _('creator activity')
+        verbose_name_plural = _('creator activity')
+
+    def __str__(self):
+        return f"{self.creator_id} {self.granularity} {self.bucket}: +{self.joins} -{self.leaves}"
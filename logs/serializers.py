@@ -1,5 +1,10 @@
+from datetime import timedelta
+
 from rest_framework import serializers
-from .models import EventLog
+from django.utils import timezone
+from .analytics import STEPS
+from .archive import archive_settings
+from .models import EventLog, Granularity
 
 
 class EventLogSerializer(serializers.ModelSerializer):
@@ -14,3 +19,43 @@ class EventLogSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ('id', 'timestamp')
 
+
+
+class ArchiveQuerySerializer(serializers.Serializer):
+    # Query parameters of /api/logs/archive/
+    since = serializers.DateTimeField()
+    until = serializers.DateTimeField()
+    event = serializers.IntegerField(required=False)
+    user = serializers.IntegerField(required=False)
+    action = serializers.ChoiceField(choices=EventLog.Action.choices, required=False)
+
+    def validate(self, attrs):
+        max_days = archive_settings()['MAX_RANGE_DAYS']
+        if attrs['until'] <= attrs['since']:
+            raise serializers.ValidationError({"until": "Must be later than since."})
+        if attrs['until'] - attrs['since'] > timedelta(days=max_days):
+            raise serializers.ValidationError({"until": f"The range cannot exceed {max_days} days."})
+        return attrs
+
+
+class ActivityQuerySerializer(serializers.Serializer):
+    # Query parameters of /api/logs/analytics/...; `since` defaults to a day of
+    # minutes, a week of hours or 90 days before `until` (default: now)
+    DEFAULT_BUCKETS = {Granularity.MINUTE: 24 * 60, Granularity.HOUR: 7 * 24, Granularity.DAY: 90}
+    MAX_BUCKETS = 1500
+
+    granularity = serializers.ChoiceField(choices=Granularity.choices, default=Granularity.HOUR)
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        step = STEPS[attrs['granularity']]
+        attrs.setdefault('until', timezone.now())
+        attrs.setdefault('since', attrs['until'] - step * self.DEFAULT_BUCKETS[attrs['granularity']])
+        if attrs['until'] <= attrs['since']:
+            raise serializers.ValidationError({"until": "Must be later than since."})
+        if (attrs['until'] - attrs['since']) / step > self.MAX_BUCKETS:
+            raise serializers.ValidationError(
+                {"since": f"The range cannot span more than {self.MAX_BUCKETS} buckets; use a coarser granularity."}
+            )
+        return attrs
@@ -1,3 +1,315 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from config.pagination import SegmentCursorPagination
+from events.models import Event, Participant
+from users.models import User
+from . import archive
+from .models import CreatorActivity, EventActivity, EventLog, EventLogSegment, Granularity
+from .writer import EventLogBuffer, get_buffer
+
+
+class EventLogBufferTest(TransactionTestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='creator@example.com', username='creator', password='pass',
+            role=User.Role.EVENT_CREATOR,
+        )
+        self.spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.spool_dir)
+
+    def enqueue(self, buffer, count):
+        for i in range(count):
+            buffer.enqueue(None, self.user.pk, EventLog.Action.CREATE, f'record {i}')
+
+    def test_flush_writes_pending_records_in_batches(self):
+        buffer = EventLogBuffer(batch_size=1000, flush_interval=60, spool_dir=self.spool_dir)
+        self.enqueue(buffer, 25)
+        self.assertEqual(EventLog.objects.count(), 0)
+
+        self.assertEqual(buffer.flush(), 25)
+        self.assertEqual(EventLog.objects.count(), 25)
+        buffer.close()
+        self.assertEqual(os.listdir(self.spool_dir), [])
+
+    def test_full_buffer_writes_through(self):
+        buffer = EventLogBuffer(batch_size=1000, flush_interval=60, max_pending=5, enqueue_timeout=0)
+        self.enqueue(buffer, 8)
+        self.assertEqual(EventLog.objects.count(), 3)
+        buffer.close()
+        self.assertEqual(EventLog.objects.count(), 8)
+
+    def test_spool_of_dead_process_is_replayed(self):
+        buffer = EventLogBuffer(batch_size=1000, flush_interval=60, spool_dir=self.spool_dir)
+        self.enqueue(buffer, 10)
+        # A spool left by a crashed process holds the same records but no lock
+        shutil.copy(buffer._spool_path, os.path.join(self.spool_dir, 'eventlog-0.jsonl'))
+        buffer.close()
+
+        self.assertEqual(EventLogBuffer.recover(self.spool_dir), 10)
+        self.assertEqual(EventLog.objects.count(), 20)
+
+
+class EventLogArchiveTest(TestCase):
+
+    def setUp(self):
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir)
+        archive_settings = override_settings(EVENT_LOG_ARCHIVE={'DIR': self.archive_dir, 'BATCH_SIZE': 7})
+        archive_settings.enable()
+        self.addCleanup(archive_settings.disable)
+
+        self.admin = User.objects.create_user(
+            email='admin@example.com', username='admin', password='pass', role=User.Role.ADMIN,
+        )
+        self.user = User.objects.create_user(email='user@example.com', username='user', password='pass')
+        date = timezone.now() + timezone.timedelta(days=1)
+        self.joined, self.other = Event.objects.bulk_create(
+            Event(name=name, description='', capacity=10, remaining_capacity=10, date=date,
+                  location='Hall', creator=self.admin)
+            for name in ('Joined', 'Other')
+        )
+        Participant.objects.create(event=self.joined, user=self.user)
+
+        # 20 logs a day apart, starting 99.5 days ago, alternating between the events
+        self.now = timezone.now()
+        EventLog.objects.bulk_create(
+            EventLog(
+                event=self.joined if i % 2 else self.other, user=self.admin, action=EventLog.Action.UPDATE,
+                description=f'log {i}', timestamp=self.now - timezone.timedelta(days=100 - i, hours=-12),
+            )
+            for i in range(20)
+        )
+
+    def archive(self, client, since_days, until_days):
+        since = (self.now - timezone.timedelta(days=since_days)).isoformat()
+        until = (self.now - timezone.timedelta(days=until_days)).isoformat()
+        return client.get('/api/logs/archive/', {'since': since, 'until': until})
+
+    def test_archive_moves_aged_logs_to_segments(self):
+        call_command('archive_event_logs', older_than_days=85, stdout=io.StringIO())
+
+        # Logs from 99.5..85.5 days ago are archived, the 5 newer ones stay in the table
+        self.assertEqual(EventLog.objects.count(), 5)
+        self.assertEqual(sum(EventLogSegment.objects.values_list('rows', flat=True)), 15)
+        self.assertGreaterEqual(EventLogSegment.objects.count(), 3)  # 3 batches of at most 7
+        for segment in EventLogSegment.objects.all():
+            self.assertTrue(os.path.exists(os.path.join(self.archive_dir, segment.path)))
+
+        # Nothing is left to archive on a second run
+        call_command('archive_event_logs', older_than_days=85, stdout=io.StringIO())
+        self.assertEqual(sum(EventLogSegment.objects.values_list('rows', flat=True)), 15)
+
+    def test_archived_logs_are_queryable_by_time_range(self):
+        call_command('archive_event_logs', older_than_days=85, stdout=io.StringIO())
+        client = APIClient()
+
+        client.force_authenticate(self.admin)
+        response = self.archive(client, since_days=100, until_days=90)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.data['next'])
+        descriptions = [record['description'] for record in response.data['results']]
+        self.assertEqual(descriptions, [f'log {i}' for i in range(10)])
+        self.assertEqual(response.data['results'][1]['event_name'], 'Joined')
+        self.assertEqual(response.data['results'][1]['user_email'], 'admin@example.com')
+
+        # Regular users only see archived logs of events they joined
+        client.force_authenticate(self.user)
+        response = self.archive(client, since_days=100, until_days=90)
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual({record['event'] for record in response.data['results']}, {self.joined.pk})
+
+        self.assertEqual(self.archive(client, since_days=100, until_days=30).status_code, 400)
+
+    def test_archive_pages_read_only_the_segments_they_span(self):
+        call_command('archive_event_logs', older_than_days=85, stdout=io.StringIO())
+        client = APIClient()
+        client.force_authenticate(self.admin)
+
+        opened = []
+        read_segment = archive.read_segment
+
+        def tracking_read_segment(segment):
+            opened.append(segment.pk)
+            return read_segment(segment)
+
+        pages = []
+        with mock.patch.object(SegmentCursorPagination, 'page_size', 4), \
+                mock.patch.object(archive, 'read_segment', tracking_read_segment):
+            response = self.archive(client, since_days=100, until_days=80)
+            while True:
+                self.assertEqual(response.status_code, 200)
+                self.assertIsNone(response.data['previous'])
+                # Batches of 7 records: a page of 4 spans at most two segments
+                self.assertLessEqual(len(opened), 2)
+                pages.append([record['description'] for record in response.data['results']])
+                if response.data['next'] is None:
+                    break
+                opened.clear()
+                response = client.get(response.data['next'])
+        self.assertEqual([len(page) for page in pages], [4, 4, 4, 3])
+        self.assertEqual(sum(pages, []), [f'log {i}' for i in range(15)])
+
+        response = client.get('/api/logs/archive/', {
+            'since': (self.now - timezone.timedelta(days=100)).isoformat(),
+            'until': (self.now - timezone.timedelta(days=80)).isoformat(),
+            'cursor': 'bogus',
+        })
+        self.assertEqual(response.status_code, 404)
+
+    def test_sparse_fields(self):
+        call_command('archive_event_logs', older_than_days=85, stdout=io.StringIO())
+        client = APIClient()
+        client.force_authenticate(self.admin)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/logs/', {'fields': 'id,action,user_email'})
+        self.assertEqual(list(response.data['results'][0]), ['id', 'user_email', 'action'])
+        sql = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertNotIn('description', sql)
+        self.assertNotIn('events_event', sql)
+
+        since = (self.now - timezone.timedelta(days=100)).isoformat()
+        until = (self.now - timezone.timedelta(days=90)).isoformat()
+        response = client.get('/api/logs/archive/', {'since': since, 'until': until, 'omit': 'description,metadata'})
+        self.assertEqual(
+            list(response.data['results'][0]), ['id', 'event', 'event_name', 'user', 'user_email', 'action', 'timestamp'],
+        )
+
+
+class ActivityRollupTest(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()  # cached join answers of earlier tests
+        self.creator = User.objects.create_user(
+            email='creator@example.com', username='creator', password='pass',
+            role=User.Role.EVENT_CREATOR,
+        )
+        self.event = Event.objects.create(
+            name='Conference', description='', capacity=4,
+            date=timezone.now() + timezone.timedelta(days=1), location='Hall', creator=self.creator,
+        )
+        self.users = User.objects.bulk_create(
+            User(email=f'user{i}@example.com', username=f'user{i}') for i in range(3)
+        )
+        self.client = APIClient()
+
+    def rollups(self):
+        return {
+            'event': sorted(EventActivity.objects.values_list('granularity', 'bucket', 'joins', 'leaves')),
+            'creator': sorted(CreatorActivity.objects.values_list('granularity', 'bucket', 'joins', 'leaves')),
+        }
+
+    def join_and_leave(self):
+        for user in self.users:
+            self.client.force_authenticate(user)
+            self.assertEqual(self.client.post(f'/api/events/{self.event.pk}/join/').status_code, 201)
+        self.assertEqual(self.client.post(f'/api/events/{self.event.pk}/leave/').status_code, 204)
+
+    def test_rollups_follow_join_and_leave_logs(self):
+        self.join_and_leave()
+
+        day = EventActivity.objects.get(event=self.event, granularity=Granularity.DAY)
+        self.assertEqual((day.joins, day.leaves), (3, 1))
+        minutes = EventActivity.objects.filter(granularity=Granularity.MINUTE)
+        self.assertEqual(sum(minutes.values_list('joins', flat=True)), 3)
+        self.assertEqual(self.rollups()['event'], self.rollups()['creator'])
+
+        # A rebuild from the log reproduces the incrementally maintained rows
+        incremental = self.rollups()
+        call_command('rebuild_activity_rollups', stdout=io.StringIO())
+        self.assertEqual(self.rollups(), incremental)
+
+    def test_buffered_logs_update_rollups_on_flush(self):
+        with override_settings(EVENT_LOG_BUFFER={'ENABLED': True, 'FLUSH_INTERVAL': 60}):
+            self.join_and_leave()
+            self.assertFalse(EventActivity.objects.exists())
+            get_buffer().flush()
+        day = EventActivity.objects.get(event=self.event, granularity=Granularity.DAY)
+        self.assertEqual((day.joins, day.leaves), (3, 1))
+
+    def test_analytics_endpoints(self):
+        self.join_and_leave()
+
+        self.client.force_authenticate(self.creator)
+        with self.assertNumQueries(3):  # the event, its buckets and the later activity
+            response = self.client.get(f'/api/logs/analytics/events/{self.event.pk}/', {'granularity': 'day'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['totals'], {'joins': 3, 'leaves': 1})
+        [bucket] = response.data['buckets']
+        self.assertEqual(bucket['participants'], 2)
+        self.assertEqual(bucket['fill_rate'], 0.5)
+
+        response = self.client.get(f'/api/logs/analytics/creators/{self.creator.pk}/')
+        self.assertEqual(response.data['totals'], {'joins': 3, 'leaves': 1})
+
+        # Only the creator and admins see an event's analytics
+        self.client.force_authenticate(self.users[0])
+        self.assertEqual(self.client.get(f'/api/logs/analytics/events/{self.event.pk}/').status_code, 403)
+        self.assertEqual(self.client.get(f'/api/logs/analytics/creators/{self.creator.pk}/').status_code, 403)
+        too_many_buckets = {'granularity': 'minute', 'since': '2000-01-01T00:00:00Z'}
+        response = self.client.get(f'/api/logs/analytics/creators/{self.users[0].pk}/', too_many_buckets)
+        self.assertEqual(response.status_code, 400)
+
+
+# Every join comes from the test client's address, which the throttles would cut off
+@override_settings(THROTTLES={'ENABLED': False})
+class JoinLatencyTest(TransactionTestCase):
+    joins = 200
+
+    def setUp(self):
+        caches['default'].clear()  # cached join answers of earlier tests
+        creator = User.objects.create_user(
+            email='creator@example.com', username='creator', password='pass',
+            role=User.Role.EVENT_CREATOR,
+        )
+        self.event = Event.objects.create(
+            name='Conference', description='', capacity=self.joins * 2,
+            date=timezone.now() + timezone.timedelta(days=1), location='Hall', creator=creator,
+        )
+        User.objects.bulk_create(
+            User(email=f'user{i}@example.com', username=f'user{i}') for i in range(self.joins * 2)
+        )
+        self.users = list(User.objects.filter(role=User.Role.REGULAR_USER))
+
+    def measure(self, users):
+        client = APIClient()
+        timings = []
+        for user in users:
+            client.force_authenticate(user)
+            started = time.perf_counter()
+            response = client.post(f'/api/events/{self.event.pk}/join/')
+            timings.append(time.perf_counter() - started)
+            self.assertEqual(response.status_code, 201)
+        timings.sort()
+        return statistics.median(timings) * 1000, timings[int(len(timings) * 0.99)] * 1000
+
+    def test_join_latency_with_and_without_buffer(self):
+        with override_settings(EVENT_LOG_BUFFER={'ENABLED': False}):
+            sync_p50, sync_p99 = self.measure(self.users[:self.joins])
+
+        with override_settings(EVENT_LOG_BUFFER={'ENABLED': True, 'FLUSH_INTERVAL': 60, 'BATCH_SIZE': 10000}):
+            buffered_p50, buffered_p99 = self.measure(self.users[self.joins:])
+            get_buffer().flush()
+
+        self.assertEqual(EventLog.objects.filter(action=EventLog.Action.JOIN).count(), self.joins * 2)
+        sys.stderr.write(
+            f"\njoin latency over {self.joins} requests: "
+            f"sync p50={sync_p50:.2f}ms p99={sync_p99:.2f}ms, "
+            f"buffered p50={buffered_p50:.2f}ms p99={buffered_p99:.2f}ms\n"
+        )
@@ -1,10 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import EventLogViewSet
+from .views import EventLogViewSet, EventActivityView, CreatorActivityView
 
 router = DefaultRouter()
 router.register(r'', EventLogViewSet, basename='eventlog')
 
 urlpatterns = [
+    path('analytics/events/<int:pk>/', EventActivityView.as_view(), name='event-activity'),
+    path('analytics/creators/<int:pk>/', CreatorActivityView.as_view(), name='creator-activity'),
     path('', include(router.urls)),
 ]
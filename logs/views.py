@@ -1,16 +1,29 @@
 from rest_framework import viewsets, permissions, filters
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import EventLog
-from .serializers import EventLogSerializer
+from .analytics import creator_series, event_series, totals
+from .archive import archived_logs
+from .serializers import EventLogSerializer, ArchiveQuerySerializer, ActivityQuerySerializer
 from users.permissions import IsAdminUser
+from config.pagination import EventLogPagination, SegmentCursorPagination
+from config.sparse import SparseFieldsMixin, requested_fields
+from events.models import Event
+from events.visibility import visible_logs, accessible_event_ids
 
 
-class EventLogViewSet(viewsets.ReadOnlyModelViewSet):
+class EventLogViewSet(SparseFieldsMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = EventLogSerializer
+    sparse_columns = {'event_name': ('event__name',), 'user_email': ('user__email',)}
+    sparse_keep = ('timestamp',)  # the cursor position
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['event', 'user', 'action']
     ordering_fields = ['timestamp']
-    ordering = ['-timestamp']
+    ordering = ['-timestamp', 'id']
+    pagination_class = EventLogPagination
 
     # Only admins can see all logs
     # Event creators can see logs for their events
@@ -19,21 +32,74 @@ class EventLogViewSet(viewsets.ReadOnlyModelViewSet):
 
     # Filter logs based on user role
     def get_queryset(self):
+        # Schema generation runs without an authenticated user
+        if getattr(self, 'swagger_fake_view', False):
+            return EventLog.objects.none()
 
-        user = self.request.user
+        # Admins see all logs; everyone else the logs of events they created or joined
+        queryset = EventLog.objects.select_related('user', 'event')
+        return visible_logs(queryset, self.request.user)
 
-        # Admin can see all logs
-        if user.is_admin:
-            return EventLog.objects.all().select_related('user', 'event')
+    @action(detail=False, methods=['get'])
+    def archive(self, request):
+        # Logs moved out of the table by archive_event_logs, for a bounded time
+        # range; same visibility rules and filters as the list, in archive order
+        query = ArchiveQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        fields = requested_fields(request, EventLogSerializer.Meta.fields)
 
-        # Event creators can see logs for their events
-        if user.is_event_creator:
-            return EventLog.objects.filter(
-                event__creator=user
-            ).select_related('user', 'event')
+        event_ids = None if request.user.is_admin else accessible_event_ids(request.user)
+        paginator = SegmentCursorPagination()
+        pairs = (
+            (segment, record)
+            for segment, record in archived_logs(params['since'], params['until'], paginator.get_after(request))
+            if (event_ids is None or record['event'] in event_ids)
+            and all(record[key] == params[key] for key in ('event', 'user', 'action') if key in params)
+        )
+        page = paginator.paginate_records(pairs, request)
+        if fields is not None:
+            page = [{key: record[key] for key in fields} for record in page]
+        return paginator.get_paginated_response(page)
 
-        # Regular users can see logs for events they participate in
-        return EventLog.objects.filter(
-            event__participants__user=user
-        ).select_related('user', 'event')
 
+class EventActivityView(APIView):
+    # Join/leave counts and the participant curve of one event, from the rollups
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        event = get_object_or_404(
+            Event.objects.only('id', 'capacity', 'participant_count', 'creator_id'), pk=pk
+        )
+        if not (request.user.is_admin or event.creator_id == request.user.pk):
+            self.permission_denied(request, message="Only the event creator can view its analytics.")
+
+        query = ActivityQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        buckets = event_series(event, **query.validated_data)
+        return Response({
+            'event': event.pk,
+            'capacity': event.capacity,
+            **query.validated_data,
+            'totals': totals(buckets),
+            'buckets': buckets,
+        })
+
+
+class CreatorActivityView(APIView):
+    # Join/leave counts summed over all events of a creator
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        if not (request.user.is_admin or request.user.pk == pk):
+            self.permission_denied(request, message="You can only view your own analytics.")
+
+        query = ActivityQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        buckets = creator_series(pk, **query.validated_data)
+        return Response({
+            'creator': pk,
+            **query.validated_data,
+            'totals': totals(buckets),
+            'buckets': buckets,
+        })
@@ -0,0 +1,299 @@
+"""
+Buffered EventLog writer.
+
+Views call ``log_event()``. When ``EVENT_LOG_BUFFER['ENABLED']`` is on, records
+are queued in memory and written by a background thread with ``bulk_create``
+once ``BATCH_SIZE`` records are pending or ``FLUSH_INTERVAL`` seconds have
+passed. ``MAX_PENDING`` bounds memory: a full buffer blocks the caller for up to
+``ENQUEUE_TIMEOUT`` seconds and then falls back to a synchronous INSERT, so
+records are never dropped. Pending records are flushed at interpreter exit.
+
+With ``SPOOL_DIR`` set, every queued record is also appended to a per-process
+JSON-lines spool file which is discarded once its records are committed.
+Spool files left behind by a crashed process are replayed the next time a
+buffer starts, so delivery is at-least-once.
+"""
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .analytics import record_activity
+from .models import EventLog
+
+try:
+    import fcntl
+except ImportError:  # Windows: spool files are still written, but not replayed across processes
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 1.0,
+    'MAX_PENDING': 10000,
+    'ENQUEUE_TIMEOUT': 0.5,
+    'SPOOL_DIR': None,
+}
+
+
+def buffer_settings():
+    return {**DEFAULTS, **getattr(settings, 'EVENT_LOG_BUFFER', {})}
+
+
+def _lock(fileobj, blocking=True):
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(fileobj, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+class EventLogBuffer:
+    def __init__(self, batch_size=500, flush_interval=1.0, max_pending=10000,
+                 enqueue_timeout=0.5, spool_dir=None):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.enqueue_timeout = enqueue_timeout
+
+        self._pending = []
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+
+        self._spool_path = None
+        self._spool = None
+        if spool_dir:
+            os.makedirs(spool_dir, exist_ok=True)
+            self.recover(spool_dir)
+            self._spool_path = os.path.join(spool_dir, f'eventlog-{os.getpid()}.jsonl')
+            self._spool = self._open_spool()
+
+        self._thread = threading.Thread(target=self._run, name='eventlog-writer', daemon=True)
+        self._thread.start()
+
+    def enqueue(self, event_id, user_id, action, description, metadata=None):
+        record = {
+            'event_id': event_id,
+            'user_id': user_id,
+            'action': action,
+            'description': description,
+            'metadata': metadata or {},
+            'timestamp': timezone.now(),
+        }
+
+        with self._not_full:
+            accepted = not self._closed and self._not_full.wait_for(
+                lambda: len(self._pending) < self.max_pending,
+                timeout=self.enqueue_timeout,
+            )
+            if accepted:
+                self._pending.append(record)
+                if self._spool:
+                    self._spool.write(self._dumps(record))
+                    self._spool.flush()
+                pending = len(self._pending)
+
+        if not accepted:
+            # Backpressure exhausted (or shutting down): write through instead of dropping
+            with transaction.atomic():
+                record_activity([EventLog.objects.create(**record)])
+        elif pending >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                segment = self._rotate_spool() if batch else None
+                self._not_full.notify_all()
+
+            if not batch:
+                return 0
+
+            try:
+                with transaction.atomic():
+                    logs = EventLog.objects.bulk_create(
+                        [EventLog(**record) for record in batch],
+                        batch_size=self.batch_size,
+                    )
+                    record_activity(logs)
+            except Exception:
+                logger.exception('Failed to flush %d event log record(s); will retry', len(batch))
+                with self._lock:
+                    self._pending[:0] = batch
+                    self._restore_spool(segment)
+                raise
+
+            if segment:
+                path, fileobj = segment
+                os.unlink(path)
+                fileobj.close()
+            return len(batch)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._not_full.notify_all()
+        self._wakeup.set()
+        self._thread.join()
+        self.flush()
+        if self._spool:
+            self._spool.close()
+            os.unlink(self._spool_path)
+            self._spool = None
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                pass  # already logged; records stay queued for the next round
+
+    # Spool handling. Every method below runs with self._lock held.
+
+    def _open_spool(self):
+        fileobj = open(self._spool_path, 'a', encoding='utf-8')
+        _lock(fileobj)
+        return fileobj
+
+    def _rotate_spool(self):
+        # The segment keeps its file lock until the batch is committed or restored
+        if not self._spool:
+            return None
+        path = f'{self._spool_path}.flushing'
+        os.replace(self._spool_path, path)
+        segment = (path, self._spool)
+        self._spool = self._open_spool()
+        return segment
+
+    def _restore_spool(self, segment):
+        if not segment:
+            return
+        path, fileobj = segment
+        self._spool.close()
+        with open(path, 'a', encoding='utf-8') as merged, open(self._spool_path, encoding='utf-8') as newer:
+            merged.write(newer.read())
+        os.replace(path, self._spool_path)
+        self._spool = fileobj
+
+    @staticmethod
+    def _dumps(record):
+        return json.dumps({**record, 'timestamp': record['timestamp'].isoformat()}) + '\n'
+
+    @staticmethod
+    def recover(spool_dir):
+        # Replay spool files whose owning process is gone (its file lock is free)
+        replayed = 0
+        for path in sorted(glob.glob(os.path.join(spool_dir, 'eventlog-*.jsonl*'))):
+            with open(path, encoding='utf-8') as fileobj:
+                if not _lock(fileobj, blocking=False):
+                    continue
+                records = []
+                for line in fileobj:
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # torn final line from a crash mid-write
+                    record['timestamp'] = parse_datetime(record['timestamp'])
+                    records.append(EventLog(**record))
+                with transaction.atomic():
+                    record_activity(EventLog.objects.bulk_create(records, batch_size=500))
+                os.unlink(path)
+                replayed += len(records)
+        if replayed:
+            logger.info('Replayed %d spooled event log record(s)', replayed)
+        return replayed
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                options = buffer_settings()
+                _buffer = EventLogBuffer(
+                    batch_size=options['BATCH_SIZE'],
+                    flush_interval=options['FLUSH_INTERVAL'],
+                    max_pending=options['MAX_PENDING'],
+                    enqueue_timeout=options['ENQUEUE_TIMEOUT'],
+                    spool_dir=options['SPOOL_DIR'],
+                )
+    return _buffer
+
+
+@atexit.register
+def shutdown():
+    global _buffer
+    with _buffer_lock:
+        if _buffer is not None:
+            _buffer.close()
+            _buffer = None
+
+
+@receiver(setting_changed)
+def reset_buffer(setting, **kwargs):
+    if setting == 'EVENT_LOG_BUFFER':
+        shutdown()
+
+
+def log_event(event, user, action, description, metadata=None):
+    if not buffer_settings()['ENABLED']:
+        # No savepoint: an error propagates and aborts the caller's transaction anyway
+        with transaction.atomic(savepoint=False):
+            log = EventLog.objects.create(
+                event=event, user=user, action=action, description=description, metadata=metadata or {}
+            )
+            record_activity([log], creators={event.pk: event.creator_id} if event is not None else {})
+        return log
+    get_buffer().enqueue(
+        event_id=event.pk if event is not None else None,
+        user_id=user.pk,
+        action=action,
+        description=description,
+        metadata=metadata,
+    )
+
+
+def log_events(logs, creators=None):
+    # Bulk counterpart of log_event() for unsaved EventLog instances; creators
+    # maps event id to creator id for the activity rollups
+    if not logs:
+        return
+    if not buffer_settings()['ENABLED']:
+        with transaction.atomic(savepoint=False):
+            record_activity(EventLog.objects.bulk_create(logs, batch_size=500), creators=creators)
+        return
+    buffer = get_buffer()
+    for log in logs:
+        buffer.enqueue(
+            event_id=log.event_id,
+            user_id=log.user_id,
+            action=log.action,
+            description=log.description,
+            metadata=log.metadata,
+        )
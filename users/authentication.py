@@ -0,0 +1,145 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import router, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+# Claims CustomTokenObtainPairSerializer signs into every token; refreshed
+# access tokens copy them from the refresh token
+USER_CLAIMS = ('email', 'username', 'role', 'first_name', 'last_name')
+
+DEFAULTS = {
+    'ENABLED': True,
+    'ALIAS': 'default',
+    'MAX_SIZE': 10000,
+    'TIMEOUT': 30,
+}
+
+
+def cache_settings():
+    return {**DEFAULTS, **getattr(settings, 'JWT_USER_CACHE', {})}
+
+
+def state_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def user_state(user):
+    return {**{claim: getattr(user, claim) for claim in USER_CLAIMS}, 'is_active': user.is_active}
+
+
+class UserStateCache:
+    # The current claims and is_active flag of users: a process-local LRU in
+    # front of the shared cache, in front of the user row. Saving or deleting a
+    # user stores the new state in the shared cache on commit. A state missing
+    # from it (never read, expired or evicted) is read from the database, so a
+    # lost entry costs a query and never lets the claims of an older token
+    # through. Entries expire after TIMEOUT seconds: a change made in another
+    # process is picked up within that window, or twice it when the shared
+    # cache is per process (LocMemCache).
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        options = cache_settings()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                return entry[1]
+
+        cache = caches[options['ALIAS']]
+        state = cache.get(state_key(user_id))
+        if state is None:
+            state = self.load(user_id)
+            # add(): a change stored meanwhile wins over what was just read
+            cache.add(state_key(user_id), state, options['TIMEOUT'])
+        with self._lock:
+            self._entries[user_id] = (now + options['TIMEOUT'], state)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > options['MAX_SIZE']:
+                self._entries.popitem(last=False)
+        return state
+
+    def is_local(self, user_id):
+        # Whether get() answers from this process without any I/O
+        with self._lock:
+            entry = self._entries.get(user_id)
+            return entry is not None and entry[0] > time.monotonic()
+
+    def load(self, user_id):
+        # From the primary: a lagging replica could still return the state from before a change
+        user_model = get_user_model()
+        state = (
+            user_model.objects.using(router.db_for_write(user_model))
+            .filter(pk=user_id).values(*USER_CLAIMS, 'is_active').first()
+        )
+        return state or {'deleted': True}
+
+    def _store(self, user_id, state):
+        caches[cache_settings()['ALIAS']].set(state_key(user_id), state, cache_settings()['TIMEOUT'])
+        self.evict(user_id)
+
+    def invalidate(self, user_id, state):
+        transaction.on_commit(lambda: self._store(user_id, state))
+
+    def evict(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_states = UserStateCache()
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    # Builds request.user from the user's cached state (see UserStateCache)
+    # instead of selecting the user row on every request. Tokens without the
+    # claims (signed before they were added) and CHECK_REVOKE_TOKEN, which needs
+    # the password hash, use the database lookup.
+
+    def uses_database(self, validated_token):
+        return (
+            not cache_settings()['ENABLED']
+            or api_settings.CHECK_REVOKE_TOKEN
+            or any(claim not in validated_token for claim in USER_CLAIMS)
+        )
+
+    def reads_state_locally(self, validated_token):
+        return user_states.is_local(validated_token.get(api_settings.USER_ID_CLAIM))
+
+    def get_user(self, validated_token):
+        if self.uses_database(validated_token):
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        state = user_states.get(user_id)
+        if state.get('deleted'):
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not state['is_active']:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        # Fields outside the claims are deferred and load on first access
+        loaded = {**state, api_settings.USER_ID_FIELD: user_id}
+        fields = [f.attname for f in self.user_model._meta.concrete_fields if f.attname in loaded]
+        return self.user_model.from_db(
+            router.db_for_read(self.user_model), fields, [loaded[name] for name in fields],
+        )
@@ -2,6 +2,7 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from .authentication import USER_CLAIMS
 
 User = get_user_model()
 
@@ -37,6 +38,16 @@ class UserCreateSerializer(serializers.ModelSerializer):
 
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+
+        # Signed claims let ClaimsJWTAuthentication skip the user lookup
+        for claim in USER_CLAIMS:
+            token[claim] = getattr(user, claim)
+
+        return token
+
     def validate(self, attrs):
         data = super().validate(attrs)
 
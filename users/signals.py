@@ -0,0 +1,22 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .authentication import user_states, user_state
+
+User = get_user_model()
+
+
+# Claims-based authentication reads the user's cached state instead of the row.
+# Store the new state whenever a user changes, so tokens signed before the
+# change (role downgrades, deactivation, deletion) stop authenticating with
+# stale claims right away rather than when the cached state expires.
+# queryset.update() bypasses these signals; call user_states.invalidate() after one.
+@receiver(post_save, sender=User)
+def invalidate_user_claims(sender, instance, created, **kwargs):
+    if not created:
+        user_states.invalidate(instance.pk, user_state(instance))
+
+
+@receiver(post_delete, sender=User)
+def revoke_user_claims(sender, instance, **kwargs):
+    user_states.invalidate(instance.pk, {'deleted': True})
@@ -1,3 +1,129 @@
+import statistics
+import sys
+import time
+
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .authentication import user_states
+from .models import User
+from .serializers import CustomTokenObtainPairSerializer
+
+
+class ClaimsJWTAuthenticationTest(TestCase):
+
+    def setUp(self):
+        # Primary keys are reused between tests, so no state may leak across them
+        cache.clear()
+        user_states.clear()
+        self.user = User.objects.create_user(
+            email='creator@example.com', username='creator', password='pass',
+            role=User.Role.EVENT_CREATOR, first_name='Eve', last_name='Creator',
+        )
+        self.client = APIClient()
+
+    def authenticate(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_claims_token_authenticates_without_queries(self):
+        self.authenticate(CustomTokenObtainPairSerializer.get_token(self.user).access_token)
+        user_states.get(self.user.pk)  # warm the LRU
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/events/cache-stats/')
+        self.assertEqual(response.status_code, 403)  # authenticated, but not an admin
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['role'], User.Role.EVENT_CREATOR)
+        self.assertEqual(response.data['email'], 'creator@example.com')
+
+    def test_refreshed_access_token_keeps_claims(self):
+        refresh = CustomTokenObtainPairSerializer.get_token(self.user)
+        response = self.client.post('/api/users/token/refresh/', {'refresh': str(refresh)}, format='json')
+        self.authenticate(response.data['access'])
+        user_states.get(self.user.pk)
+
+        with self.assertNumQueries(1):  # the event list page; no user lookup
+            self.assertEqual(self.client.get('/api/events/').status_code, 200)
+
+    def test_token_without_claims_falls_back_to_database(self):
+        self.authenticate(RefreshToken.for_user(self.user).access_token)
+
+        with self.assertNumQueries(2):  # user lookup and the event list page
+            self.assertEqual(self.client.get('/api/events/').status_code, 200)
+
+    def test_role_change_overrides_signed_claims(self):
+        self.authenticate(CustomTokenObtainPairSerializer.get_token(self.user).access_token)
+        event = {
+            'name': 'Meetup', 'description': 'x', 'capacity': 10, 'location': 'Hall',
+            'date': '2030-01-01T00:00:00Z', 'status': 'CLOSED',
+        }
+        self.assertEqual(self.client.post('/api/events/', event, format='json').status_code, 201)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.role = User.Role.REGULAR_USER
+            self.user.save()
+
+        self.assertEqual(self.client.post('/api/events/', event, format='json').status_code, 403)
+
+    def test_deactivated_and_deleted_users_are_rejected(self):
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        self.authenticate(token)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data['code'], 'user_inactive')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data['code'], 'user_not_found')
+
+    def test_state_missing_from_the_cache_is_read_from_the_database(self):
+        # An evicted entry, or a change stored in another process's cache
+        self.authenticate(CustomTokenObtainPairSerializer.get_token(self.user).access_token)
+        User.objects.filter(pk=self.user.pk).update(role=User.Role.REGULAR_USER)
+        cache.clear()
+        user_states.clear()
+
+        with self.assertNumQueries(2):  # the user's state and the profile
+            response = self.client.get('/api/users/me/')
+        self.assertEqual(response.data['role'], User.Role.REGULAR_USER)
+
+        self.user.delete()  # its on_commit never runs here
+        cache.clear()
+        user_states.clear()
+        response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data['code'], 'user_not_found')
+
+    def test_authentication_latency_with_and_without_user_lookup(self):
+        requests = 300
+
+        def measure(token):
+            self.authenticate(token)
+            timings = []
+            for _ in range(requests):
+                started = time.perf_counter()
+                response = self.client.get('/api/events/cache-stats/')
+                timings.append(time.perf_counter() - started)
+                self.assertEqual(response.status_code, 403)
+            timings.sort()
+            return statistics.median(timings) * 1000, timings[int(len(timings) * 0.99)] * 1000
+
+        lookup_p50, lookup_p99 = measure(RefreshToken.for_user(self.user).access_token)
+        claims_p50, claims_p99 = measure(CustomTokenObtainPairSerializer.get_token(self.user).access_token)
 
-# Create your tests here.
+        sys.stderr.write(
+            f"\nauthenticated request latency over {requests} requests: "
+            f"user lookup p50={lookup_p50:.2f}ms p99={lookup_p99:.2f}ms, "
+            f"claims p50={claims_p50:.2f}ms p99={claims_p99:.2f}ms\n"
+        )
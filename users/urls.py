@@ -1,13 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from rest_framework_simplejwt.views import TokenRefreshView
-from .views import UserViewSet, CustomTokenObtainPairView
+from .views import UserViewSet, CustomTokenObtainPairView, ThrottledTokenRefreshView
 
 router = DefaultRouter()
 router.register(r'', UserViewSet)
 
+# Token routes come first so 'token/' is not captured as a user pk
 urlpatterns = [
-    path('', include(router.urls)),
     path('token/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
-]
\ No newline at end of file
+    path('token/refresh/', ThrottledTokenRefreshView.as_view(), name='token_refresh'),
+    path('', include(router.urls)),
+]
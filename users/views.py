@@ -1,16 +1,17 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from django.contrib.auth import get_user_model
 from .serializers import UserSerializer, UserCreateSerializer, CustomTokenObtainPairSerializer
 from .permissions import IsAdminUser, IsSelfOrAdmin
+from config.throttling import IPThrottle
 
 User = get_user_model()
 
 
 class UserViewSet(viewsets.ModelViewSet):
-    queryset = User.objects.all()
+    queryset = User.objects.order_by('id')
     serializer_class = UserSerializer
 
     def get_permissions(self):
@@ -31,10 +32,19 @@ class UserViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def me(self, request): # Get current user details
-        serializer = self.get_serializer(request.user)
+        # request.user only carries the token claims; load the full row once
+        serializer = self.get_serializer(User.objects.get(pk=request.user.pk))
         return Response(serializer.data)
 
 
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
+    # Password guessing and login retry loops, per client address
+    throttle_scope = 'token'
+    throttle_classes = [IPThrottle]
+
+
+class ThrottledTokenRefreshView(TokenRefreshView):
+    throttle_scope = 'token'
+    throttle_classes = [IPThrottle]
 